@@ -1,33 +1,134 @@
 # nhập các thư viện cơ bản
-from typing import Dict, List, Any
+import time
+import uuid
+import queue
+import asyncio
+import threading
+from typing import Dict, List, Any, AsyncIterator, Iterator, Optional, Tuple
 
 # nhập thư viện langchain
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_xai import ChatXAI
+# (langchain.agents và langchain_xai được nạp khi tạo agent để khởi động nhanh)
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.tools import StructuredTool
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 # nhập các module tùy chỉnh
 from embedding_manager import EmbeddingManager
-from config import LLM_MODEL, LLM_TEMPERATURE, SYSTEM_TEMPLATE
+from history_manager import HistoryManager, TokenCounter
+from context_packer import interleave_results, pack_context
+from telemetry import telemetry
+from lazy import Lazy, warm_up_in_background
+from response_cache import ResponseCache, chunk_ids, response_key
+from config import (
+    LLM_MODEL,
+    LLM_TEMPERATURE,
+    SYSTEM_TEMPLATE,
+    XAI_API_BASE,
+    RETRIEVE_CANDIDATE_K,
+    RETRIEVE_TOKEN_BUDGET,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_MAX_BYTES,
+    FAST_PATH_ENABLED
+)
+
+# Số lượt trò chuyện gần nhất được giữ số liệu hiệu năng
+MAX_TURN_METRICS = 100
+
+# Mô tả công cụ retrieve cho mô hình, gồm cách dùng các bộ lọc theo metadata
+RETRIEVE_TOOL_DESCRIPTION = (
+    "Truy xuất thông tin liên quan đến truy vấn từ các tài liệu đã tải lên. "
+    "Chỉ dùng bộ lọc khi người dùng nói rõ: source là tên file (ví dụ \"bao_cao.pdf\"), "
+    "file_type là loại file (ví dụ \"pdf\"), uploaded_after/uploaded_before là ngày "
+    "tải lên dạng YYYY-MM-DD."
+)
+
+# Mô tả công cụ retrieve_many: nhiều truy vấn con trong một lần gọi
+RETRIEVE_MANY_TOOL_DESCRIPTION = (
+    "Truy xuất thông tin cho nhiều truy vấn con trong một lần gọi, nhanh hơn gọi "
+    "retrieve nhiều lần. Dùng khi câu hỏi gồm nhiều ý hoặc cần so sánh nhiều đối tượng: "
+    "queries là danh sách truy vấn con ngắn gọn. Các bộ lọc giống retrieve và áp dụng "
+    "cho mọi truy vấn."
+)
 
 class AgentManager:
     """Lớp quản lý việc tạo và sử dụng agent."""
     
-    def __init__(self, embedding_manager: EmbeddingManager):
+    def __init__(self, embedding_manager: EmbeddingManager, llm: Optional[BaseChatModel] = None):
         """
         Khởi tạo AgentManager.
         
         Args:
             embedding_manager: Đối tượng EmbeddingManager để truy xuất thông tin
+            llm: Mô hình ngôn ngữ dùng thay cho mô hình mặc định
+                (ví dụ mô hình giả lập khi đo hiệu năng)
         """
         self.embedding_manager = embedding_manager
-        self.llm = self._create_llm()
+        self.token_counter = TokenCounter()
         self.tools = self._create_tools()
         self.prompt = self._create_prompt()
-        self.agent = self._create_agent()
-        self.agent_executor = self._create_agent_executor()
+        
+        # Client LLM và agent được tạo ở lần dùng đầu tiên (hoặc trên luồng nền
+        # qua warm_up) để không làm chậm việc khởi động
+        self._llm = Lazy(lambda: llm if llm is not None else self._create_llm())
+        self._agent_executor = Lazy(self._create_agent_executor)
+        self._history_manager = Lazy(
+            lambda: HistoryManager(self.llm, token_counter=self.token_counter)
+        )
+        
+        # Số liệu hiệu năng của các lượt trò chuyện gần nhất
+        self.turn_metrics: List[Dict[str, Any]] = []
+        
+        # Vòng lặp sự kiện chạy nền cho các lời gọi đồng bộ tới API bất đồng bộ.
+        # Các client async (httpx) gắn với vòng lặp nên phải dùng lại một vòng lặp duy nhất.
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        
+        # Cache câu trả lời trên đĩa cho các câu hỏi lặp lại trên cùng dữ liệu
+        self.response_cache = (
+            ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_BYTES)
+            if RESPONSE_CACHE_ENABLED else None
+        )
+        self._response_cache_version = None
+        
+        # Đường tắt: đưa sẵn kết quả tìm kiếm cho câu hỏi vào prompt đầu tiên để
+        # mô hình trả lời ngay, không cần một lượt gọi công cụ retrieve
+        self.fast_path = FAST_PATH_ENABLED
+    
+    @property
+    def llm(self) -> BaseChatModel:
+        """Mô hình ngôn ngữ, khởi tạo ở lần truy cập đầu tiên."""
+        return self._llm.get()
+    
+    @property
+    def agent_executor(self):
+        """Trình thực thi agent, khởi tạo ở lần truy cập đầu tiên."""
+        return self._agent_executor.get()
+    
+    @property
+    def history_manager(self) -> HistoryManager:
+        """Bộ thu gọn lịch sử trò chuyện, khởi tạo ở lần truy cập đầu tiên."""
+        return self._history_manager.get()
+    
+    def warm_up(self):
+        """
+        Khởi tạo client LLM và agent trên luồng nền.
+        
+        Returns:
+            Luồng khởi động (có thể join để chờ sẵn sàng)
+        """
+        return warm_up_in_background(
+            "warm-up-agent",
+            self._agent_executor.get,
+            self._history_manager.get
+        )
+    
+    @property
+    def ready(self) -> bool:
+        """True nếu agent đã sẵn sàng trả lời."""
+        return self._agent_executor.ready and self._history_manager.ready
     
     def _create_llm(self):
         """
@@ -36,9 +137,12 @@ class AgentManager:
         Returns:
             Đối tượng LLM
         """
+        from langchain_xai import ChatXAI
+        
         return ChatXAI(
             model=LLM_MODEL,
-            temperature=LLM_TEMPERATURE
+            temperature=LLM_TEMPERATURE,
+            xai_api_base=XAI_API_BASE
         )
     
     def _create_tools(self):
@@ -48,12 +152,121 @@ class AgentManager:
         Returns:
             Danh sách các công cụ
         """
-        @tool(response_format="content_and_artifact")
-        def retrieve(query: str):
+        def make_filters(source, file_type, uploaded_after, uploaded_before):
+            """
+            Chuẩn hóa bộ lọc của công cụ.
+            
+            Tên file do mô hình đưa ra được so khớp (không phân biệt hoa thường,
+            khớp một phần) với các file đã nạp. Trả về (bộ lọc, thông báo lỗi).
+            """
+            if source:
+                known = self.embedding_manager.get_sources()
+                matches = [s for s in known if s == source] or [
+                    s for s in known if source.lower() in s.lower()
+                ]
+                if known and not matches:
+                    return None, f"Không có tài liệu '{source}'. Các tài liệu hiện có: {', '.join(known)}."
+                source = matches or source
+            return {
+                "source": source,
+                "file_type": file_type,
+                "uploaded_after": uploaded_after,
+                "uploaded_before": uploaded_before
+            }, None
+        
+        def retrieve(
+            query: str,
+            source: Optional[str] = None,
+            file_type: Optional[str] = None,
+            uploaded_after: Optional[str] = None,
+            uploaded_before: Optional[str] = None
+        ):
+            """Truy xuất thông tin liên quan đến truy vấn."""
+            filters, error = make_filters(source, file_type, uploaded_after, uploaded_before)
+            if error:
+                return error, []
+            _, docs = self.embedding_manager.similarity_search(
+                query, k=RETRIEVE_CANDIDATE_K, filters=filters
+            )
+            return self._pack_docs(docs)
+        
+        async def aretrieve(
+            query: str,
+            source: Optional[str] = None,
+            file_type: Optional[str] = None,
+            uploaded_after: Optional[str] = None,
+            uploaded_before: Optional[str] = None
+        ):
             """Truy xuất thông tin liên quan đến truy vấn."""
-            return self.embedding_manager.similarity_search(query, k=2)
+            filters, error = make_filters(source, file_type, uploaded_after, uploaded_before)
+            if error:
+                return error, []
+            _, docs = await self.embedding_manager.asimilarity_search(
+                query, k=RETRIEVE_CANDIDATE_K, filters=filters
+            )
+            return self._pack_docs(docs)
+        
+        def retrieve_many(
+            queries: List[str],
+            source: Optional[str] = None,
+            file_type: Optional[str] = None,
+            uploaded_after: Optional[str] = None,
+            uploaded_before: Optional[str] = None
+        ):
+            """Truy xuất thông tin cho nhiều truy vấn con."""
+            filters, error = make_filters(source, file_type, uploaded_after, uploaded_before)
+            if error:
+                return error, []
+            results = self.embedding_manager.similarity_search_many(
+                queries, k=RETRIEVE_CANDIDATE_K, filters=filters
+            )
+            return self._pack_docs(interleave_results(results))
+        
+        async def aretrieve_many(
+            queries: List[str],
+            source: Optional[str] = None,
+            file_type: Optional[str] = None,
+            uploaded_after: Optional[str] = None,
+            uploaded_before: Optional[str] = None
+        ):
+            """Truy xuất thông tin cho nhiều truy vấn con."""
+            filters, error = make_filters(source, file_type, uploaded_after, uploaded_before)
+            if error:
+                return error, []
+            results = await self.embedding_manager.asimilarity_search_many(
+                queries, k=RETRIEVE_CANDIDATE_K, filters=filters
+            )
+            return self._pack_docs(interleave_results(results))
+        
+        # Có cả phiên bản async để agent không chặn vòng lặp sự kiện khi chạy bất đồng bộ
+        retrieve_tool = StructuredTool.from_function(
+            func=retrieve,
+            coroutine=aretrieve,
+            description=RETRIEVE_TOOL_DESCRIPTION,
+            response_format="content_and_artifact"
+        )
+        retrieve_many_tool = StructuredTool.from_function(
+            func=retrieve_many,
+            coroutine=aretrieve_many,
+            description=RETRIEVE_MANY_TOOL_DESCRIPTION,
+            response_format="content_and_artifact"
+        )
+        
+        return [retrieve_tool, retrieve_many_tool]
+    
+    def _pack_docs(self, docs: List[Document]) -> Tuple[str, List[Document]]:
+        """
+        Gộp các đoạn tìm được thành ngữ cảnh gọn trong ngân sách token.
         
-        return [retrieve]
+        Args:
+            docs: Các đoạn văn bản tìm được
+            
+        Returns:
+            Tuple gồm ngữ cảnh cho mô hình và các đoạn gốc (artifact của công cụ)
+        """
+        with telemetry.span("pack", candidates=len(docs)):
+            context, _ = pack_context(docs, RETRIEVE_TOKEN_BUDGET, self.token_counter)
+        return context or "Không tìm thấy tài liệu liên quan.", docs
     
     def _create_prompt(self):
         """
@@ -67,6 +280,8 @@ class AgentManager:
                 ("system", SYSTEM_TEMPLATE),
                 MessagesPlaceholder(variable_name="chat_history"),
                 ("human", "{input}"),
+                # Kết quả tìm trước của đường tắt, dạng một lời gọi retrieve đã hoàn tất
+                MessagesPlaceholder(variable_name="prefetched", optional=True),
                 MessagesPlaceholder(variable_name="agent_scratchpad"),
             ]
         )
@@ -78,6 +293,8 @@ class AgentManager:
         Returns:
             Đối tượng Agent
         """
+        from langchain.agents import create_tool_calling_agent
+        
         return create_tool_calling_agent(self.llm, self.tools, self.prompt)
     
     def _create_agent_executor(self):
@@ -87,22 +304,370 @@ class AgentManager:
         Returns:
             Đối tượng AgentExecutor
         """
-        return AgentExecutor(agent=self.agent, tools=self.tools, verbose=True)
+        from langchain.agents import AgentExecutor
+        
+        return AgentExecutor(
+            agent=self._create_agent(),
+            tools=self.tools,
+            verbose=True,
+            return_intermediate_steps=True
+        )
     
     def invoke(self, query: str, chat_history: List = None) -> Dict[str, Any]:
         """
         Gọi agent để trả lời truy vấn.
         
+        Chạy ainvoke trên vòng lặp sự kiện nền: AgentExecutor bất đồng bộ chạy
+        song song các lời gọi công cụ độc lập trong cùng một bước, còn bản đồng
+        bộ chạy lần lượt từng lời gọi.
+        
+        Args:
+            query: Truy vấn cần trả lời
+            chat_history: Lịch sử trò chuyện đầy đủ, được thu gọn theo ngân sách token
+            
+        Returns:
+            Kết quả từ agent
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.ainvoke(query, chat_history), self._get_loop()
+        )
+        return future.result()
+    
+    async def ainvoke(self, query: str, chat_history: List = None) -> Dict[str, Any]:
+        """
+        Gọi agent bất đồng bộ để trả lời truy vấn.
+        
         Args:
             query: Truy vấn cần trả lời
-            chat_history: Lịch sử trò chuyện
+            chat_history: Lịch sử trò chuyện đầy đủ, được thu gọn theo ngân sách token
             
         Returns:
             Kết quả từ agent
         """
-        if chat_history is None:
-            chat_history = []
+        start_time = time.perf_counter()
+        tool_calls = 0
+        with telemetry.trace("chat_turn") as trace:
+            history, history_stats, prefetched, cache_key, cached = await self._aprepare_turn(
+                query, chat_history
+            )
+            if cached is not None:
+                result = {"input": query, "chat_history": history, "output": cached["output"]}
+            else:
+                result = await self.agent_executor.ainvoke(
+                    self._agent_inputs(query, history, prefetched),
+                    config={"callbacks": telemetry.callbacks(trace)}
+                )
+                tool_calls = len(result.get("intermediate_steps", []))
+                await self._astore_response(cache_key, result["output"])
+        
+        self._record_turn_metrics({
+            "time_to_first_token": None,
+            "total_time": time.perf_counter() - start_time,
+            "tool_calls": tool_calls,
+            "trace_id": trace.trace_id if trace else None,
+            "cached": cached is not None,
+            "fast_path": prefetched is not None and cached is None,
+            **history_stats
+        })
+        return result
+    
+    async def _aprepare_turn(
+        self,
+        query: str,
+        chat_history: Optional[List]
+    ) -> Tuple[List, Dict[str, Any], Optional[List], Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Chuẩn bị một lượt trò chuyện trước khi chạy agent.
+        
+        Khi bật đường tắt, việc tìm kiếm cho câu hỏi bắt đầu ngay và chạy song
+        song với việc thu gọn lịch sử (có thể gọi LLM để tóm tắt); tìm kiếm dùng
+        chung cache với công cụ retrieve. Cache câu trả lời không tự tìm kiếm
+        thêm: khóa chỉ gồm các đoạn tìm trước khi đã có.
+        
+        Args:
+            query: Truy vấn của lượt hiện tại
+            chat_history: Lịch sử trò chuyện đầy đủ
+            
+        Returns:
+            Tuple gồm lịch sử đã thu gọn, số liệu, các tin nhắn tìm trước cho
+            đường tắt (None nếu không dùng), khóa cache và câu trả lời đã lưu
+        """
+        prefetch = None
+        if self.fast_path:
+            prefetch = asyncio.ensure_future(
+                self.embedding_manager.asimilarity_search(query, k=RETRIEVE_CANDIDATE_K)
+            )
+        
+        try:
+            with telemetry.span("history"):
+                history, history_stats = self._prepare_history(
+                    query, await self.history_manager.acompact(chat_history or [])
+                )
+        except BaseException:
+            if prefetch is not None:
+                prefetch.cancel()
+            raise
+        
+        docs = None
+        if prefetch is not None:
+            _, docs = await prefetch
+        cache_key, cached = await self._alookup_response(query, history, docs)
+        
+        prefetched = None
+        if docs is not None and cached is None:
+            prefetched = self._prefetched_messages(query, docs)
+            history_stats["prompt_tokens"] += self.token_counter.count_text(prefetched[-1].content)
+        return history, history_stats, prefetched, cache_key, cached
+    
+    def _prefetched_messages(self, query: str, docs: List[Document]) -> List:
+        """
+        Tạo các tin nhắn của một lời gọi retrieve đã hoàn tất từ kết quả tìm trước.
+        
+        Mô hình thấy như đã tự gọi retrieve với câu hỏi: nếu ngữ cảnh đủ thì trả
+        lời ngay, nếu cần thêm (bộ lọc, truy vấn con) thì gọi công cụ như bình thường.
+        
+        Args:
+            query: Truy vấn của lượt hiện tại
+            docs: Các đoạn tìm được cho truy vấn
+            
+        Returns:
+            Danh sách gồm AIMessage gọi retrieve và ToolMessage chứa ngữ cảnh
+        """
+        context, docs = self._pack_docs(docs)
+        call_id = f"call_prefetch_{uuid.uuid4().hex[:12]}"
+        return [
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "retrieve", "args": {"query": query}, "id": call_id}]
+            ),
+            ToolMessage(content=context, tool_call_id=call_id, artifact=docs)
+        ]
+    
+    @staticmethod
+    def _agent_inputs(query: str, history: List, prefetched: Optional[List]) -> Dict[str, Any]:
+        """Tạo đầu vào cho agent, kèm kết quả tìm trước nếu dùng đường tắt."""
+        inputs = {"input": query, "chat_history": history}
+        if prefetched is not None:
+            inputs["prefetched"] = prefetched
+        return inputs
+    
+    async def _alookup_response(
+        self,
+        query: str,
+        history: List,
+        docs: Optional[List[Document]]
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Tra cache câu trả lời cho một lượt trò chuyện.
+        
+        Khóa gồm collection, mô hình, nhiệt độ, câu hỏi đã chuẩn hóa, lịch sử,
+        phiên bản dữ liệu và định danh các đoạn tìm trước (nếu có). Truy cập
+        SQLite chạy trên luồng riêng để không chặn vòng lặp sự kiện.
+        
+        Args:
+            query: Truy vấn của lượt hiện tại
+            history: Lịch sử đã thu gọn
+            docs: Các đoạn tìm trước cho câu hỏi (None nếu không dùng đường tắt)
+            
+        Returns:
+            Tuple gồm khóa cache (None nếu cache bị tắt) và câu trả lời đã lưu (nếu có)
+        """
+        if self.response_cache is None:
+            return None, None
         
-        return self.agent_executor.invoke(
-            {"input": query, "chat_history": chat_history}
+        namespace = self.embedding_manager.manifest.namespace
+        # Dữ liệu đã thay đổi: xóa các câu trả lời tạo trên dữ liệu cũ
+        version = self.embedding_manager.corpus_generation
+        if version != self._response_cache_version:
+            await asyncio.to_thread(self.response_cache.invalidate, namespace, version)
+            self._response_cache_version = version
+        
+        with telemetry.span("response_cache"):
+            key = response_key(
+                namespace,
+                getattr(self.llm, "model_name", None) or self.llm._llm_type,
+                getattr(self.llm, "temperature", None),
+                query,
+                history,
+                chunk_ids(docs) if docs is not None else [],
+                version
+            )
+            return key, await asyncio.to_thread(self.response_cache.get, key)
+    
+    async def _astore_response(self, key: Optional[str], output: str) -> None:
+        """
+        Lưu câu trả lời của một lượt trò chuyện vào cache (trên luồng riêng).
+        
+        Args:
+            key: Khóa từ _alookup_response (None nếu cache bị tắt)
+            output: Câu trả lời của agent
+        """
+        if key is not None and output:
+            await asyncio.to_thread(
+                self.response_cache.set,
+                key,
+                self.embedding_manager.manifest.namespace,
+                self._response_cache_version,
+                {"output": output}
+            )
+    
+    def _prepare_history(
+        self,
+        query: str,
+        compacted: Tuple[List, Dict[str, Any]]
+    ) -> Tuple[List, Dict[str, Any]]:
+        """
+        Bổ sung số token của prompt vào kết quả thu gọn lịch sử.
+        
+        Args:
+            query: Truy vấn của lượt hiện tại
+            compacted: Kết quả của HistoryManager.compact/acompact
+            
+        Returns:
+            Tuple gồm lịch sử đã thu gọn và số liệu, trong đó prompt_tokens là
+            số token của system prompt, lịch sử và truy vấn gửi cho mô hình
+        """
+        history, stats = compacted
+        counter = self.history_manager.token_counter
+        stats["prompt_tokens"] = (
+            counter.count_text(SYSTEM_TEMPLATE)
+            + stats["history_tokens"]
+            + counter.count_text(query)
         )
+        return history, stats
+    
+    def _record_turn_metrics(self, metrics: Dict[str, Any]) -> None:
+        """
+        Lưu số liệu hiệu năng của một lượt trò chuyện.
+        
+        Args:
+            metrics: Số liệu của lượt trò chuyện
+        """
+        self.turn_metrics.append(metrics)
+        # Chỉ giữ các lượt gần nhất
+        del self.turn_metrics[:-MAX_TURN_METRICS]
+    
+    async def astream(self, query: str, chat_history: List = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Gọi agent và trả về các sự kiện ngay khi chúng xảy ra.
+        
+        Args:
+            query: Truy vấn cần trả lời
+            chat_history: Lịch sử trò chuyện đầy đủ, được thu gọn theo ngân sách token
+            
+        Returns:
+            Async iterator các sự kiện dạng từ điển với khóa "type":
+            "tool_start" (name, input), "tool_end" (name, output),
+            "token" (content) và cuối cùng là "final" (output, metrics)
+        """
+        start_time = time.perf_counter()
+        time_to_first_token = None
+        tool_calls = 0
+        output = ""
+        
+        with telemetry.trace("chat_turn", mode="stream") as trace:
+            history, history_stats, prefetched, cache_key, cached = await self._aprepare_turn(
+                query, chat_history
+            )
+            if cached is not None:
+                output = cached["output"]
+                time_to_first_token = time.perf_counter() - start_time
+                yield {"type": "token", "content": output}
+            else:
+                async for event in self.agent_executor.astream_events(
+                    self._agent_inputs(query, history, prefetched),
+                    version="v2",
+                    config={"callbacks": telemetry.callbacks(trace)}
+                ):
+                    kind = event["event"]
+                
+                    if kind == "on_tool_start":
+                        tool_calls += 1
+                        yield {"type": "tool_start", "name": event["name"], "input": event["data"].get("input")}
+                
+                    elif kind == "on_tool_end":
+                        yield {"type": "tool_end", "name": event["name"], "output": event["data"].get("output")}
+                
+                    elif kind == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        if isinstance(content, str) and content:
+                            if time_to_first_token is None:
+                                time_to_first_token = time.perf_counter() - start_time
+                            yield {"type": "token", "content": content}
+                
+                    # Sự kiện kết thúc của chính AgentExecutor (không có run cha)
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        output = event["data"].get("output", {}).get("output", "")
+                        await self._astore_response(cache_key, output)
+        
+        total_time = time.perf_counter() - start_time
+        
+        # Mô hình không hỗ trợ streaming: token đầu tiên đến cùng câu trả lời
+        if time_to_first_token is None and output:
+            time_to_first_token = total_time
+        
+        metrics = {
+            "time_to_first_token": time_to_first_token,
+            "total_time": total_time,
+            "tool_calls": tool_calls,
+            "trace_id": trace.trace_id if trace else None,
+            "cached": cached is not None,
+            "fast_path": prefetched is not None and cached is None,
+            **history_stats
+        }
+        self._record_turn_metrics(metrics)
+        
+        yield {"type": "final", "output": output, "metrics": metrics}
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Trả về vòng lặp sự kiện chạy nền, khởi tạo ở lần gọi đầu tiên.
+        
+        Returns:
+            Vòng lặp sự kiện chạy trên một luồng daemon
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+    
+    def stream(self, query: str, chat_history: List = None) -> Iterator[Dict[str, Any]]:
+        """
+        Phiên bản đồng bộ của astream, dùng được trong script Streamlit.
+        
+        Các sự kiện được sinh trên vòng lặp sự kiện chạy nền và đẩy qua
+        hàng đợi, nên người gọi nhận được từng sự kiện ngay khi có.
+        
+        Args:
+            query: Truy vấn cần trả lời
+            chat_history: Lịch sử trò chuyện đầy đủ, được thu gọn theo ngân sách token
+            
+        Returns:
+            Iterator các sự kiện giống astream
+        """
+        events = queue.Queue()
+        done = object()
+        
+        async def produce():
+            try:
+                async for event in self.astream(query, chat_history):
+                    events.put(event)
+            except Exception as e:
+                events.put(e)
+            finally:
+                events.put(done)
+        
+        future = asyncio.run_coroutine_threadsafe(produce(), self._get_loop())
+        
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+        finally:
+            # Người gọi dừng sớm: hủy lượt trò chuyện đang chạy
+            future.cancel()
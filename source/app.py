@@ -7,6 +7,8 @@ import time
 from document_loader import DocumentLoader
 from embedding_manager import EmbeddingManager
 from agent_manager import AgentManager
+from ingest_jobs import IngestJobQueue
+from telemetry import telemetry
 from config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
 
 # Thiết lập trang Streamlit
@@ -24,12 +26,57 @@ def get_managers():
     """
     embedding_manager = EmbeddingManager()
     agent_manager = AgentManager(embedding_manager)
+    # Kết nối OpenAI/Milvus/xAI trên luồng nền để trang hiển thị ngay
+    embedding_manager.warm_up()
+    agent_manager.warm_up()
     return embedding_manager, agent_manager
 
 # Lấy các đối tượng quản lý
 embedding_manager, agent_manager = get_managers()
 
 
+@st.cache_resource
+def get_ingest_queue():
+    """
+    Khởi tạo và lưu cache hàng đợi nạp tài liệu chạy nền.
+    
+    Job bị gián đoạn ở lần chạy trước được tiếp tục từ checkpoint.
+    
+    Returns:
+        Đối tượng IngestJobQueue đã khởi động
+    """
+    return IngestJobQueue(embedding_manager).start()
+
+ingest_queue = get_ingest_queue()
+
+# Biểu tượng trạng thái job nạp tài liệu
+JOB_STATUS_LABELS = {
+    "queued": "⏳ Đang chờ",
+    "running": "🔄 Đang xử lý",
+    "done": "✅ Hoàn tất",
+    "failed": "❌ Thất bại"
+}
+
+
+@st.fragment(run_every=2)
+def show_ingest_jobs():
+    """Hiển thị trạng thái các job nạp tài liệu gần nhất, tự cập nhật mỗi 2 giây."""
+    jobs = ingest_queue.list_jobs(limit=20)
+    if not jobs:
+        return
+    
+    st.write("**Tiến độ xử lý tài liệu**")
+    for job in jobs:
+        line = f"{JOB_STATUS_LABELS.get(job['status'], job['status'])} · {job['source']} · {job['chunks_done']} đoạn đã ghi"
+        if job["status"] == "done" and job["result"]:
+            line += f" ({job['result'].get('unchanged_chunks', 0)} đoạn không đổi)"
+        st.caption(line)
+        if job["error"]:
+            st.caption(f"Lỗi (lần {job['attempts']}): {job['error']}")
+        if job["status"] == "failed" and st.button("Thử lại", key=f"retry_{job['id']}"):
+            ingest_queue.retry(job["id"])
+
+
 # Tạo sidebar cho việc tải lên tài liệu
 with st.sidebar:
     st.header("Quản lý tài liệu")
@@ -90,42 +137,43 @@ with st.sidebar:
                     help="Nếu được chọn, tất cả dữ liệu cũ sẽ bị xóa trước khi thêm dữ liệu mới"
                 )
                 
-                # Nút xử lý tài liệu
+                # Nút xử lý tài liệu: file được đưa vào hàng đợi nạp chạy nền,
+                # trang không bị chặn và việc nạp vẫn tiếp tục khi đóng trình duyệt
                 if st.button("Xử lý tài liệu", type="primary"):
-                    with st.spinner("Đang xử lý tài liệu..."):
-                        try:
-                            # Tải và phân đoạn tài liệu
-                            documents_dict = DocumentLoader.load_and_split_documents(
-                                uploaded_files,
+                    try:
+                        if clear_existing:
+                            with st.spinner("Đang xóa dữ liệu cũ..."):
+                                embedding_manager.clear_vector_store()
+                        
+                        # Bỏ qua các file đã được nạp với nội dung không đổi
+                        skipped_files = []
+                        queued_files = []
+                        for uploaded_file in uploaded_files:
+                            if not clear_existing and embedding_manager.is_file_unchanged(
+                                uploaded_file.name,
+                                DocumentLoader.compute_file_hash(uploaded_file)
+                            ):
+                                skipped_files.append(uploaded_file.name)
+                                continue
+                            ingest_queue.submit(
+                                uploaded_file,
                                 chunk_size=chunk_size,
                                 chunk_overlap=chunk_overlap
                             )
-                            
-                            # Thêm tài liệu vào vector store
-                            results = embedding_manager.add_documents(
-                                documents_dict,
-                                clear_existing=clear_existing
-                            )
-                            
-                            # Lấy tổng số chunks
-                            total_chunks = results.pop("total_chunks", 0)
-                            
-                            # Hiển thị kết quả
-                            st.success(f"Đã xử lý {len(uploaded_files)} file thành công!")
-                            
-                            # Hiển thị thông tin chi tiết
-                            st.write(f"**Tổng số đoạn văn bản đã tạo:** {total_chunks}")
-                            
-                            # Hiển thị thông tin từng file
-                            st.write("**Chi tiết từng file:**")
-                            for file_name, num_chunks in results.items():
-                                st.write(f"- {file_name}: {num_chunks} đoạn văn bản")
-                            
-                            # Thêm thông báo thành công
-                            st.session_state.upload_success = True
-                            
-                        except Exception as e:
-                            st.error(f"Lỗi khi xử lý tài liệu: {str(e)}")
+                            queued_files.append(uploaded_file.name)
+                        
+                        if queued_files:
+                            st.success(f"Đã đưa {len(queued_files)} file vào hàng đợi xử lý")
+                        if skipped_files:
+                            st.info(f"Bỏ qua {len(skipped_files)} file không thay đổi: {', '.join(skipped_files)}")
+                        
+                        # Thêm thông báo thành công
+                        st.session_state.upload_success = True
+                    
+                    except Exception as e:
+                        st.error(f"Lỗi khi xử lý tài liệu: {str(e)}")
+        
+        show_ingest_jobs()
     
     with manage_tab:
         st.subheader("Quản lý tài liệu và trò chuyện")
@@ -192,6 +240,72 @@ with st.sidebar:
                         st.session_state.confirm_delete_history = False
                     except Exception as e:
                         st.error(f"Lỗi khi xóa lịch sử trò chuyện: {str(e)}")
+        
+        # Hiển thị thống kê hiệu năng cho người vận hành
+        with st.expander("Thống kê hiệu năng"):
+            recent_turns = [
+                m["time_to_first_token"] for m in agent_manager.turn_metrics
+                if m["time_to_first_token"] is not None
+            ]
+            if recent_turns:
+                st.write(
+                    f"**Thời gian đến token đầu tiên:** lượt gần nhất {recent_turns[-1]:.2f}s, "
+                    f"trung bình {sum(recent_turns) / len(recent_turns):.2f}s ({len(recent_turns)} lượt)"
+                )
+            prompt_tokens = [m["prompt_tokens"] for m in agent_manager.turn_metrics]
+            if prompt_tokens:
+                last_turn = agent_manager.turn_metrics[-1]
+                st.write(
+                    f"**Token prompt:** lượt gần nhất {prompt_tokens[-1]}, "
+                    f"lớn nhất {max(prompt_tokens)} ({len(prompt_tokens)} lượt); "
+                    f"{last_turn['summarized_messages']} tin nhắn cũ đã được tóm tắt"
+                )
+            fast_turns = [m for m in agent_manager.turn_metrics if m.get("fast_path")]
+            if fast_turns:
+                sufficient = sum(m["tool_calls"] == 0 for m in fast_turns)
+                st.write(
+                    f"**Đường tắt:** {sufficient}/{len(fast_turns)} lượt trả lời ngay từ kết quả "
+                    f"tìm trước ({sufficient / len(fast_turns):.0%}), các lượt còn lại gọi thêm công cụ"
+                )
+            cache_stats = embedding_manager.get_query_cache_stats()
+            st.write(f"**Thế hệ dữ liệu:** {cache_stats['corpus_generation']}")
+            for label, key in [("Embedding truy vấn", "query_embedding"), ("Kết quả tìm kiếm", "search")]:
+                stats = cache_stats[key]
+                st.write(
+                    f"**{label}:** {stats['entries']}/{stats['max_entries']} mục, "
+                    f"~{stats['memory_bytes'] / 1024:.0f} KB, "
+                    f"tỉ lệ hit {stats['hit_rate']:.0%} ({stats['hits']} hit, {stats['misses']} miss)"
+                )
+            scheduler_stats = embedding_manager.get_embedding_scheduler_stats()
+            if scheduler_stats and scheduler_stats["requests"]:
+                st.write(
+                    f"**Request embedding:** {scheduler_stats['requests']} request, "
+                    f"~{scheduler_stats['tokens_per_minute']:,} token/phút, "
+                    f"{scheduler_stats['concurrency_limit']} request đồng thời, "
+                    f"{scheduler_stats['rate_limited']} lỗi 429, {scheduler_stats['retries']} lần thử lại"
+                )
+            lexical_stats = embedding_manager.get_lexical_index_stats()
+            if lexical_stats and lexical_stats["chunks"]:
+                searches = lexical_stats["searches"]
+                st.write(
+                    f"**Chỉ mục từ khóa:** {lexical_stats['chunks']} đoạn, "
+                    f"{lexical_stats['terms']} từ khóa, ~{lexical_stats['disk_bytes'] / 1024:.0f} KB; "
+                    f"{searches.get('lexical', 0)}/{sum(searches.values())} truy vấn không cần embedding"
+                )
+            if agent_manager.response_cache is not None:
+                stats = agent_manager.response_cache.get_stats()
+                st.write(
+                    f"**Câu trả lời:** {stats['entries']} mục, "
+                    f"~{stats['bytes'] / 1024:.0f}/{stats['max_bytes'] / 1024:.0f} KB, "
+                    f"tỉ lệ hit {stats['hit_rate']:.0%} ({stats['hits']} hit, {stats['misses']} miss)"
+                )
+            if telemetry.enabled:
+                # Thời gian trung bình của từng bước (tổng hợp từ khi khởi động)
+                for stage, stats in telemetry.get_stage_summary().items():
+                    st.write(
+                        f"**Bước {stage}:** trung bình {stats['sum'] / stats['count'] * 1000:.1f} ms "
+                        f"({stats['count']} lần)"
+                    )
 
 # Hiển thị thông báo nếu vừa tải lên tài liệu thành công
 if st.session_state.get("upload_success", False):
@@ -224,15 +338,25 @@ if user_question:
         st.markdown(user_question)
         st.session_state.messages.append(HumanMessage(user_question))
 
-    # gọi agent
-    with st.spinner("Đang tìm kiếm thông tin..."):
-        result = agent_manager.invoke(user_question, chat_history=st.session_state.messages)
-        ai_message = result["output"]
-
-    # thêm phản hồi từ llm vào màn hình (và trò chuyện)
+    # gọi agent và hiển thị phản hồi dần dần khi các token được sinh ra
     with st.chat_message("assistant"):
-        st.markdown(ai_message)
+        tool_placeholder = st.empty()
+        answer_placeholder = st.empty()
+        answer = ""
+        ai_message = ""
+        
+        with st.spinner("Đang tìm kiếm thông tin..."):
+            for event in agent_manager.stream(user_question, chat_history=st.session_state.messages):
+                if event["type"] == "tool_start":
+                    tool_placeholder.caption(f"🔎 Đang gọi công cụ `{event['name']}`...")
+                elif event["type"] == "tool_end":
+                    tool_placeholder.empty()
+                elif event["type"] == "token":
+                    answer += event["content"]
+                    answer_placeholder.markdown(answer + "▌")
+                elif event["type"] == "final":
+                    ai_message = event["output"]
+        
+        # thêm phản hồi từ llm vào màn hình (và trò chuyện)
+        answer_placeholder.markdown(ai_message)
         st.session_state.messages.append(AIMessage(ai_message))
-
-
-
@@ -0,0 +1,9 @@
+"""
+Bộ đo hiệu năng chạy hoàn toàn offline.
+
+Dùng embedding giả lập xác định, mô hình chat giả lập gọi công cụ theo kịch
+bản và vector store cục bộ (numpy hoặc Milvus Lite), nên không cần OpenAI,
+xAI hay Milvus. Chạy trong thư mục `source`:
+
+    python -m benchmarks --output results.json
+"""
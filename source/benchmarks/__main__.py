@@ -0,0 +1,137 @@
+# nhập các thư viện cơ bản
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Any, Dict
+
+
+def _git_commit() -> str:
+    """Trả về mã commit hiện tại (nếu chạy trong git repo)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """Làm phẳng kết quả lồng nhau thành {"a.b.c": số}."""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """
+    In mức thay đổi của các số liệu so với một lần chạy trước.
+
+    Args:
+        baseline: Kết quả của lần chạy trước
+        current: Kết quả của lần chạy này
+    """
+    old = _flatten(baseline.get("results", {}))
+    new = _flatten(current.get("results", {}))
+    print(f"So sánh với commit {baseline.get('commit', '?')}:")
+    for key in sorted(old.keys() & new.keys()):
+        if old[key]:
+            change = (new[key] - old[key]) / old[key] * 100
+            print(f"  {key}: {old[key]:g} -> {new[key]:g} ({change:+.1f}%)")
+
+
+def main():
+    """Chạy bộ đo hiệu năng và ghi kết quả ra JSON."""
+    parser = argparse.ArgumentParser(description="Đo hiệu năng offline: khởi động, nạp, tìm kiếm và agent")
+    parser.add_argument("--suites", default="startup,loader,ingest,search,agent",
+                        help="Các bài đo cần chạy, phân tách bằng dấu phẩy")
+    parser.add_argument("--backend", choices=["numpy", "milvus"], default="numpy",
+                        help="Vector store: numpy (trong tiến trình) hoặc milvus (Milvus Lite)")
+    parser.add_argument("--dim", type=int, default=384,
+                        help="Số chiều embedding giả lập (text-embedding-3-small là 1536; "
+                             "1M vector 1536 chiều cần ~6 GB)")
+    parser.add_argument("--loader-kb", type=int, default=256, help="Kích thước văn bản mỗi file mẫu (KB)")
+    parser.add_argument("--loader-repeats", type=int, default=3)
+    parser.add_argument("--ingest-chunks", type=int, default=5000)
+    parser.add_argument("--search-sizes", default="1000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--agent-turns", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Thời gian giả lập của mỗi lời gọi LLM trong bài đo agent (giây)")
+    parser.add_argument("--startup-repeats", type=int, default=3)
+    parser.add_argument("--output", help="File JSON để ghi kết quả (mặc định in ra màn hình)")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--workdir", help="Thư mục dữ liệu tạm (mặc định tạo mới)")
+    args = parser.parse_args()
+
+    # Cấu hình đọc biến môi trường lúc import, nên phải trỏ dữ liệu vào thư mục tạm
+    # trước khi nạp các module của ứng dụng để không đụng tới dữ liệu thật
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    os.environ["NUMPY_STORE_DIR"] = os.path.join(workdir, "vector_store")
+    os.environ["INGEST_MANIFEST_PATH"] = os.path.join(workdir, "manifest.sqlite")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["RESPONSE_CACHE_PATH"] = os.path.join(workdir, "responses.sqlite")
+
+    from benchmarks import suites, startup
+    from config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, INGEST_BATCH_SIZE
+
+    # Không đặt qua biến MILVUS_URI vì pymilvus cũng đọc biến này và chỉ chấp nhận địa chỉ http
+    store = {"backend": args.backend, "uri": os.path.join(workdir, "milvus_lite.db")}
+    selected = [name.strip() for name in args.suites.split(",") if name.strip()]
+    results: Dict[str, Any] = {}
+
+    for name in selected:
+        print(f"Đang chạy bài đo {name}...", file=sys.stderr)
+        if name == "startup":
+            results[name] = startup.bench_startup(args.startup_repeats)
+        elif name == "loader":
+            results[name] = suites.bench_loader(
+                args.loader_kb, args.loader_repeats, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+            )
+        elif name == "ingest":
+            results[name] = suites.bench_ingest(store, args.ingest_chunks, args.dim, INGEST_BATCH_SIZE)
+        elif name == "search":
+            sizes = [int(size) for size in args.search_sizes.split(",") if size]
+            results[name] = suites.bench_search(store, sizes, args.dim, args.queries, args.k)
+        elif name == "agent":
+            results[name] = suites.bench_agent(
+                store, args.agent_turns, args.dim, corpus_chunks=1000, llm_latency=args.llm_latency
+            )
+        else:
+            parser.error(f"Bài đo không tồn tại: {name}")
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
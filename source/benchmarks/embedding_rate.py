@@ -0,0 +1,166 @@
+# nhập các thư viện cơ bản
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+from typing import Any, Dict, List
+
+# nhập thư viện web
+import uvicorn
+
+
+def start_stub(
+    latency: float,
+    token_latency: float,
+    dim: int,
+    tokens_per_minute: int,
+    requests_per_minute: int
+) -> str:
+    """
+    Chạy server giả lập OpenAI (có giới hạn theo phút) trên một luồng nền.
+
+    Args:
+        latency: Độ trễ của mỗi request (giây)
+        token_latency: Độ trễ thêm cho mỗi 1000 token (giây)
+        dim: Số chiều vector embedding
+        tokens_per_minute: Giới hạn token mỗi phút
+        requests_per_minute: Giới hạn request mỗi phút
+
+    Returns:
+        base_url của API giả lập
+    """
+    from loadtest import create_stub_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(
+        create_stub_app(latency, dim, tokens_per_minute, requests_per_minute, token_latency),
+        host="127.0.0.1",
+        port=port,
+        log_level="error"
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def measure(mode: str, base_url: str, texts: List[str], tokens_per_minute: int, args) -> Dict[str, Any]:
+    """
+    Tạo embedding cho toàn bộ texts và đo thông lượng.
+
+    Args:
+        mode: "direct" (gọi thẳng OpenAIEmbeddings), "adaptive" (bộ lập lịch, không
+            biết giới hạn) hoặc "paced" (bộ lập lịch, biết giới hạn)
+        base_url: Địa chỉ API giả lập
+        texts: Các đoạn văn bản
+        tokens_per_minute: Giới hạn token mỗi phút của server giả lập
+        args: Tham số dòng lệnh
+
+    Returns:
+        Từ điển kết quả
+    """
+    from langchain_openai import OpenAIEmbeddings
+    from embedding_scheduler import ScheduledEmbeddings
+    from history_manager import TokenCounter
+
+    # Đoạn văn bản ngắn nên không cần tách theo độ dài ngữ cảnh (tránh tải bộ mã hóa qua mạng)
+    client = OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        base_url=base_url,
+        api_key="stub",
+        check_embedding_ctx_length=False,
+        max_retries=args.direct_retries if mode == "direct" else 0
+    )
+    token_counter = TokenCounter()
+    embeddings = client
+    if mode != "direct":
+        embeddings = ScheduledEmbeddings(
+            client,
+            max_request_tokens=args.request_tokens,
+            initial_concurrency=args.concurrency,
+            max_concurrency=args.max_concurrency,
+            tokens_per_minute=int(tokens_per_minute * args.pace) if mode == "paced" else 0,
+            token_counter=token_counter
+        )
+
+    total_tokens = sum(token_counter.count_text(text) for text in texts)
+    error = None
+    start = time.perf_counter()
+    try:
+        for offset in range(0, len(texts), args.batch_size):
+            embeddings.embed_documents(texts[offset:offset + args.batch_size])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "mode": mode,
+        "seconds": round(elapsed, 2),
+        "tokens_per_minute": round(total_tokens / elapsed * 60) if not error else 0,
+        "utilization": round(total_tokens / elapsed * 60 / tokens_per_minute, 3) if not error else 0.0,
+        "error": error
+    }
+    if mode != "direct":
+        stats = embeddings.get_stats()
+        result.update({
+            "requests": stats["requests"],
+            "rate_limited": stats["rate_limited"],
+            "retries": stats["retries"],
+            "final_concurrency": stats["concurrency_limit"]
+        })
+    print(
+        f"{mode:<9} {result['seconds']:>7.2f}s {result['tokens_per_minute']:>10,} token/phút "
+        f"({result['utilization']:.0%} giới hạn) {error or ''}",
+        file=sys.stderr
+    )
+    return result
+
+
+def main():
+    """Đo thông lượng embedding dưới giới hạn token mỗi phút của server giả lập và ghi kết quả ra JSON."""
+    parser = argparse.ArgumentParser(description="Đo thông lượng của bộ lập lịch embedding dưới rate limit")
+    parser.add_argument("--chunks", type=int, default=4000, help="Số đoạn văn bản")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Số ký tự mỗi đoạn")
+    parser.add_argument("--tpm", type=int, default=3_000_000, help="Giới hạn token mỗi phút của server giả lập")
+    parser.add_argument("--rpm", type=int, default=0, help="Giới hạn request mỗi phút của server giả lập")
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ cố định mỗi request của server giả lập (giây)")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Độ trễ thêm cho mỗi 1000 token (giây)")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=256, help="Số đoạn mỗi lần gọi embed_documents (như INGEST_BATCH_SIZE)")
+    parser.add_argument("--request-tokens", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--pace", type=float, default=0.95, help="Tỉ lệ giới hạn dùng cho chế độ paced")
+    parser.add_argument("--direct-retries", type=int, default=2, help="Số lần thử lại của client OpenAI ở chế độ direct")
+    parser.add_argument("--modes", default="direct,adaptive,paced")
+    parser.add_argument("--output", help="File JSON để ghi kết quả (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    texts = [
+        (f"Đoạn {i}: " + "nội dung tài liệu mẫu " * args.chunk_chars)[:args.chunk_chars]
+        for i in range(args.chunks)
+    ]
+    results = []
+    for mode in filter(None, args.modes.split(",")):
+        # Mỗi chế độ dùng một server mới để ngân sách giới hạn bắt đầu như nhau
+        base_url = start_stub(args.latency, args.token_latency, args.dim, args.tpm, args.rpm)
+        results.append(measure(mode, base_url, texts, args.tpm, args))
+
+    text = json.dumps({
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results
+    }, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
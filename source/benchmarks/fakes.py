@@ -0,0 +1,95 @@
+# nhập các thư viện cơ bản
+import time
+import hashlib
+from typing import Any, List, Optional
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện langchain
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def hash_vector(text: str, dim: int) -> List[float]:
+    """
+    Tạo vector giả lập xác định theo nội dung văn bản.
+
+    Args:
+        text: Văn bản đầu vào
+        dim: Số chiều vector
+
+    Returns:
+        Vector đã chuẩn hóa
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class HashEmbeddings(Embeddings):
+    """Embedding giả lập: cùng văn bản luôn cho cùng vector, không gọi mạng."""
+
+    def __init__(self, dim: int = 1536):
+        """
+        Khởi tạo HashEmbeddings.
+
+        Args:
+            dim: Số chiều vector
+        """
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Tạo embedding cho danh sách văn bản."""
+        return [hash_vector(text, self.dim) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Tạo embedding cho truy vấn."""
+        return hash_vector(text, self.dim)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Mô hình chat giả lập đi đúng luồng của agent.
+
+    Với câu hỏi mới, mô hình gọi công cụ retrieve bằng chính câu hỏi; sau khi
+    nhận kết quả công cụ, mô hình trả lời bằng một câu cố định. latency giả
+    lập thời gian của mỗi lời gọi LLM (giây).
+    """
+
+    answer: str = "Đây là câu trả lời giả lập dựa trên tài liệu."
+    tool_name: str = "retrieve"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        """Công cụ đã được cố định trong kịch bản nên không cần gắn."""
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        """Sinh phản hồi tiếp theo theo kịch bản."""
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(messages[-1], ToolMessage) or not isinstance(messages[-1], HumanMessage):
+            message = AIMessage(content=self.answer)
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": self.tool_name,
+                    "args": {"query": str(messages[-1].content)},
+                    "id": f"call_{len(messages)}"
+                }]
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
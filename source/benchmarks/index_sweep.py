@@ -0,0 +1,213 @@
+# nhập các thư viện cơ bản
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+# nhập thư viện tính toán
+import numpy as np
+
+# Tên tham số trong chuỗi cấu hình -> tham số của IndexConfig
+_SPEC_KEYS = {"M": "m", "efConstruction": "ef_construction", "nlist": "nlist"}
+
+
+def parse_index_spec(spec: str) -> Tuple[str, Dict[str, int]]:
+    """
+    Đọc cấu hình chỉ mục dạng "HNSW:M=16,efConstruction=200".
+
+    Args:
+        spec: Chuỗi cấu hình
+
+    Returns:
+        Tuple gồm loại chỉ mục và tham số cho IndexConfig
+    """
+    index_type, _, params = spec.partition(":")
+    kwargs = {}
+    for item in filter(None, params.split(",")):
+        key, _, value = item.partition("=")
+        if key not in _SPEC_KEYS:
+            raise ValueError(f"Tham số chỉ mục không hỗ trợ: {key}")
+        kwargs[_SPEC_KEYS[key]] = int(value)
+    return index_type.upper(), kwargs
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Tạo các vector đã chuẩn hóa phân bố theo cụm, gần với embedding văn bản thật
+    hơn vector ngẫu nhiên đều (chỉ mục IVF/HNSW hoạt động khác hẳn trên hai loại này).
+
+    Args:
+        count: Số vector
+        dim: Số chiều
+        clusters: Số cụm
+        seed: Hạt giống ngẫu nhiên
+
+    Returns:
+        Mảng (count, dim) float32
+    """
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors += rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_neighbors(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Tìm k láng giềng gần nhất chính xác (cosine) để làm đáp án cho recall."""
+    scores = queries @ data.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def sweep(
+    manager,
+    data: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    index_specs: List[str],
+    ef_values: List[int],
+    nprobe_values: List[int],
+    metric_type: str
+) -> List[Dict[str, Any]]:
+    """
+    Đo recall@k và độ trễ cho từng cấu hình chỉ mục và tham số tìm kiếm.
+
+    Args:
+        manager: EmbeddingManager (backend milvus) của collection đo
+        data: Các vector trong collection
+        queries: Các vector truy vấn
+        k: Số kết quả mỗi truy vấn
+        index_specs: Danh sách cấu hình chỉ mục dạng "HNSW:M=16,efConstruction=200"
+        ef_values: Các giá trị ef cần thử với HNSW
+        nprobe_values: Các giá trị nprobe cần thử với IVF
+        metric_type: Độ đo khoảng cách
+
+    Returns:
+        Danh sách kết quả, mỗi phần tử ứng với một cặp (chỉ mục, tham số tìm kiếm)
+    """
+    from milvus_index import GRAPH_INDEXES, IVF_INDEXES, IndexConfig
+    from benchmarks.suites import latency_stats
+
+    # Thêm dữ liệu một lần; các chỉ mục được xây lại trên cùng dữ liệu
+    pks = []
+    for offset in range(0, len(data), 10_000):
+        batch = data[offset:offset + 10_000]
+        pks.extend(manager.vector_store.add_embeddings(
+            texts=[f"Đoạn {offset + i}" for i in range(len(batch))],
+            embeddings=batch.tolist(),
+            metadatas=[{"source": "sweep"} for _ in range(len(batch))],
+            batch_size=len(batch)
+        ))
+    manager._flush()
+    truth = [{pks[i] for i in row} for row in exact_neighbors(data, queries, k)]
+
+    results = []
+    for spec in index_specs:
+        index_type, kwargs = parse_index_spec(spec)
+        config = IndexConfig(index_type=index_type, metric_type=metric_type, **kwargs)
+        start = time.perf_counter()
+        manager.rebuild_index(config)
+        build_seconds = time.perf_counter() - start
+
+        if index_type in GRAPH_INDEXES:
+            variants = [{"ef": ef} for ef in ef_values]
+        elif index_type in IVF_INDEXES:
+            variants = [{"nprobe": nprobe} for nprobe in nprobe_values if nprobe <= config.nlist]
+        else:
+            variants = [{}]
+
+        for params in variants:
+            search_kwargs = manager._search_kwargs(k, params)
+            # Truy vấn khởi động
+            manager.vector_store.similarity_search_by_vector(queries[0].tolist(), k=k, **search_kwargs)
+
+            samples = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                docs = manager.vector_store.similarity_search_by_vector(query.tolist(), k=k, **search_kwargs)
+                samples.append(time.perf_counter() - start)
+                hits += len({doc.metadata["pk"] for doc in docs} & expected)
+
+            results.append({
+                "index": spec,
+                "search_params": params,
+                "build_seconds": round(build_seconds, 2),
+                f"recall_at_{k}": round(hits / (k * len(queries)), 4),
+                **latency_stats(samples)
+            })
+            print(
+                f"{spec:<35} {json.dumps(params):<18} recall@{k}={results[-1][f'recall_at_{k}']:.3f} "
+                f"p50={results[-1]['p50_ms']:.2f}ms p95={results[-1]['p95_ms']:.2f}ms",
+                file=sys.stderr
+            )
+    return results
+
+
+def main():
+    """Chạy bài quét cấu hình chỉ mục trên Milvus Lite (hoặc Milvus server) và ghi kết quả ra JSON."""
+    parser = argparse.ArgumentParser(description="Quét recall@k và độ trễ theo cấu hình chỉ mục Milvus")
+    parser.add_argument("--uri", help="Địa chỉ Milvus (mặc định tạo file Milvus Lite tạm)")
+    parser.add_argument("--size", type=int, default=20000, help="Số vector trong collection")
+    parser.add_argument("--dim", type=int, default=384, help="Số chiều vector")
+    parser.add_argument("--clusters", type=int, default=200, help="Số cụm của dữ liệu giả lập")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--metric", default="COSINE", help="Độ đo: L2, IP hoặc COSINE")
+    parser.add_argument(
+        "--indexes",
+        default="FLAT;HNSW:M=8,efConstruction=64;HNSW:M=16,efConstruction=200;IVF_FLAT:nlist=128;IVF_SQ8:nlist=128",
+        help="Các cấu hình chỉ mục, phân tách bằng dấu chấm phẩy"
+    )
+    parser.add_argument("--ef", default="8,16,32,64,128,256", help="Các giá trị ef cho HNSW")
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64", help="Các giá trị nprobe cho IVF")
+    parser.add_argument("--output", help="File JSON để ghi kết quả (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    # Cấu hình đọc biến môi trường lúc import: giữ manifest ngoài dữ liệu thật
+    workdir = tempfile.mkdtemp(prefix="rag-index-sweep-")
+    os.environ["INGEST_MANIFEST_PATH"] = os.path.join(workdir, "manifest.sqlite")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+    from embedding_manager import EmbeddingManager
+    from benchmarks.fakes import HashEmbeddings
+
+    manager = EmbeddingManager(
+        uri=args.uri or os.path.join(workdir, "milvus_lite.db"),
+        collection_name="index_sweep",
+        backend="milvus",
+        embeddings=HashEmbeddings(args.dim)
+    )
+    manager.clear_vector_store()
+
+    data = clustered_vectors(args.size, args.dim, args.clusters, seed=1)
+    queries = clustered_vectors(args.queries, args.dim, args.clusters, seed=2)
+    results = sweep(
+        manager,
+        data,
+        queries,
+        args.k,
+        [spec for spec in args.indexes.split(";") if spec],
+        [int(value) for value in args.ef.split(",") if value],
+        [int(value) for value in args.nprobe.split(",") if value],
+        args.metric.upper()
+    )
+    manager.vector_store.client.drop_collection(manager.collection_name)
+
+    text = json.dumps({
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results
+    }, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
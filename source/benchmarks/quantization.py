@@ -0,0 +1,175 @@
+# nhập các thư viện cơ bản
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+# nhập thư viện tính toán
+import numpy as np
+
+
+def parse_mode(spec: str) -> Tuple[str, Optional[int]]:
+    """
+    Đọc cấu hình nén dạng "int8" hoặc "binary:512" (kiểu nén và số chiều của lượt đầu).
+
+    Args:
+        spec: Chuỗi cấu hình
+
+    Returns:
+        Tuple gồm kiểu nén và số chiều (None là tất cả)
+    """
+    quantization, _, dims = spec.partition(":")
+    return quantization.lower(), int(dims) if dims else None
+
+
+def load_vectors(path: str, queries: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Đọc embedding thật từ file .npy; các dòng cuối được tách ra làm truy vấn.
+
+    Args:
+        path: Đường dẫn file .npy kích thước (số vector, dim)
+        queries: Số truy vấn
+
+    Returns:
+        Tuple gồm dữ liệu và truy vấn đã chuẩn hóa (float32)
+    """
+    vectors = np.load(path).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors[:-queries], vectors[-queries:]
+
+
+def measure(
+    data: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    k: int,
+    quantization: str,
+    search_dims: Optional[int],
+    rerank_factors: List[int],
+    workdir: str
+) -> List[Dict[str, Any]]:
+    """
+    Đo recall@k, độ trễ và dung lượng của một cấu hình nén.
+
+    Args:
+        data: Các vector trong collection
+        queries: Các vector truy vấn
+        truth: Tập khóa chính của k láng giềng chính xác cho từng truy vấn
+        k: Số kết quả mỗi truy vấn
+        quantization: Kiểu nén của lượt tìm kiếm đầu
+        search_dims: Số chiều của lượt tìm kiếm đầu (None là tất cả)
+        rerank_factors: Các bội số ứng viên xếp hạng lại cần thử
+        workdir: Thư mục tạm cho vector store
+
+    Returns:
+        Danh sách kết quả, mỗi phần tử ứng với một giá trị rerank_factor
+    """
+    from numpy_store import NumpyVectorStore
+    from benchmarks.suites import latency_stats
+
+    path = os.path.join(workdir, f"{quantization}-{search_dims or 'all'}")
+    store = NumpyVectorStore(path, quantization=quantization, search_dims=search_dims, drop_old=True)
+    for offset in range(0, len(data), 10_000):
+        batch = data[offset:offset + 10_000]
+        store.add_embeddings([""] * len(batch), batch)
+    memory = store.memory_stats()
+
+    # Không nén thì không có bước xếp hạng lại
+    factors = rerank_factors if quantization != "none" else [1]
+    results = []
+    for factor in factors:
+        store.rerank_factor = factor
+        store.similarity_search_by_vector(queries[0], k=k)
+
+        samples = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(query, k=k)
+            samples.append(time.perf_counter() - start)
+            hits += len({doc.metadata["pk"] for doc in docs} & expected)
+
+        results.append({
+            "quantization": quantization,
+            "search_dims": memory["search_dims"],
+            "rerank_factor": factor if quantization != "none" else None,
+            f"recall_at_{k}": round(hits / (k * len(queries)), 4),
+            "search_bytes_per_vector": memory["search_bytes"] // max(memory["rows"], 1),
+            "search_mb": round(memory["search_bytes"] / 2**20, 2),
+            "compression": memory["compression"],
+            **latency_stats(samples)
+        })
+        print(
+            f"{quantization:<10} dims={memory['search_dims']:<5} rerank={factor:<3} "
+            f"recall@{k}={results[-1][f'recall_at_{k}']:.3f} "
+            f"{results[-1]['search_mb']:.1f}MB (x{memory['compression']}) "
+            f"p50={results[-1]['p50_ms']:.2f}ms",
+            file=sys.stderr
+        )
+    del store
+    shutil.rmtree(path, ignore_errors=True)
+    return results
+
+
+def main():
+    """Chạy báo cáo recall theo dung lượng cho các kiểu nén vector và ghi kết quả ra JSON."""
+    parser = argparse.ArgumentParser(description="Báo cáo recall@k theo dung lượng của các kiểu nén vector")
+    parser.add_argument("--embeddings", help="File .npy chứa embedding thật (mặc định dùng dữ liệu giả lập)")
+    parser.add_argument("--size", type=int, default=20000, help="Số vector giả lập")
+    parser.add_argument("--dim", type=int, default=1536, help="Số chiều vector giả lập")
+    parser.add_argument("--clusters", type=int, default=200, help="Số cụm của dữ liệu giả lập")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument(
+        "--modes",
+        default="none;truncated:512;int8;int8:512;binary;binary:512",
+        help="Các cấu hình nén dạng kiểu[:số chiều], phân tách bằng dấu chấm phẩy"
+    )
+    parser.add_argument("--rerank", default="1,4,16", help="Các giá trị VECTOR_RERANK_FACTOR cần thử")
+    parser.add_argument("--output", help="File JSON để ghi kết quả (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    from benchmarks.index_sweep import clustered_vectors, exact_neighbors
+
+    if args.embeddings:
+        data, queries = load_vectors(args.embeddings, args.queries)
+    else:
+        # Dữ liệu giả lập trải đều thông tin trên mọi chiều, nên kết quả của
+        # "truncated" bi quan hơn so với embedding Matryoshka thật
+        data = clustered_vectors(args.size, args.dim, args.clusters, seed=1)
+        queries = clustered_vectors(args.queries, args.dim, args.clusters, seed=2)
+    truth = [set(row.tolist()) for row in exact_neighbors(data, queries, args.k)]
+
+    workdir = tempfile.mkdtemp(prefix="rag-quantization-")
+    results = []
+    for spec in filter(None, args.modes.split(";")):
+        quantization, search_dims = parse_mode(spec)
+        results.extend(measure(
+            data,
+            queries,
+            truth,
+            args.k,
+            quantization,
+            search_dims,
+            [int(value) for value in args.rerank.split(",") if value],
+            workdir
+        ))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps({
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results
+    }, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# nhập các thư viện cơ bản
+import io
+import zipfile
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+
+def sample_paragraphs(target_bytes: int, ascii_only: bool = False) -> List[str]:
+    """
+    Tạo các đoạn văn bản giả lập xác định có tổng kích thước xấp xỉ target_bytes.
+
+    Args:
+        target_bytes: Kích thước mong muốn (byte)
+        ascii_only: Nếu True, chỉ dùng ký tự ASCII (cho PDF dùng font chuẩn)
+
+    Returns:
+        Danh sách đoạn văn bản
+    """
+    if ascii_only:
+        template = "Paragraph {i} discusses topic {t}: retrieval quality, chunk size {s} and latency budget {l} ms."
+    else:
+        template = "Đoạn {i} nói về chủ đề {t}: chất lượng truy xuất, kích thước đoạn {s} và độ trễ {l} ms."
+
+    paragraphs = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        paragraph = " ".join(
+            template.format(i=i, t=(i * 7 + j) % 23, s=200 + j * 50, l=(i + j) % 500)
+            for j in range(4)
+        )
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+        i += 1
+    return paragraphs
+
+
+def _make_txt(paragraphs: List[str]) -> bytes:
+    """Tạo file văn bản thuần."""
+    return "\n\n".join(paragraphs).encode("utf-8")
+
+
+def _make_md(paragraphs: List[str]) -> bytes:
+    """Tạo file Markdown có tiêu đề mục."""
+    lines = []
+    for i, paragraph in enumerate(paragraphs):
+        if i % 10 == 0:
+            lines.append(f"## Mục {i // 10}")
+        lines.append(paragraph)
+    return "\n\n".join(lines).encode("utf-8")
+
+
+def _make_csv(paragraphs: List[str]) -> bytes:
+    """Tạo file CSV, mỗi đoạn một dòng."""
+    rows = ["id,topic,content"]
+    rows.extend(f'{i},{i % 23},"{p}"' for i, p in enumerate(paragraphs))
+    return "\n".join(rows).encode("utf-8")
+
+
+def _make_html(paragraphs: List[str]) -> bytes:
+    """Tạo file HTML, mỗi đoạn một thẻ <p>."""
+    body = "".join(f"<p>{escape(p)}</p>" for p in paragraphs)
+    return f"<html><head><title>Benchmark</title></head><body>{body}</body></html>".encode("utf-8")
+
+
+def _make_docx(paragraphs: List[str]) -> bytes:
+    """Tạo file .docx tối giản (chỉ gồm document.xml) mà không cần thư viện ngoài."""
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/officeDocument" Target="word/document.xml"/>'
+        '</Relationships>'
+    )
+    body = "".join(f"<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("_rels/.rels", rels)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+def _make_pdf(paragraphs: List[str]) -> bytes:
+    """Tạo file PDF nhiều trang chỉ gồm văn bản, dùng font chuẩn Helvetica."""
+    lines_per_page = 60
+    line_width = 95
+
+    # Ngắt các đoạn thành dòng
+    lines = []
+    for paragraph in paragraphs:
+        words = paragraph.split()
+        current = ""
+        for word in words:
+            if current and len(current) + len(word) + 1 > line_width:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.extend([current, ""])
+
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # danh sách trang, điền sau khi biết số object
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_ids = []
+    for page_lines in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for line in page_lines
+        )
+        stream = f"BT /F1 9 Tf 12 TL 40 800 Td {text}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return output.getvalue()
+
+
+def _make_pptx(paragraphs: List[str]) -> bytes:
+    """Tạo file .pptx, mỗi slide chứa vài đoạn văn bản."""
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]
+    for start in range(0, len(paragraphs), 3):
+        slide = presentation.slides.add_slide(layout)
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6))
+        box.text_frame.text = "\n".join(paragraphs[start:start + 3])
+
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+# Phần mở rộng -> (hàm tạo file, chỉ dùng ASCII)
+SAMPLE_BUILDERS: Dict[str, tuple] = {
+    ".txt": (_make_txt, False),
+    ".md": (_make_md, False),
+    ".csv": (_make_csv, False),
+    ".html": (_make_html, False),
+    ".docx": (_make_docx, False),
+    ".pdf": (_make_pdf, True),
+    ".pptx": (_make_pptx, False),
+}
+
+
+def build_sample(extension: str, target_bytes: int) -> bytes:
+    """
+    Tạo nội dung file mẫu cho một loại file.
+
+    Args:
+        extension: Phần mở rộng, ví dụ ".pdf"
+        target_bytes: Kích thước văn bản mong muốn (byte)
+
+    Returns:
+        Nội dung file
+    """
+    builder, ascii_only = SAMPLE_BUILDERS[extension]
+    return builder(sample_paragraphs(target_bytes, ascii_only=ascii_only))
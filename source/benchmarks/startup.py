@@ -0,0 +1,157 @@
+# nhập các thư viện cơ bản
+import os
+import sys
+import time
+import subprocess
+from typing import Any, Dict, List
+
+# nhập thư viện tính toán
+import numpy as np
+
+# Thư mục source, nơi chạy các tiến trình đo
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Khởi tạo các đối tượng quản lý như get_managers() rồi chờ luồng khởi động nền
+_READY_SCRIPT = """
+import time
+start = time.perf_counter()
+from embedding_manager import EmbeddingManager
+from agent_manager import AgentManager
+imported = time.perf_counter()
+embedding_manager = EmbeddingManager()
+agent_manager = AgentManager(embedding_manager)
+threads = [embedding_manager.warm_up(), agent_manager.warm_up()]
+constructed = time.perf_counter()
+for thread in threads:
+    thread.join()
+ready = time.perf_counter()
+print(imported - start, constructed - imported, ready - constructed, embedding_manager.ready and agent_manager.ready)
+"""
+
+# Chạy app.py một lần bằng bộ kiểm thử của Streamlit (không cần trình duyệt)
+_RENDER_SCRIPT = """
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout=120)
+app.run()
+if app.exception:
+    raise SystemExit(str(app.exception[0].message))
+"""
+
+
+def _startup_env() -> Dict[str, str]:
+    """
+    Biến môi trường cho tiến trình đo: vector store cục bộ và khóa API giả.
+
+    Client chỉ được tạo, không gọi API, nên khóa giả là đủ.
+    """
+    env = dict(os.environ)
+    env.setdefault("VECTOR_BACKEND", "numpy")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("XAI_API_KEY", "benchmark")
+    return env
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    """Chạy một tiến trình Python mới trong thư mục source."""
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=SOURCE_DIR,
+        env=_startup_env(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def bench_imports(modules: List[str], repeats: int) -> Dict[str, Any]:
+    """
+    Đo thời gian import từng module trong tiến trình mới (không có cache trong bộ nhớ).
+
+    Args:
+        modules: Tên các module cần đo
+        repeats: Số lần đo mỗi module
+
+    Returns:
+        Từ điển module -> thời gian import trung vị (giây)
+    """
+    results = {}
+    for module in modules:
+        samples = []
+        for _ in range(repeats):
+            output = _run([
+                "-c",
+                f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+            ])
+            samples.append(float(output.stdout.split()[-1]))
+        results[module] = round(float(np.median(samples)), 3)
+    return results
+
+
+def bench_ready(repeats: int) -> Dict[str, Any]:
+    """
+    Đo thời gian tạo EmbeddingManager/AgentManager và thời gian khởi động nền.
+
+    Args:
+        repeats: Số lần đo
+
+    Returns:
+        Từ điển thời gian trung vị (giây) cho import, khởi tạo và sẵn sàng
+    """
+    samples = []
+    for _ in range(repeats):
+        fields = _run(["-c", _READY_SCRIPT]).stdout.split()[-4:]
+        samples.append([float(value) for value in fields[:3]])
+        if fields[3] != "True":
+            raise RuntimeError("Khởi động nền không hoàn tất")
+
+    imported, constructed, ready = np.median(np.asarray(samples), axis=0)
+    return {
+        "import_seconds": round(float(imported), 3),
+        "construct_seconds": round(float(constructed), 4),
+        "background_ready_seconds": round(float(ready), 3)
+    }
+
+
+def bench_first_render(repeats: int) -> Dict[str, Any]:
+    """
+    Đo thời gian từ khi khởi động tiến trình đến khi app.py chạy xong lần đầu.
+
+    Args:
+        repeats: Số lần đo
+
+    Returns:
+        Từ điển thời gian trung vị và nhỏ nhất (giây)
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _run(["-c", _RENDER_SCRIPT])
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_seconds": round(float(np.median(samples)), 3),
+        "min_seconds": round(min(samples), 3)
+    }
+
+
+def bench_startup(repeats: int) -> Dict[str, Any]:
+    """
+    Đo chi phí khởi động lạnh: import, khởi tạo client và lần hiển thị đầu tiên.
+
+    Args:
+        repeats: Số lần đo mỗi mục
+
+    Returns:
+        Từ điển số liệu khởi động
+    """
+    results: Dict[str, Any] = {
+        "import": bench_imports(
+            ["document_loader", "embedding_manager", "agent_manager", "server"], repeats
+        ),
+        "managers": bench_ready(repeats)
+    }
+    try:
+        results["first_render"] = bench_first_render(repeats)
+    except (ImportError, subprocess.CalledProcessError) as e:
+        # Thiếu streamlit hoặc app.py lỗi: vẫn giữ các số liệu còn lại
+        results["first_render"] = {"error": getattr(e, "stderr", None) or str(e)}
+    return results
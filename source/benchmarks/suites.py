@@ -0,0 +1,295 @@
+# nhập các thư viện cơ bản
+import os
+import time
+import shutil
+import contextlib
+from typing import Any, Dict, List
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+# nhập các module tùy chỉnh
+from document_loader import DocumentLoader
+from embedding_manager import EmbeddingManager
+from agent_manager import AgentManager
+from benchmarks.fakes import HashEmbeddings, ScriptedChatModel
+from benchmarks.samples import SAMPLE_BUILDERS, build_sample
+
+# Số dòng ghi mỗi lần khi dựng collection lớn cho bài đo tìm kiếm
+FILL_BATCH_SIZE = 50_000
+
+
+class SampleFile:
+    """File mẫu trong bộ nhớ với cùng giao diện như file tải lên qua Streamlit."""
+
+    def __init__(self, name: str, data: bytes):
+        """
+        Khởi tạo SampleFile.
+
+        Args:
+            name: Tên file
+            data: Nội dung file
+        """
+        self.name = name
+        self.data = data
+
+    def getbuffer(self) -> bytes:
+        """Trả về toàn bộ nội dung file."""
+        return self.data
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    """
+    Tính các phân vị độ trễ (mili giây).
+
+    Args:
+        samples: Danh sách độ trễ (giây)
+
+    Returns:
+        Từ điển gồm p50, p95, p99, mean (ms) và số mẫu
+    """
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "samples": len(samples)
+    }
+
+
+def bench_loader(file_kb: int, repeats: int, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """
+    Đo thông lượng tải và phân đoạn của DocumentLoader theo từng loại file.
+
+    Args:
+        file_kb: Kích thước văn bản của mỗi file mẫu (KB)
+        repeats: Số lần lặp cho mỗi loại file
+        chunk_size: Kích thước đoạn văn bản
+        chunk_overlap: Độ chồng lấp giữa các đoạn
+
+    Returns:
+        Từ điển loại file -> số liệu (MB/s, chunks/s) hoặc lỗi
+    """
+    results = {}
+    for extension in SAMPLE_BUILDERS:
+        try:
+            data = build_sample(extension, file_kb * 1024)
+            sample = SampleFile(f"sample{extension}", data)
+
+            # Lần chạy đầu để nạp thư viện của loader, không tính thời gian
+            DocumentLoader.load_and_split_documents([sample], chunk_size, chunk_overlap)
+
+            start = time.perf_counter()
+            chunks = 0
+            for _ in range(repeats):
+                documents = DocumentLoader.load_and_split_documents([sample], chunk_size, chunk_overlap)
+                chunks += len(documents[sample.name])
+            elapsed = time.perf_counter() - start
+
+            results[extension] = {
+                "file_bytes": len(data),
+                "seconds_per_file": round(elapsed / repeats, 4),
+                "mb_per_second": round(len(data) * repeats / elapsed / 1e6, 3),
+                "chunks_per_second": round(chunks / elapsed, 1)
+            }
+        except Exception as e:
+            # Thiếu thư viện cho một loại file không làm hỏng cả bộ đo
+            results[extension] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def _synthetic_chunks(count: int, files: int = 20) -> List[Document]:
+    """Tạo các đoạn văn bản giả lập chia đều cho một số file."""
+    return [
+        Document(
+            page_content=f"Đoạn {i} của tài liệu {i % files}: nội dung mẫu để đo hiệu năng nạp dữ liệu.",
+            metadata={"source": f"doc{i % files}.txt", "file_hash": f"hash{i % files}", "page_index": 0}
+        )
+        for i in range(count)
+    ]
+
+
+def bench_ingest(store: Dict[str, str], chunks: int, dim: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Đo thông lượng add_documents, gồm cả lần nạp lại dữ liệu không đổi.
+
+    Args:
+        store: Tham số vector store của EmbeddingManager (backend, uri)
+        chunks: Số đoạn văn bản
+        dim: Số chiều embedding giả lập
+        batch_size: Số đoạn trong mỗi lô
+
+    Returns:
+        Từ điển số liệu nạp dữ liệu
+    """
+    manager = EmbeddingManager(
+        collection_name="bench_ingest",
+        **store,
+        embeddings=HashEmbeddings(dim)
+    )
+    documents = _synthetic_chunks(chunks)
+    documents_dict: Dict[str, List[Document]] = {}
+    for doc in documents:
+        documents_dict.setdefault(doc.metadata["source"], []).append(doc)
+
+    first = manager.add_documents(documents_dict, clear_existing=True, batch_size=batch_size)
+
+    start = time.perf_counter()
+    manager.add_documents(documents_dict, batch_size=batch_size)
+    unchanged_seconds = time.perf_counter() - start
+
+    return {
+        "chunks": chunks,
+        "chunks_per_second": first["chunks_per_second"],
+        "reingest_unchanged_seconds": round(unchanged_seconds, 4)
+    }
+
+
+def _fill_store(manager: EmbeddingManager, size: int, dim: int, seed: int = 0) -> float:
+    """
+    Ghi trực tiếp size vector ngẫu nhiên vào vector store (bỏ qua embedding và manifest).
+
+    Args:
+        manager: EmbeddingManager của collection cần ghi
+        size: Số vector
+        dim: Số chiều vector
+        seed: Hạt giống ngẫu nhiên
+
+    Returns:
+        Thời gian ghi (giây)
+    """
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for offset in range(0, size, FILL_BATCH_SIZE):
+        count = min(FILL_BATCH_SIZE, size - offset)
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        manager.vector_store.add_embeddings(
+            texts=[f"Đoạn {offset + i}" for i in range(count)],
+            embeddings=vectors if manager.backend == "numpy" else vectors.tolist(),
+            metadatas=[{"source": f"doc{(offset + i) % 100}.txt"} for i in range(count)],
+            batch_size=count
+        )
+    manager._flush()
+    return time.perf_counter() - start
+
+
+def bench_search(store: Dict[str, str], sizes: List[int], dim: int, queries: int, k: int) -> Dict[str, Any]:
+    """
+    Đo độ trễ similarity_search ở nhiều kích thước collection.
+
+    Mỗi truy vấn là một chuỗi khác nhau nên không trúng cache kết quả tìm kiếm.
+
+    Args:
+        store: Tham số vector store của EmbeddingManager (backend, uri)
+        sizes: Danh sách số đoạn trong collection
+        dim: Số chiều vector
+        queries: Số truy vấn cho mỗi kích thước
+        k: Số kết quả mỗi truy vấn
+
+    Returns:
+        Từ điển kích thước -> số liệu độ trễ
+    """
+    results = {}
+    for size in sizes:
+        manager = EmbeddingManager(
+            collection_name=f"bench_search_{size}",
+            **store,
+            embeddings=HashEmbeddings(dim)
+        )
+        manager.clear_vector_store()
+        fill_seconds = _fill_store(manager, size, dim)
+
+        # Truy vấn khởi động (mở memory-map, nạp collection)
+        manager.similarity_search("khởi động", k=k)
+
+        samples = []
+        for i in range(queries):
+            start = time.perf_counter()
+            manager.similarity_search(f"truy vấn {size} số {i}", k=k)
+            samples.append(time.perf_counter() - start)
+
+        results[str(size)] = {"fill_seconds": round(fill_seconds, 2), **latency_stats(samples)}
+
+        manager.clear_vector_store()
+        if manager.backend == "numpy":
+            shutil.rmtree(manager.vector_store.path, ignore_errors=True)
+    return results
+
+
+def bench_agent(
+    store: Dict[str, str],
+    turns: int,
+    dim: int,
+    corpus_chunks: int,
+    llm_latency: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Đo chi phí của một lượt AgentManager.invoke với LLM giả lập.
+
+    Với llm_latency bằng 0, độ trễ đo được là phần overhead của agent (LangChain,
+    công cụ retrieve, tìm kiếm, đóng gói ngữ cảnh, thu gọn lịch sử).
+    Nếu bật cache câu trả lời, các câu hỏi được hỏi lại lần hai để đo lượt trúng cache.
+    Cuối cùng đo lại với đường tắt (kết quả tìm trước nằm sẵn trong prompt đầu tiên).
+
+    Args:
+        store: Tham số vector store của EmbeddingManager (backend, uri)
+        turns: Số lượt trò chuyện
+        dim: Số chiều embedding giả lập
+        corpus_chunks: Số đoạn trong collection dùng để truy xuất
+        llm_latency: Thời gian giả lập của mỗi lời gọi LLM (giây)
+
+    Returns:
+        Từ điển số liệu độ trễ mỗi lượt
+    """
+    embedding_manager = EmbeddingManager(
+        collection_name="bench_agent",
+        **store,
+        embeddings=HashEmbeddings(dim)
+    )
+    documents = _synthetic_chunks(corpus_chunks)
+    embedding_manager.add_documents({"corpus": documents}, clear_existing=True)
+    agent_manager = AgentManager(embedding_manager, llm=ScriptedChatModel(latency=llm_latency))
+
+    samples = []
+    # AgentExecutor chạy ở chế độ verbose; bỏ phần in ra để không làm nhiễu kết quả
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        agent_manager.invoke("khởi động")
+        for i in range(turns):
+            start = time.perf_counter()
+            agent_manager.invoke(f"Câu hỏi số {i} về tài liệu {i % 20}?")
+            samples.append(time.perf_counter() - start)
+
+        # Hỏi lại đúng các câu hỏi trên: câu trả lời lấy từ cache, không chạy agent
+        cached_samples = []
+        if agent_manager.response_cache is not None:
+            for i in range(turns):
+                start = time.perf_counter()
+                agent_manager.invoke(f"Câu hỏi số {i} về tài liệu {i % 20}?")
+                cached_samples.append(time.perf_counter() - start)
+
+        # Câu hỏi mới (không trúng cache) với đường tắt
+        agent_manager.fast_path = True
+        fast_samples = []
+        for i in range(turns):
+            start = time.perf_counter()
+            agent_manager.invoke(f"Câu hỏi nhanh số {i} về tài liệu {i % 20}?")
+            fast_samples.append(time.perf_counter() - start)
+        fast_metrics = agent_manager.turn_metrics[-turns:]
+
+    results = {
+        "turns_per_second": round(len(samples) / sum(samples), 1),
+        **latency_stats(samples)
+    }
+    if cached_samples:
+        results["cached"] = latency_stats(cached_samples)
+    results["fast_path"] = {
+        # Tỉ lệ lượt mô hình trả lời ngay từ kết quả tìm trước, không gọi thêm công cụ
+        "sufficient_rate": round(sum(m["tool_calls"] == 0 for m in fast_metrics) / len(fast_metrics), 3),
+        **latency_stats(fast_samples)
+    }
+    return results
@@ -0,0 +1,232 @@
+# nhập các thư viện cơ bản
+import re
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+# Các khóa trong kết quả describe_index không phải tham số xây dựng chỉ mục
+_INDEX_INFO_KEYS = {
+    "index_type", "metric_type", "field_name", "index_name",
+    "total_rows", "indexed_rows", "pending_index_rows", "state"
+}
+
+
+def tenant_collection_name(base: str, tenant: str) -> str:
+    """
+    Tạo tên collection riêng cho một tenant/workspace.
+
+    Tên collection của Milvus chỉ gồm chữ cái, chữ số và dấu gạch dưới; tên
+    tenant có ký tự khác (ví dụ tiếng Việt) được thay thế và thêm mã băm ngắn
+    để hai tenant khác nhau không trùng collection.
+
+    Args:
+        base: Tên collection gốc (MILVUS_COLLECTION)
+        tenant: Tên tenant/workspace
+
+    Returns:
+        Tên collection hợp lệ
+    """
+    slug = re.sub(r"[^0-9A-Za-z_]", "_", tenant)[:64]
+    if slug != tenant:
+        slug = f"{slug}_{hashlib.sha256(tenant.encode('utf-8')).hexdigest()[:8]}"
+    return f"{base}_{slug}"
+
+
+class CollectionManager:
+    """
+    Quản lý vòng đời các collection trên một Milvus: xóa/tạo lại và nạp/giải phóng bộ nhớ.
+
+    Chỉ tối đa max_loaded collection được nạp vào bộ nhớ cùng lúc; khi cần nạp
+    thêm, collection lâu không dùng nhất (và không có truy vấn đang chạy) được
+    giải phóng. Nhờ đó nhiều tenant dùng chung một node Milvus mà không phải
+    giữ mọi collection trong bộ nhớ.
+    """
+
+    def __init__(self, uri: str, max_loaded: int = 8):
+        """
+        Khởi tạo CollectionManager.
+
+        Args:
+            uri: Địa chỉ Milvus (server hoặc đường dẫn file Milvus Lite)
+            max_loaded: Số collection tối đa được nạp vào bộ nhớ cùng lúc
+        """
+        self.uri = uri
+        self.max_loaded = max_loaded
+        self._client = None
+
+        self._lock = threading.Lock()
+        # Tên collection -> sự kiện báo đã nạp xong, theo thứ tự dùng gần nhất
+        self._loaded: "OrderedDict[str, threading.Event]" = OrderedDict()
+        self._in_use: Dict[str, int] = {}
+        self.loads = 0
+        self.releases = 0
+
+    @property
+    def client(self):
+        """MilvusClient, kết nối ở lần dùng đầu tiên."""
+        if self._client is None:
+            from pymilvus import MilvusClient
+
+            self._client = MilvusClient(uri=self.uri)
+        return self._client
+
+    def has(self, name: str) -> bool:
+        """Kiểm tra collection đã tồn tại chưa."""
+        return self.client.has_collection(name)
+
+    def list(self) -> List[str]:
+        """Liệt kê các collection trên Milvus."""
+        return self.client.list_collections()
+
+    def drop(self, name: str) -> bool:
+        """
+        Xóa một collection.
+
+        Args:
+            name: Tên collection
+
+        Returns:
+            True nếu collection tồn tại và đã bị xóa
+        """
+        with self._lock:
+            self._loaded.pop(name, None)
+        if not self.has(name):
+            return False
+        self.client.drop_collection(name)
+        return True
+
+    def reset(self, name: str) -> bool:
+        """
+        Xóa toàn bộ dữ liệu của collection bằng cách xóa và tạo lại với cùng schema.
+
+        Schema, chỉ mục và số phân vùng được đọc từ collection cũ, nên collection
+        mới dùng được ngay mà không cần ghi dữ liệu mẫu hay gọi API embedding.
+
+        Args:
+            name: Tên collection
+
+        Returns:
+            True nếu collection đã được tạo lại, False nếu chưa tồn tại
+        """
+        from pymilvus import CollectionSchema
+
+        if not self.has(name):
+            return False
+
+        client = self.client
+        description = client.describe_collection(name)
+        indexes = [client.describe_index(name, index) for index in client.list_indexes(name)]
+
+        schema = CollectionSchema.construct_from_dict(description)
+        index_params = client.prepare_index_params()
+        for info in indexes:
+            index_params.add_index(
+                info["field_name"],
+                index_type=info["index_type"],
+                index_name=info["index_name"],
+                metric_type=info.get("metric_type") if info.get("metric_type") != "NONE" else None,
+                params={k: v for k, v in info.items() if k not in _INDEX_INFO_KEYS}
+            )
+
+        kwargs: Dict[str, Any] = {}
+        if any(field.is_partition_key for field in schema.fields):
+            kwargs["num_partitions"] = description.get("num_partitions")
+
+        self.drop(name)
+        client.create_collection(name, schema=schema, index_params=index_params, **kwargs)
+        # create_collection có chỉ mục sẽ tự nạp collection: ghi nhận để LRU tính đúng
+        self.mark_loaded(name)
+        return True
+
+    def mark_loaded(self, name: str) -> None:
+        """
+        Ghi nhận một collection đã được nạp ngoài use() và giải phóng bớt nếu vượt giới hạn.
+
+        Args:
+            name: Tên collection
+        """
+        with self._lock:
+            ready = self._loaded.setdefault(name, threading.Event())
+            ready.set()
+            self._loaded.move_to_end(name)
+            victims = self._pick_victims()
+        self._release(victims)
+
+    def _pick_victims(self) -> List[str]:
+        """Chọn các collection lâu không dùng nhất cần giải phóng (gọi khi giữ khóa)."""
+        victims = []
+        for name in list(self._loaded):
+            if len(self._loaded) <= self.max_loaded:
+                break
+            if self._in_use.get(name):
+                continue
+            del self._loaded[name]
+            victims.append(name)
+        return victims
+
+    def _release(self, names: List[str]) -> None:
+        """Giải phóng bộ nhớ của các collection."""
+        for name in names:
+            if self.has(name):
+                self.client.release_collection(name)
+                self.releases += 1
+
+    @contextlib.contextmanager
+    def use(self, name: str) -> Iterator[None]:
+        """
+        Đảm bảo collection đã được nạp trong lúc dùng (tìm kiếm/truy vấn).
+
+        Collection đang được dùng không bị giải phóng; collection chưa tồn tại
+        (chưa ghi dữ liệu lần nào) được bỏ qua.
+
+        Args:
+            name: Tên collection
+        """
+        with self._lock:
+            ready = self._loaded.get(name)
+            loading = ready is None
+            if loading:
+                ready = self._loaded[name] = threading.Event()
+            self._loaded.move_to_end(name)
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+            victims = self._pick_victims()
+
+        try:
+            self._release(victims)
+            if loading:
+                try:
+                    if self.has(name):
+                        self.client.load_collection(name)
+                        self.loads += 1
+                except BaseException:
+                    with self._lock:
+                        self._loaded.pop(name, None)
+                    raise
+                finally:
+                    ready.set()
+            else:
+                ready.wait()
+            yield
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                if not self._in_use[name]:
+                    del self._in_use[name]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê nạp/giải phóng collection.
+
+        Returns:
+            Từ điển gồm các collection đang nạp (cũ nhất trước), giới hạn,
+            số lần nạp và giải phóng
+        """
+        with self._lock:
+            return {
+                "loaded": list(self._loaded),
+                "max_loaded": self.max_loaded,
+                "loads": self.loads,
+                "releases": self.releases
+            }
@@ -9,22 +9,162 @@ load_dotenv()
 MILVUS_URI = os.environ.get("MILVUS_URI", "http://localhost:19530")
 MILVUS_COLLECTION = os.environ.get("MILVUS_COLLECTION", "documents")
 
+# Cấu hình chỉ mục Milvus: loại chỉ mục (AUTOINDEX, FLAT, HNSW, IVF_FLAT, IVF_SQ8, ...)
+# và độ đo (L2, IP, COSINE). Thay đổi chỉ có hiệu lực với collection mới hoặc sau rebuild_index.
+MILVUS_INDEX_TYPE = os.environ.get("MILVUS_INDEX_TYPE", "AUTOINDEX").upper()
+MILVUS_METRIC_TYPE = os.environ.get("MILVUS_METRIC_TYPE", "L2").upper()
+# Tham số xây dựng chỉ mục HNSW và IVF
+MILVUS_HNSW_M = int(os.environ.get("MILVUS_HNSW_M", "16"))
+MILVUS_HNSW_EF_CONSTRUCTION = int(os.environ.get("MILVUS_HNSW_EF_CONSTRUCTION", "200"))
+MILVUS_IVF_NLIST = int(os.environ.get("MILVUS_IVF_NLIST", "1024"))
+# Tham số tìm kiếm mặc định: lớn hơn thì recall cao hơn nhưng chậm hơn
+MILVUS_SEARCH_EF = int(os.environ.get("MILVUS_SEARCH_EF", "64"))
+MILVUS_SEARCH_NPROBE = int(os.environ.get("MILVUS_SEARCH_NPROBE", "16"))
+# Các trường metadata được tạo chỉ mục vô hướng (INVERTED) để lọc nhanh khi tìm kiếm
+MILVUS_SCALAR_INDEX_FIELDS = [
+    field.strip()
+    for field in os.environ.get("MILVUS_SCALAR_INDEX_FIELDS", "source,file_type,upload_time").split(",")
+    if field.strip()
+]
+# Phân vùng collection theo tên file (partition key) để tìm kiếm có lọc theo file
+# chỉ quét các phân vùng liên quan. Chỉ áp dụng khi collection được tạo mới.
+MILVUS_PARTITION_BY_SOURCE = os.environ.get("MILVUS_PARTITION_BY_SOURCE", "false").lower() == "true"
+MILVUS_NUM_PARTITIONS = int(os.environ.get("MILVUS_NUM_PARTITIONS", "64"))
+# Số collection (tenant/workspace) tối đa được nạp vào bộ nhớ Milvus cùng lúc;
+# collection lâu không dùng nhất được giải phóng và nạp lại khi có truy vấn
+MILVUS_MAX_LOADED_COLLECTIONS = int(os.environ.get("MILVUS_MAX_LOADED_COLLECTIONS", "8"))
+# Nạp collection vào bộ nhớ và chạy một truy vấn thử khi khởi động
+VECTOR_STORE_PRELOAD = os.environ.get("VECTOR_STORE_PRELOAD", "true").lower() == "true"
+
+# Cấu hình vector store: "milvus" hoặc "numpy" (lưu trong tiến trình, không cần Milvus)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "milvus").lower()
+NUMPY_STORE_DIR = os.environ.get("NUMPY_STORE_DIR", ".cache/vector_store")
+# Kiểu lưu vector của backend numpy: "float32" hoặc "float16" (giảm một nửa bộ nhớ)
+NUMPY_STORE_DTYPE = os.environ.get("NUMPY_STORE_DTYPE", "float32")
+# Tỉ lệ dòng đã xóa (tombstone) của backend numpy mà vượt qua thì collection được
+# ghi lại bỏ các dòng đó sau lần nạp/xóa; 0 để chỉ dọn khi gọi rebuild_index
+NUMPY_COMPACT_RATIO = float(os.environ.get("NUMPY_COMPACT_RATIO", "0.3"))
+# Nén vector cho lượt tìm kiếm đầu của backend numpy: "none", "truncated" (chỉ giữ
+# VECTOR_SEARCH_DIMENSIONS chiều đầu), "int8" (4 lần nhỏ hơn) hoặc "binary" (32 lần).
+# Các ứng viên tốt nhất (k * VECTOR_RERANK_FACTOR) được xếp hạng lại bằng vector đầy đủ trên đĩa
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "none").lower()
+VECTOR_SEARCH_DIMENSIONS = int(os.environ.get("VECTOR_SEARCH_DIMENSIONS", "0")) or None
+VECTOR_RERANK_FACTOR = int(os.environ.get("VECTOR_RERANK_FACTOR", "8"))
+
 # Cấu hình OpenAI
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# Địa chỉ API tùy chỉnh (ví dụ server giả lập khi kiểm thử tải), None để dùng mặc định
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+
+# Cấu hình xAI
+XAI_API_BASE = os.environ.get("XAI_API_BASE", "https://api.x.ai/v1/")
 
 # Cấu hình mặc định cho xử lý tài liệu
 DEFAULT_CHUNK_SIZE = 1000
 DEFAULT_CHUNK_OVERLAP = 200
 
+# Số đoạn văn bản trong mỗi lô embedding/ghi vào vector store
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+
+# Cấu hình cache phía truy vấn (số mục tối đa của mỗi lớp và thời gian sống tính bằng giây)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "3600"))
+
+# Cấu hình server HTTP (số phiên trò chuyện tối đa giữ trong bộ nhớ và thời gian sống tính bằng giây)
+SERVER_MAX_SESSIONS = int(os.environ.get("SERVER_MAX_SESSIONS", "10000"))
+SERVER_SESSION_TTL = float(os.environ.get("SERVER_SESSION_TTL", "3600"))
+# Số AgentManager theo workspace giữ trong bộ nhớ; workspace ít dùng nhất bị loại khi đầy
+SERVER_MAX_AGENTS = int(os.environ.get("SERVER_MAX_AGENTS", "64"))
+
+# Cấu hình nạp tăng dần: bỏ qua file không đổi, chỉ ghi lại các đoạn đã thay đổi
+INCREMENTAL_INGEST = os.environ.get("INCREMENTAL_INGEST", "true").lower() == "true"
+INGEST_MANIFEST_PATH = os.environ.get("INGEST_MANIFEST_PATH", ".cache/ingest_manifest.sqlite")
+
+# Cấu hình hàng đợi nạp tài liệu chạy nền: thư mục lưu job và file chờ nạp, số luồng xử lý,
+# số lần thử lại khi lỗi, thời hạn nhận job (giây, được gia hạn định kỳ khi tiến trình còn
+# sống) và số lời gọi embedding/ghi đồng thời tối đa trên toàn tiến trình
+INGEST_JOB_DIR = os.environ.get("INGEST_JOB_DIR", ".cache/ingest_jobs")
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_JOB_MAX_ATTEMPTS = int(os.environ.get("INGEST_JOB_MAX_ATTEMPTS", "3"))
+INGEST_JOB_LEASE = float(os.environ.get("INGEST_JOB_LEASE", "60"))
+INGEST_MAX_CONCURRENT_EMBEDS = int(os.environ.get("INGEST_MAX_CONCURRENT_EMBEDS", "2"))
+INGEST_MAX_CONCURRENT_INSERTS = int(os.environ.get("INGEST_MAX_CONCURRENT_INSERTS", "1"))
+
+# Cấu hình xử lý tài liệu song song
+LOADER_MAX_WORKERS = int(os.environ.get("LOADER_MAX_WORKERS", str(os.cpu_count() or 1)))
+LOADER_FILE_TIMEOUT = float(os.environ.get("LOADER_FILE_TIMEOUT", "120"))
+
+# Cấu hình đo đạc: thời gian từng bước (histogram Prometheus) và trace JSON theo yêu cầu
+TELEMETRY_ENABLED = os.environ.get("TELEMETRY_ENABLED", "false").lower() == "true"
+TELEMETRY_MAX_TRACES = int(os.environ.get("TELEMETRY_MAX_TRACES", "200"))
+# File JSONL ghi thêm mỗi trace khi kết thúc, None để chỉ giữ trong bộ nhớ
+TELEMETRY_TRACE_FILE = os.environ.get("TELEMETRY_TRACE_FILE")
+
 # Cấu hình mô hình
 EMBEDDING_MODEL = "text-embedding-3-small"
+# Số chiều embedding: mô hình text-embedding-3 trả về vector rút gọn khi đặt giá trị này
+# (ví dụ 512 thay vì 1536). Để trống để dùng số chiều mặc định của mô hình
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "0")) or None
 LLM_MODEL = "grok-3-mini-beta"
 LLM_TEMPERATURE = 0.1
 
+# Cấu hình công cụ retrieve: số đoạn ứng viên lấy từ vector store và số token tối đa
+# của ngữ cảnh trả về cho LLM sau khi gộp các đoạn chồng lấp
+RETRIEVE_CANDIDATE_K = int(os.environ.get("RETRIEVE_CANDIDATE_K", "8"))
+RETRIEVE_TOKEN_BUDGET = int(os.environ.get("RETRIEVE_TOKEN_BUDGET", "1500"))
+
+# Chỉ mục từ khóa BM25 cục bộ, dựng dần khi nạp tài liệu. Với backend numpy và Milvus Lite
+# chỉ mục nằm cạnh dữ liệu vector; với Milvus server nằm trong LEXICAL_INDEX_DIR
+LEXICAL_INDEX_ENABLED = os.environ.get("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", ".cache/lexical_index")
+# Chế độ tìm kiếm: "vector", "hybrid" (vector + BM25 hợp nhất theo thứ hạng), "lexical"
+# (chỉ BM25, không gọi API embedding) hoặc "auto" (chỉ BM25 cho truy vấn ngắn chứa mã/số
+# hiệu có trong chỉ mục, còn lại hybrid)
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "auto").lower()
+# Số ứng viên lấy từ mỗi nguồn khi hợp nhất, tính theo bội số của k; hằng số làm mượt của RRF
+HYBRID_CANDIDATE_FACTOR = int(os.environ.get("HYBRID_CANDIDATE_FACTOR", "2"))
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+# Số từ tối đa của truy vấn được coi là tra cứu theo từ khóa ở chế độ "auto"
+LEXICAL_QUERY_MAX_TERMS = int(os.environ.get("LEXICAL_QUERY_MAX_TERMS", "8"))
+
+# Đường tắt: tìm tài liệu cho câu hỏi ngay khi nhận được và đưa kết quả vào prompt đầu
+# tiên, bỏ qua lượt LLM chỉ để gọi công cụ retrieve; agent vẫn gọi công cụ nếu cần thêm
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "false").lower() == "true"
+
+# Cấu hình lịch sử trò chuyện: số token tối đa của các lượt gần nhất giữ nguyên văn,
+# các lượt cũ hơn được gộp vào một bản tóm tắt cuốn chiếu
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "cl100k_base")
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.environ.get("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.environ.get("HISTORY_SUMMARY_CACHE_SIZE", "1024"))
+
+# Cấu hình bộ lập lịch request embedding: gom đoạn văn bản thành request theo số token,
+# tự điều chỉnh số request đồng thời theo độ trễ và lỗi 429 (rate limit)
+EMBEDDING_SCHEDULER_ENABLED = os.environ.get("EMBEDDING_SCHEDULER_ENABLED", "true").lower() == "true"
+EMBEDDING_REQUEST_MAX_TOKENS = int(os.environ.get("EMBEDDING_REQUEST_MAX_TOKENS", "8000"))
+EMBEDDING_REQUEST_MAX_INPUTS = int(os.environ.get("EMBEDDING_REQUEST_MAX_INPUTS", "2048"))
+EMBEDDING_INITIAL_CONCURRENCY = int(os.environ.get("EMBEDDING_INITIAL_CONCURRENCY", "4"))
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "16"))
+EMBEDDING_MAX_RETRIES = int(os.environ.get("EMBEDDING_MAX_RETRIES", "6"))
+# Giới hạn token/request mỗi phút của tài khoản (nên đặt thấp hơn giới hạn thật một chút);
+# 0 là không biết, khi đó chỉ dựa vào lỗi 429 để giảm tốc
+EMBEDDING_TPM_LIMIT = int(os.environ.get("EMBEDDING_TPM_LIMIT", "0"))
+EMBEDDING_RPM_LIMIT = int(os.environ.get("EMBEDDING_RPM_LIMIT", "0"))
+
+# Cấu hình cache embedding trên đĩa
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+
+# Cấu hình cache câu trả lời của LLM trên đĩa (dung lượng tối đa tính bằng byte)
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", ".cache/responses.sqlite")
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
 # Cấu hình prompt
 SYSTEM_TEMPLATE = """Bạn là trợ lý AI thông minh được tạo bởi Anh Đoàn Tuấn Anh dzaidzai, hữu ích và chính xác.
 Nhiệm vụ của bạn là trả lời các câu hỏi dựa trên tài liệu được cung cấp.
 Khi bạn không biết câu trả lời, hãy đưa ra thông báo rằng không tìm thấy tài liệu.
 Luôn trích dẫn nguồn thông tin khi bạn sử dụng dữ liệu từ tài liệu.
+Khi câu hỏi gồm nhiều ý, dùng công cụ retrieve_many với danh sách truy vấn con thay vì gọi retrieve nhiều lần.
 Trả lời bằng tiếng Việt, ngắn gọn và dễ hiểu.
 """
@@ -0,0 +1,235 @@
+# nhập các thư viện cơ bản
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+# nhập các module tùy chỉnh
+from history_manager import TokenCounter
+
+# Độ dài tối thiểu (ký tự) để coi phần cuối/đầu của hai đoạn là chồng lấp khi không có vị trí
+MIN_TEXT_OVERLAP = 20
+
+
+def _text_overlap(left: str, right: str, max_overlap: int) -> int:
+    """
+    Tìm độ dài phần chồng lấp dài nhất giữa cuối `left` và đầu `right`.
+
+    Args:
+        left: Đoạn đứng trước
+        right: Đoạn đứng sau
+        max_overlap: Độ dài chồng lấp tối đa cần xét
+
+    Returns:
+        Số ký tự chồng lấp, 0 nếu không có (hoặc ngắn hơn MIN_TEXT_OVERLAP)
+    """
+    for size in range(min(len(left), len(right), max_overlap), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class Passage:
+    """Một đoạn ngữ cảnh liền mạch, gộp từ một hoặc nhiều đoạn văn bản cùng nguồn."""
+
+    def __init__(self, doc: Document, rank: int):
+        """
+        Khởi tạo Passage từ một đoạn văn bản.
+
+        Args:
+            doc: Đoạn văn bản tìm được
+            rank: Thứ hạng liên quan của đoạn (0 là liên quan nhất)
+        """
+        self.source = doc.metadata.get("source", "")
+        self.page = doc.metadata.get("page")
+        self.page_index = doc.metadata.get("page_index")
+        self.start: Optional[int] = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.rank = rank
+        self.docs = [doc]
+
+    @property
+    def end(self) -> Optional[int]:
+        """Vị trí kết thúc của đoạn trong trang (nếu biết vị trí bắt đầu)."""
+        return None if self.start is None else self.start + len(self.text)
+
+    def try_merge(self, other: "Passage", max_overlap: int) -> bool:
+        """
+        Gộp một đoạn khác vào đoạn này nếu chúng chồng lấp hoặc liền kề.
+
+        Dùng vị trí trong trang (start_index) khi có; nếu không thì so khớp
+        phần cuối/đầu văn bản.
+
+        Args:
+            other: Đoạn cần gộp
+            max_overlap: Độ dài chồng lấp tối đa khi so khớp văn bản
+
+        Returns:
+            True nếu đã gộp
+        """
+        if other.source != self.source or other.page_index != self.page_index:
+            return False
+
+        if other.text in self.text:
+            merged = self.text
+            start = self.start
+        elif self.text in other.text:
+            merged = other.text
+            start = other.start
+        elif self.start is not None and other.start is not None:
+            first, second = (self, other) if self.start <= other.start else (other, self)
+            if second.start > first.end:
+                return False
+            merged = first.text + second.text[first.end - second.start:]
+            start = first.start
+        else:
+            overlap = _text_overlap(self.text, other.text, max_overlap)
+            if overlap:
+                merged = self.text + other.text[overlap:]
+            else:
+                overlap = _text_overlap(other.text, self.text, max_overlap)
+                if not overlap:
+                    return False
+                merged = other.text + self.text[overlap:]
+            start = None
+
+        self.text = merged
+        self.start = start
+        self.rank = min(self.rank, other.rank)
+        self.docs.extend(other.docs)
+        return True
+
+    def citation(self, number: int) -> str:
+        """
+        Tạo tiêu đề trích dẫn ngắn cho đoạn.
+
+        Args:
+            number: Số thứ tự của đoạn trong ngữ cảnh
+
+        Returns:
+            Chuỗi dạng "[1] bao_cao.pdf, trang 3"
+        """
+        header = f"[{number}] {os.path.basename(self.source) or 'không rõ nguồn'}"
+        if isinstance(self.page, int):
+            header += f", trang {self.page + 1}"
+        return header
+
+
+def interleave_results(results: List[List[Document]]) -> List[Document]:
+    """
+    Trộn kết quả của nhiều truy vấn thành một danh sách, bỏ các đoạn trùng.
+
+    Lấy lần lượt đoạn thứ nhất của mỗi truy vấn, rồi đoạn thứ hai, ... để mỗi
+    truy vấn con đều có đoạn liên quan nhất ở đầu danh sách.
+
+    Args:
+        results: Với mỗi truy vấn, các đoạn theo thứ tự liên quan giảm dần
+
+    Returns:
+        Danh sách đoạn không trùng lặp
+    """
+    merged = []
+    seen = set()
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            key = doc.metadata.get("pk")
+            if key is None:
+                key = (
+                    doc.metadata.get("source"),
+                    doc.metadata.get("page_index"),
+                    doc.metadata.get("start_index"),
+                    doc.page_content
+                )
+            if key not in seen:
+                seen.add(key)
+                merged.append(doc)
+    return merged
+
+
+def merge_passages(docs: List[Document], max_overlap: int = 1000) -> List[Passage]:
+    """
+    Gộp các đoạn văn bản trùng lặp, chồng lấp hoặc liền kề của cùng một nguồn.
+
+    Args:
+        docs: Các đoạn văn bản theo thứ tự liên quan giảm dần
+        max_overlap: Độ dài chồng lấp tối đa khi so khớp văn bản
+
+    Returns:
+        Danh sách đoạn ngữ cảnh theo thứ tự liên quan giảm dần
+    """
+    passages: List[Passage] = []
+    for rank, doc in enumerate(docs):
+        passage = Passage(doc, rank)
+        # Một đoạn mới có thể nối hai đoạn đã có, nên gộp lặp lại cho đến khi ổn định
+        merged = True
+        while merged:
+            merged = False
+            for existing in passages:
+                if existing.try_merge(passage, max_overlap):
+                    passages.remove(existing)
+                    passage = existing
+                    merged = True
+                    break
+        passages.append(passage)
+
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def pack_context(
+    docs: List[Document],
+    token_budget: int,
+    token_counter: TokenCounter,
+    max_overlap: int = 1000
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Đóng gói các đoạn tìm được thành ngữ cảnh gọn cho LLM.
+
+    Các đoạn chồng lấp được gộp, mỗi đoạn chỉ kèm một tiêu đề trích dẫn ngắn
+    thay vì toàn bộ metadata, và được thêm theo thứ tự liên quan cho đến khi
+    hết ngân sách token. Đoạn liên quan nhất luôn được giữ (cắt bớt nếu cần).
+
+    Args:
+        docs: Các đoạn văn bản theo thứ tự liên quan giảm dần
+        token_budget: Số token tối đa của ngữ cảnh
+        token_counter: Bộ đếm token
+        max_overlap: Độ dài chồng lấp tối đa khi so khớp văn bản
+
+    Returns:
+        Tuple gồm chuỗi ngữ cảnh và danh sách thông tin các đoạn đã dùng
+        (citation, source, page, tokens, chunks)
+    """
+    parts = []
+    packed = []
+    remaining = token_budget
+
+    for passage in merge_passages(docs, max_overlap):
+        header = passage.citation(len(parts) + 1)
+        text = passage.text
+        tokens = token_counter.count_text(f"{header}\n{text}")
+
+        if tokens > remaining:
+            if parts:
+                # Thử các đoạn kém liên quan hơn nhưng ngắn hơn
+                continue
+            # Đoạn đầu tiên quá dài: cắt theo tỉ lệ ký tự/token
+            text = text[:max(0, len(text) * remaining // tokens)]
+            tokens = remaining
+
+        parts.append(f"{header}\n{text}")
+        packed.append({
+            "citation": header,
+            "source": passage.source,
+            "page": passage.page,
+            "tokens": tokens,
+            "chunks": len(passage.docs)
+        })
+        remaining -= tokens
+        if remaining <= 0:
+            break
+
+    return "\n\n".join(parts), packed
@@ -1,26 +1,393 @@
 # nhập các thư viện cơ bản
 import os
 import time
+import hashlib
 import tempfile
-from typing import Dict, List
+import queue
+import importlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 
 # nhập thư viện langchain
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    CSVLoader,
-    Docx2txtLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredExcelLoader
-)
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+# nhập các module tùy chỉnh
+from telemetry import telemetry
+
 # nhập cấu hình
-from config import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from config import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    LOADER_MAX_WORKERS,
+    LOADER_FILE_TIMEOUT
+)
+
+# Phần mở rộng -> (tên lớp loader trong langchain_community.document_loaders, tham số).
+# Lớp loader (và thư viện phân tích của nó) chỉ được nạp khi gặp loại file đó lần đầu.
+LOADER_REGISTRY: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    ".pdf": ("PyPDFLoader", {}),
+    ".txt": ("TextLoader", {"encoding": "utf-8"}),
+    ".csv": ("CSVLoader", {}),
+    ".doc": ("Docx2txtLoader", {}),
+    ".docx": ("Docx2txtLoader", {}),
+    ".ppt": ("UnstructuredPowerPointLoader", {}),
+    ".pptx": ("UnstructuredPowerPointLoader", {}),
+    ".html": ("UnstructuredHTMLLoader", {}),
+    ".md": ("UnstructuredMarkdownLoader", {}),
+    ".xls": ("UnstructuredExcelLoader", {}),
+    ".xlsx": ("UnstructuredExcelLoader", {}),
+}
+
+# Loader mặc định cho các loại file không xác định
+DEFAULT_LOADER = ("TextLoader", {"encoding": "utf-8"})
+
+# Các lớp loader đã nạp
+_loader_classes: Dict[str, type] = {}
+
+
+def _get_loader_class(class_name: str) -> type:
+    """
+    Nạp lớp loader theo tên ở lần dùng đầu tiên.
+    
+    Args:
+        class_name: Tên lớp trong langchain_community.document_loaders
+        
+    Returns:
+        Lớp loader
+    """
+    loader_class = _loader_classes.get(class_name)
+    if loader_class is None:
+        module = importlib.import_module("langchain_community.document_loaders")
+        loader_class = _loader_classes[class_name] = getattr(module, class_name)
+    return loader_class
+
+
+def _iter_file_chunks(
+    file_name: str,
+    data: bytes,
+    chunk_size: int,
+    chunk_overlap: int
+) -> Iterator[Document]:
+    """
+    Tải và phân đoạn một file theo từng trang, trả về từng đoạn văn bản.
+    
+    Loader được đọc bằng lazy_load() nên tại mỗi thời điểm chỉ giữ một trang
+    và các đoạn văn bản của trang đó trong bộ nhớ.
+    
+    Args:
+        file_name: Tên file gốc
+        data: Nội dung file
+        chunk_size: Kích thước của mỗi đoạn văn bản
+        chunk_overlap: Độ chồng lập giữa các đoạn
+        
+    Returns:
+        Iterator các đoạn văn bản đã được phân đoạn
+    """
+    # start_index (vị trí đoạn trong trang) cho phép gộp các đoạn chồng lấp khi truy xuất
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
+    )
+    file_type = Path(file_name).suffix.lower()
+    file_hash = hashlib.sha256(data).hexdigest()
+    upload_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Tạo thư mục tạm thời để lưu file
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Lưu file tải lên vào thư mục tạm thời
+        temp_file_path = os.path.join(temp_dir, file_name)
+        with open(temp_file_path, "wb") as f:
+            f.write(data)
+        
+        # Lấy loader phù hợp cho loại file
+        loader = DocumentLoader.get_loader_for_file(temp_file_path)
+        
+        # Tải từng trang tài liệu; đo riêng thời gian đọc (parse) và chia đoạn (split),
+        # không tính thời gian bên tiêu thụ xử lý các đoạn đã trả về
+        pages = loader.lazy_load()
+        parse_seconds = split_seconds = 0.0
+        page_index = chunk_count = 0
+        while True:
+            start = time.perf_counter()
+            doc = next(pages, None)
+            parse_seconds += time.perf_counter() - start
+            if doc is None:
+                break
+            
+            # Thêm metadata về nguồn gốc file
+            doc.metadata["source"] = file_name
+            doc.metadata["page_index"] = page_index
+            doc.metadata["file_type"] = file_type
+            doc.metadata["file_hash"] = file_hash
+            doc.metadata["upload_time"] = upload_time
+            page_index += 1
+            
+            # Chia trang thành các đoạn nhỏ
+            start = time.perf_counter()
+            chunks = text_splitter.split_documents([doc])
+            split_seconds += time.perf_counter() - start
+            chunk_count += len(chunks)
+            yield from chunks
+        
+        telemetry.record_span("parse", parse_seconds, file=file_name, file_type=file_type, pages=page_index)
+        telemetry.record_span("split", split_seconds, file=file_name, chunks=chunk_count)
+
+
+def _load_and_split_file(
+    file_name: str,
+    data: bytes,
+    chunk_size: int,
+    chunk_overlap: int
+) -> List[Document]:
+    """
+    Tải và phân đoạn một file từ nội dung nhị phân.
+    
+    Hàm được đặt ở cấp module để có thể gửi sang tiến trình con.
+    
+    Args:
+        file_name: Tên file gốc
+        data: Nội dung file
+        chunk_size: Kích thước của mỗi đoạn văn bản
+        chunk_overlap: Độ chồng lập giữa các đoạn
+        
+    Returns:
+        Danh sách các đoạn văn bản đã được phân đoạn
+    """
+    return list(_iter_file_chunks(file_name, data, chunk_size, chunk_overlap))
+
+
+# Thời gian tối đa (giây) chờ các tiến trình con khởi động
+_WORKER_STARTUP_TIMEOUT = 60.0
+
+
+def _mark_worker_ready(ready_queue) -> None:
+    """
+    Báo cho tiến trình cha biết tiến trình con đã khởi động xong.
+    
+    Args:
+        ready_queue: Hàng đợi dùng chung với tiến trình cha
+    """
+    ready_queue.put(os.getpid())
+
+
+def _start_pool(max_workers: int) -> Tuple[ProcessPoolExecutor, object]:
+    """
+    Khởi tạo process pool xử lý tài liệu.
+    
+    Dùng spawn để tiến trình con không kế thừa các luồng của Streamlit.
+    Mỗi tiến trình con gửi một tín hiệu vào hàng đợi khi đã nạp xong
+    module, để thời gian khởi động không bị tính vào thời hạn của file.
+    
+    Args:
+        max_workers: Số tiến trình tối đa
+        
+    Returns:
+        Tuple gồm process pool và hàng đợi tín hiệu khởi động
+    """
+    mp_context = multiprocessing.get_context("spawn")
+    ready_queue = mp_context.Queue()
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=_mark_worker_ready,
+        initargs=(ready_queue,)
+    )
+    return executor, ready_queue
+
+
+def _wait_for_workers(ready_queue, num_workers: int, timeout: float) -> None:
+    """
+    Chờ các tiến trình con của pool khởi động xong.
+    
+    Args:
+        ready_queue: Hàng đợi tín hiệu khởi động
+        num_workers: Số tiến trình cần chờ
+        timeout: Thời gian chờ tối đa (giây)
+    """
+    deadline = time.monotonic() + timeout
+    for _ in range(num_workers):
+        try:
+            ready_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            return
+
+
+def _terminate_pool(executor: ProcessPoolExecutor) -> None:
+    """
+    Dừng ngay một process pool, kể cả các tiến trình con đang bị treo.
+    
+    Args:
+        executor: Process pool cần dừng
+    """
+    # ProcessPoolExecutor không có API công khai để hủy tác vụ đang chạy,
+    # nên phải dừng trực tiếp các tiến trình con
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+# Số lô (trang) tối đa chờ giữa tiến trình phân tích và bên tiêu thụ
+_STREAM_QUEUE_SIZE = 4
+
+
+def _stream_worker_main(tasks, results) -> None:
+    """
+    Vòng lặp của một tiến trình phân tích dùng lại nhiều lần.
+    
+    Nhận từng file từ tasks và gửi các đoạn văn bản về results theo từng trang,
+    kết thúc mỗi file bằng ("done", None) hoặc ("error", thông báo lỗi).
+    Hàng đợi results có giới hạn nên tiến trình con tạm dừng khi bên tiêu thụ
+    chưa lấy kịp, giữ bộ nhớ ở mức vài trang.
+    
+    Args:
+        tasks: Hàng đợi các file cần phân tích (None để dừng)
+        results: Hàng đợi kết quả gửi về tiến trình cha
+    """
+    results.put(("ready", os.getpid()))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        try:
+            page, page_index = [], None
+            for chunk in _iter_file_chunks(*task):
+                if page and chunk.metadata["page_index"] != page_index:
+                    results.put(("chunks", page))
+                    page = []
+                page_index = chunk.metadata["page_index"]
+                page.append(chunk)
+            if page:
+                results.put(("chunks", page))
+            results.put(("done", None))
+        except Exception as e:
+            results.put(("error", str(e)))
+
+
+class _StreamWorker:
+    """Tiến trình phân tích chạy lâu dài cùng các hàng đợi giao tiếp của nó."""
+    
+    def __init__(self):
+        """Khởi động tiến trình con và chờ nó nạp xong module."""
+        mp_context = multiprocessing.get_context("spawn")
+        self.tasks = mp_context.Queue()
+        self.results = mp_context.Queue(maxsize=_STREAM_QUEUE_SIZE)
+        self.process = mp_context.Process(
+            target=_stream_worker_main,
+            args=(self.tasks, self.results),
+            name="document-parser",
+            daemon=True
+        )
+        self.process.start()
+        try:
+            self.results.get(timeout=_WORKER_STARTUP_TIMEOUT)
+        except queue.Empty:
+            self.stop()
+            raise RuntimeError("Tiến trình xử lý không khởi động được")
+    
+    def stop(self) -> None:
+        """Dừng ngay tiến trình con, kể cả khi đang phân tích dở."""
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+
+
+# Các tiến trình phân tích đang rảnh, dùng lại giữa các lần gọi stream_documents
+_idle_workers: List[_StreamWorker] = []
+_idle_workers_lock = threading.Lock()
+
+
+def _acquire_stream_worker() -> _StreamWorker:
+    """Lấy một tiến trình phân tích đang rảnh, hoặc khởi động tiến trình mới."""
+    with _idle_workers_lock:
+        while _idle_workers:
+            worker = _idle_workers.pop()
+            if worker.process.is_alive():
+                return worker
+    return _StreamWorker()
+
+
+def _release_stream_worker(worker: _StreamWorker) -> None:
+    """Trả tiến trình phân tích về danh sách rảnh (giữ tối đa LOADER_MAX_WORKERS tiến trình)."""
+    with _idle_workers_lock:
+        if worker.process.is_alive() and len(_idle_workers) < max(1, LOADER_MAX_WORKERS):
+            _idle_workers.append(worker)
+            return
+    worker.stop()
+
+
+def _stream_file_isolated(
+    file_name: str,
+    data: bytes,
+    chunk_size: int,
+    chunk_overlap: int,
+    timeout: float
+) -> Iterator[Document]:
+    """
+    Tải và phân đoạn một file trên tiến trình phân tích, trả về dần từng đoạn.
+    
+    Thời hạn chỉ tính thời gian chờ tiến trình con gửi trang tiếp theo, không
+    tính thời gian bên tiêu thụ xử lý các đoạn đã nhận. Khi quá hạn, khi tiến
+    trình con bị dừng đột ngột, hoặc khi bên tiêu thụ dừng giữa chừng, tiến
+    trình con bị dừng và lần gọi sau dùng tiến trình mới.
+    
+    Args:
+        file_name: Tên file gốc
+        data: Nội dung file
+        chunk_size: Kích thước của mỗi đoạn văn bản
+        chunk_overlap: Độ chồng lập giữa các đoạn
+        timeout: Tổng thời gian chờ tối đa (giây) cho việc phân tích file
+        
+    Returns:
+        Iterator các đoạn văn bản đã được phân đoạn
+        
+    Raises:
+        TimeoutError: Nếu phân tích vượt quá thời hạn
+        RuntimeError: Nếu file lỗi hoặc tiến trình con bị dừng đột ngột
+    """
+    worker = _acquire_stream_worker()
+    finished = False
+    waited = 0.0
+    try:
+        worker.tasks.put((file_name, data, chunk_size, chunk_overlap))
+        while True:
+            remaining = timeout - waited
+            if remaining <= 0:
+                raise TimeoutError(f"Quá thời gian xử lý ({timeout:g}s)")
+            start = time.monotonic()
+            try:
+                # Chờ từng khoảng ngắn để phát hiện sớm tiến trình con bị dừng
+                kind, payload = worker.results.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                waited += time.monotonic() - start
+                if not worker.process.is_alive():
+                    raise RuntimeError("Tiến trình xử lý bị dừng đột ngột")
+                continue
+            waited += time.monotonic() - start
+            
+            if kind == "chunks":
+                yield from payload
+            elif kind == "done":
+                finished = True
+                return
+            else:
+                finished = True
+                raise RuntimeError(payload)
+    finally:
+        telemetry.record_span("load_file", waited, file=file_name)
+        if finished:
+            _release_stream_worker(worker)
+        else:
+            worker.stop()
+
 
 class DocumentLoader:
     """Lớp xử lý việc tải và phân đoạn tài liệu."""
@@ -37,26 +404,21 @@ class DocumentLoader:
             Loader phù hợp cho loại file
         """
         file_extension = Path(file_path).suffix.lower()
+        class_name, kwargs = LOADER_REGISTRY.get(file_extension, DEFAULT_LOADER)
+        return _get_loader_class(class_name)(file_path, **kwargs)
+    
+    @staticmethod
+    def compute_file_hash(uploaded_file) -> str:
+        """
+        Tính mã băm nội dung của file được tải lên.
         
-        if file_extension == '.pdf':
-            return PyPDFLoader(file_path)
-        elif file_extension == '.txt':
-            return TextLoader(file_path, encoding='utf-8')
-        elif file_extension == '.csv':
-            return CSVLoader(file_path)
-        elif file_extension in ['.doc', '.docx']:
-            return Docx2txtLoader(file_path)
-        elif file_extension in ['.ppt', '.pptx']:
-            return UnstructuredPowerPointLoader(file_path)
-        elif file_extension == '.html':
-            return UnstructuredHTMLLoader(file_path)
-        elif file_extension == '.md':
-            return UnstructuredMarkdownLoader(file_path)
-        elif file_extension in ['.xls', '.xlsx']:
-            return UnstructuredExcelLoader(file_path)
-        else:
-            # Mặc định sử dụng TextLoader cho các loại file không xác định
-            return TextLoader(file_path, encoding='utf-8')
+        Args:
+            uploaded_file: File được tải lên qua Streamlit
+            
+        Returns:
+            Chuỗi hex SHA-256 của nội dung file
+        """
+        return hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
     
     @staticmethod
     def load_and_split_documents(
@@ -78,33 +440,169 @@ class DocumentLoader:
         result = {}
         
         for uploaded_file in uploaded_files:
-            # Tạo thư mục tạm thời để lưu file
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Lưu file tải lên vào thư mục tạm thời
-                temp_file_path = os.path.join(temp_dir, uploaded_file.name)
-                with open(temp_file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+            result[uploaded_file.name] = _load_and_split_file(
+                uploaded_file.name,
+                uploaded_file.getbuffer(),
+                chunk_size,
+                chunk_overlap
+            )
+        
+        return result
+    
+    @staticmethod
+    def stream_documents(
+        uploaded_files,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        timeout: float = LOADER_FILE_TIMEOUT
+    ) -> Iterator[Document]:
+        """
+        Tải và phân đoạn tài liệu theo kiểu luồng, từng trang một.
+        
+        Khác với load_and_split_documents, hàm này không giữ toàn bộ kết quả
+        trong bộ nhớ; các đoạn văn bản được trả về ngay khi được tạo ra. Việc
+        phân tích chạy trên một tiến trình con được dùng lại giữa các lần gọi
+        (không giữ GIL của tiến trình chính), và file bị treo hoặc làm dừng
+        tiến trình con được báo lỗi thay vì chặn bên gọi.
+        
+        Args:
+            uploaded_files: Danh sách các file được tải lên qua Streamlit
+            chunk_size: Kích thước của mỗi đoạn văn bản
+            chunk_overlap: Độ chồng lập giữa các đoạn
+            timeout: Thời gian phân tích tối đa (giây) của mỗi file
+            
+        Returns:
+            Iterator các đoạn văn bản, có metadata "source" là tên file
+            
+        Raises:
+            TimeoutError: Nếu một file phân tích quá thời hạn
+            RuntimeError: Nếu một file lỗi hoặc làm dừng tiến trình con
+        """
+        for uploaded_file in uploaded_files:
+            yield from _stream_file_isolated(
+                uploaded_file.name,
+                bytes(uploaded_file.getbuffer()),
+                chunk_size,
+                chunk_overlap,
+                timeout
+            )
+    
+    @staticmethod
+    def load_and_split_documents_parallel(
+        uploaded_files,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        max_workers: int = LOADER_MAX_WORKERS,
+        timeout: float = LOADER_FILE_TIMEOUT
+    ) -> Iterator[Tuple[str, Optional[List[Document]], Optional[str]]]:
+        """
+        Tải và phân đoạn tài liệu song song trên nhiều tiến trình.
+        
+        Kết quả được trả về ngay khi từng file xử lý xong. File bị lỗi hoặc
+        vượt quá thời gian cho phép được báo lỗi riêng mà không làm dừng cả lô;
+        khi có file bị quá hạn, pool được khởi tạo lại và các file đang xử lý
+        dở được đưa lại vào hàng đợi (giữ nguyên thứ tự). Khi một tiến trình
+        xử lý bị dừng đột ngột, mọi file đang xử lý đều lỗi theo nên không biết
+        file nào gây ra: nếu chỉ có một file thì file đó bị báo lỗi, còn không
+        thì các file này được xử lý lại từng file một để tìm đúng file gây lỗi.
+        
+        Args:
+            uploaded_files: Danh sách các file được tải lên qua Streamlit
+            chunk_size: Kích thước của mỗi đoạn văn bản
+            chunk_overlap: Độ chồng lập giữa các đoạn
+            max_workers: Số tiến trình xử lý tối đa
+            timeout: Thời gian tối đa (giây) để xử lý một file
+            
+        Returns:
+            Iterator các bộ (tên file, danh sách đoạn văn bản, lỗi); khi thành
+            công thì lỗi là None, khi thất bại thì danh sách đoạn văn bản là None
+        """
+        max_workers = max(1, max_workers)
+        # (tên file, nội dung, chạy riêng): file nghi làm dừng tiến trình được chạy riêng
+        pending = deque(
+            (uploaded_file.name, bytes(uploaded_file.getbuffer()), False)
+            for uploaded_file in uploaded_files
+        )
+        
+        executor, ready_queue = _start_pool(max_workers)
+        pool_ready = False
+        in_flight = {}
+        
+        try:
+            while pending or in_flight:
+                # Chỉ gửi tối đa max_workers file cùng lúc để thời điểm gửi
+                # cũng là thời điểm bắt đầu xử lý, giúp tính thời hạn chính xác
+                while pending and len(in_flight) < max_workers:
+                    isolate = pending[0][2]
+                    if in_flight and (isolate or any(entry[3] for entry in in_flight.values())):
+                        break
+                    file_name, data, isolate = pending.popleft()
+                    future = executor.submit(
+                        _load_and_split_file, file_name, data, chunk_size, chunk_overlap
+                    )
+                    in_flight[future] = (file_name, data, time.monotonic() + timeout, isolate)
                 
-                # Lấy loader phù hợp cho loại file
-                loader = DocumentLoader.get_loader_for_file(temp_file_path)
+                # Thời hạn của mỗi file chỉ bắt đầu tính khi pool đã sẵn sàng
+                if not pool_ready:
+                    _wait_for_workers(
+                        ready_queue,
+                        min(max_workers, len(in_flight)),
+                        _WORKER_STARTUP_TIMEOUT
+                    )
+                    pool_ready = True
+                    deadline = time.monotonic() + timeout
+                    in_flight = {
+                        future: (file_name, data, deadline, isolate)
+                        for future, (file_name, data, _, isolate) in in_flight.items()
+                    }
                 
-                # Tải tài liệu
-                documents = loader.load()
+                next_deadline = min(entry[2] for entry in in_flight.values())
+                done, _ = wait(
+                    in_flight,
+                    timeout=max(0.0, next_deadline - time.monotonic()),
+                    return_when=FIRST_COMPLETED
+                )
                 
-                # Thêm metadata về nguồn gốc file
-                for doc in documents:
-                    doc.metadata["source"] = uploaded_file.name
-                    doc.metadata["file_type"] = Path(uploaded_file.name).suffix.lower()
-                    doc.metadata["upload_time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                # Các file đang xử lý khi tiến trình bị dừng đột ngột, theo thứ tự gửi
+                crashed = []
+                for future in [future for future in in_flight if future in done]:
+                    file_name, data, deadline, isolate = in_flight.pop(future)
+                    # Span parse/split ghi trong tiến trình con không về được tiến trình
+                    # chính, nên ghi thời gian xử lý cả file (tính từ lúc bắt đầu chờ)
+                    telemetry.record_span(
+                        "load_file", time.monotonic() - (deadline - timeout), file=file_name
+                    )
+                    try:
+                        yield file_name, future.result(), None
+                    except BrokenProcessPool:
+                        crashed.append((file_name, data, isolate))
+                    except Exception as e:
+                        yield file_name, None, str(e)
                 
-                # Chia tài liệu thành các đoạn nhỏ
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=chunk_size, 
-                    chunk_overlap=chunk_overlap
-                )
-                docs = text_splitter.split_documents(documents)
+                now = time.monotonic()
+                expired = [
+                    future for future, (_, _, deadline, _) in in_flight.items()
+                    if deadline <= now and not future.done()
+                ]
+                for future in expired:
+                    file_name, _, _, _ = in_flight.pop(future)
+                    yield file_name, None, f"Quá thời gian xử lý ({timeout:g}s)"
                 
-                # Lưu kết quả
-                result[uploaded_file.name] = docs
-        
-        return result
+                if expired or crashed:
+                    # Khởi tạo lại pool và xử lý lại các file đang dở
+                    _terminate_pool(executor)
+                    requeue = [(file_name, data, isolate) for file_name, data, _, isolate in in_flight.values()]
+                    if crashed:
+                        # Pool hỏng làm mọi file đang xử lý lỗi theo
+                        crashed.extend(requeue)
+                        requeue = []
+                        if len(crashed) == 1:
+                            yield crashed[0][0], None, "Tiến trình xử lý bị dừng đột ngột"
+                        else:
+                            requeue = [(file_name, data, True) for file_name, data, _ in crashed]
+                    pending.extendleft(reversed(requeue))
+                    in_flight.clear()
+                    executor, ready_queue = _start_pool(max_workers)
+                    pool_ready = False
+        finally:
+            _terminate_pool(executor)
@@ -0,0 +1,375 @@
+# nhập các thư viện cơ bản
+import os
+import re
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import contextlib
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện langchain
+from langchain_core.embeddings import Embeddings
+
+
+def text_hash(text: str) -> str:
+    """
+    Tính mã băm nội dung của một đoạn văn bản.
+
+    Args:
+        text: Đoạn văn bản cần băm
+
+    Returns:
+        Chuỗi hex SHA-256 của văn bản
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Khóa độc quyền giữa các tiến trình (ví dụ Streamlit, server.py và bulk_ingest
+    dùng chung thư mục cache) bằng một file khóa.
+
+    Args:
+        path: Đường dẫn file khóa
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return
+
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                # LK_LOCK chỉ thử lại trong khoảng 10 giây rồi báo lỗi
+                continue
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingCacheStore:
+    """
+    Kho lưu embedding trên đĩa, đánh địa chỉ theo nội dung.
+
+    Vector của mỗi mô hình được ghi nối tiếp vào một file float32 liền khối và
+    đọc lại qua memory-map; SQLite chỉ lưu chỉ mục (mô hình, mã băm) -> số dòng.
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Khởi tạo EmbeddingCacheStore.
+
+        Args:
+            cache_dir: Thư mục chứa file chỉ mục và các file vector
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            check_same_thread=False
+        )
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (model, key)
+            );
+            """
+        )
+        self._conn.commit()
+
+        # memory-map đang mở cho từng mô hình
+        self._mmaps: Dict[str, np.memmap] = {}
+
+    def _vector_path(self, model: str) -> str:
+        """Trả về đường dẫn file vector của mô hình."""
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.cache_dir, f"{safe_name}.f32")
+
+    def _get_dim(self, model: str) -> Optional[int]:
+        """Trả về số chiều vector đã ghi nhận cho mô hình (nếu có)."""
+        row = self._conn.execute(
+            "SELECT dim FROM models WHERE model = ?", (model,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _get_mmap(self, model: str, dim: int, min_rows: int) -> np.memmap:
+        """
+        Trả về memory-map của file vector, mở lại nếu file đã lớn thêm.
+
+        Args:
+            model: Tên mô hình
+            dim: Số chiều vector
+            min_rows: Số dòng tối thiểu mà memory-map phải bao phủ
+
+        Returns:
+            Ma trận memory-map chỉ đọc kích thước (số dòng, dim)
+        """
+        mmap = self._mmaps.get(model)
+        if mmap is None or mmap.shape[0] < min_rows:
+            path = self._vector_path(model)
+            rows = os.path.getsize(path) // (dim * 4)
+            mmap = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+            self._mmaps[model] = mmap
+        return mmap
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Lấy các vector đã lưu theo mã băm.
+
+        Args:
+            model: Tên mô hình embedding
+            keys: Danh sách mã băm nội dung
+
+        Returns:
+            Từ điển mã băm -> vector cho những mã có trong cache
+        """
+        if not keys:
+            return {}
+
+        with self._lock:
+            dim = self._get_dim(model)
+            if dim is None:
+                return {}
+
+            rows = {}
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite giới hạn số tham số trong một câu lệnh
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, row in self._conn.execute(
+                    f"SELECT key, row FROM entries WHERE model = ? AND key IN ({placeholders})",
+                    (model, *batch)
+                ):
+                    rows[key] = row
+
+            if not rows:
+                return {}
+
+            mmap = self._get_mmap(model, dim, max(rows.values()) + 1)
+            return {key: mmap[row].tolist() for key, row in rows.items()}
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """
+        Ghi thêm các vector mới vào cache.
+
+        Args:
+            model: Tên mô hình embedding
+            items: Từ điển mã băm -> vector
+        """
+        if not items:
+            return
+
+        keys = list(items.keys())
+        vectors = np.asarray([items[key] for key in keys], dtype=np.float32)
+        dim = vectors.shape[1]
+
+        with self._lock:
+            stored_dim = self._get_dim(model)
+            if stored_dim is None:
+                self._conn.execute(
+                    "INSERT INTO models (model, dim) VALUES (?, ?)", (model, dim)
+                )
+            elif stored_dim != dim:
+                raise ValueError(
+                    f"Số chiều embedding của {model} đã thay đổi ({stored_dim} -> {dim})"
+                )
+
+            # Ghi vector vào cuối file trước rồi mới ghi chỉ mục, nên nếu bị gián
+            # đoạn chỉ để lại vài byte thừa không được tham chiếu. Phần thừa lẻ
+            # (ghi dở) được cắt bỏ trước khi ghi tiếp để các dòng sau không bị lệch;
+            # khóa file giữ cho việc đọc kích thước và ghi không xen với tiến trình khác.
+            path = self._vector_path(model)
+            row_bytes = dim * 4
+            with _file_lock(f"{path}.lock"), open(path, "ab") as f:
+                size = os.fstat(f.fileno()).st_size
+                first_row = size // row_bytes
+                if size != first_row * row_bytes:
+                    f.truncate(first_row * row_bytes)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (model, key, row) VALUES (?, ?, ?)",
+                [(model, key, first_row + i) for i, key in enumerate(keys)]
+            )
+            self._conn.commit()
+
+    def count(self, model: str) -> int:
+        """Trả về số vector đang được cache cho mô hình."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE model = ?", (model,)
+            ).fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Bọc một mô hình embedding với cache trên đĩa theo (mô hình, mã băm nội dung)."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, store: EmbeddingCacheStore):
+        """
+        Khởi tạo CachedEmbeddings.
+
+        Args:
+            embeddings: Mô hình embedding thực sự (ví dụ OpenAIEmbeddings)
+            model_name: Tên mô hình, dùng làm một phần của khóa cache
+            store: Kho lưu embedding trên đĩa
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, hits: int, misses: int) -> None:
+        """Cập nhật bộ đếm hit/miss."""
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Trả về thống kê cache.
+
+        Returns:
+            Từ điển gồm số lần hit và miss tích lũy
+        """
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _lookup(self, texts: List[str]):
+        """
+        Tra cứu cache cho danh sách văn bản.
+
+        Args:
+            texts: Danh sách văn bản
+
+        Returns:
+            Tuple gồm danh sách mã băm, các vector đã có trong cache và
+            các văn bản còn thiếu (đã loại bỏ trùng lặp) theo mã băm
+        """
+        keys = [text_hash(text) for text in texts]
+        cached = self.store.get_many(self.model_name, keys)
+
+        # Gom các văn bản chưa có trong cache (loại bỏ trùng lặp)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        return keys, cached, missing
+
+    def _store(
+        self,
+        keys: List[str],
+        cached: Dict[str, List[float]],
+        missing: Dict[str, str],
+        new_vectors: List[List[float]]
+    ) -> List[List[float]]:
+        """
+        Ghi các vector mới vào cache và ghép kết quả theo thứ tự đầu vào.
+
+        Args:
+            keys: Danh sách mã băm theo thứ tự đầu vào
+            cached: Các vector đã có trong cache
+            missing: Các văn bản còn thiếu theo mã băm
+            new_vectors: Vector vừa tạo cho các văn bản còn thiếu
+
+        Returns:
+            Danh sách vector theo đúng thứ tự đầu vào
+        """
+        if missing:
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.store.put_many(self.model_name, computed)
+            cached.update(computed)
+
+        self._record(len(keys) - len(missing), len(missing))
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Tạo embedding cho danh sách văn bản, chỉ gọi API cho phần chưa có trong cache.
+
+        Args:
+            texts: Danh sách văn bản
+
+        Returns:
+            Danh sách vector theo đúng thứ tự đầu vào
+        """
+        keys, cached, missing = self._lookup(texts)
+        new_vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._store(keys, cached, missing, new_vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Tạo embedding cho truy vấn, dùng cache nếu có.
+
+        Args:
+            text: Truy vấn
+
+        Returns:
+            Vector embedding của truy vấn
+        """
+        keys, cached, missing = self._lookup([text])
+        new_vectors = [self.embeddings.embed_query(text)] if missing else []
+        return self._store(keys, cached, missing, new_vectors)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Phiên bản bất đồng bộ của embed_documents.
+
+        Args:
+            texts: Danh sách văn bản
+
+        Returns:
+            Danh sách vector theo đúng thứ tự đầu vào
+        """
+        # Đọc/ghi đĩa (SQLite, fsync) chạy ngoài vòng lặp sự kiện
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        new_vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._store, keys, cached, missing, new_vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Phiên bản bất đồng bộ của embed_query.
+
+        Args:
+            text: Truy vấn
+
+        Returns:
+            Vector embedding của truy vấn
+        """
+        keys, cached, missing = await asyncio.to_thread(self._lookup, [text])
+        new_vectors = [await self.embeddings.aembed_query(text)] if missing else []
+        return (await asyncio.to_thread(self._store, keys, cached, missing, new_vectors))[0]
@@ -1,103 +1,1582 @@
 # nhập các thư viện cơ bản
-from typing import Dict, List, Optional, Tuple
+import os
+import json
+import asyncio
+import time
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+# nhập thư viện tính toán
+import numpy as np
 
 # nhập thư viện langchain
-from langchain_openai import OpenAIEmbeddings
-from langchain_milvus import Milvus
+# (langchain_openai và langchain_milvus được nạp khi tạo client để khởi động nhanh)
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# nhập các module tùy chỉnh
+from collection_manager import CollectionManager, tenant_collection_name
+from context_packer import Passage
+from embedding_cache import CachedEmbeddings, EmbeddingCacheStore, text_hash
+from embedding_scheduler import ScheduledEmbeddings
+from ingest_manifest import IngestManifest
+from lazy import Lazy, warm_up_in_background
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from milvus_index import IndexConfig
+from numpy_store import NumpyVectorStore
+from query_cache import LRUCache
+from telemetry import telemetry
 
 # nhập cấu hình
-from config import MILVUS_URI, MILVUS_COLLECTION, EMBEDDING_MODEL
+from config import (
+    MILVUS_URI,
+    MILVUS_COLLECTION,
+    VECTOR_BACKEND,
+    NUMPY_STORE_DIR,
+    NUMPY_STORE_DTYPE,
+    NUMPY_COMPACT_RATIO,
+    VECTOR_QUANTIZATION,
+    VECTOR_SEARCH_DIMENSIONS,
+    VECTOR_RERANK_FACTOR,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    OPENAI_BASE_URL,
+    EMBEDDING_SCHEDULER_ENABLED,
+    EMBEDDING_REQUEST_MAX_TOKENS,
+    EMBEDDING_REQUEST_MAX_INPUTS,
+    EMBEDDING_INITIAL_CONCURRENCY,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_TPM_LIMIT,
+    EMBEDDING_RPM_LIMIT,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_DIR,
+    INGEST_BATCH_SIZE,
+    INCREMENTAL_INGEST,
+    INGEST_MANIFEST_PATH,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    VECTOR_STORE_PRELOAD,
+    MILVUS_SCALAR_INDEX_FIELDS,
+    MILVUS_PARTITION_BY_SOURCE,
+    MILVUS_NUM_PARTITIONS,
+    MILVUS_MAX_LOADED_COLLECTIONS,
+    INGEST_MAX_CONCURRENT_EMBEDS,
+    INGEST_MAX_CONCURRENT_INSERTS,
+    LEXICAL_INDEX_ENABLED,
+    LEXICAL_INDEX_DIR,
+    SEARCH_MODE,
+    HYBRID_CANDIDATE_FACTOR,
+    HYBRID_RRF_K,
+    LEXICAL_QUERY_MAX_TERMS
+)
+
+# Các chế độ tìm kiếm (xem SEARCH_MODE trong config.py)
+SEARCH_MODES = ("vector", "hybrid", "lexical", "auto")
+
+# Số giá trị tối đa trong một biểu thức "in [...]" khi xóa theo mã băm
+DELETE_BATCH_SIZE = 1000
+
+# Khoảng thời gian tối thiểu (giây) giữa hai lần đọc thế hệ dữ liệu từ manifest
+GENERATION_CHECK_INTERVAL = 0.5
+
+
+def _quote(value: str) -> str:
+    """Trích dẫn một chuỗi để dùng trong biểu thức lọc của Milvus."""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def build_filter_expr(
+    source: Optional[Union[str, List[str]]] = None,
+    file_type: Optional[Union[str, List[str]]] = None,
+    uploaded_after: Optional[str] = None,
+    uploaded_before: Optional[str] = None
+) -> Optional[str]:
+    """
+    Tạo biểu thức lọc theo metadata mà DocumentLoader gắn cho mỗi đoạn văn bản.
+    
+    Biểu thức dùng cú pháp của Milvus (backend numpy hiểu cùng cú pháp) và
+    được đẩy xuống vector store, nên chỉ các đoạn thỏa điều kiện được so sánh.
+    
+    Args:
+        source: Tên file hoặc danh sách tên file
+        file_type: Loại file, ví dụ "pdf" hoặc ".pdf" (hoặc danh sách)
+        uploaded_after: Thời điểm tải lên sớm nhất, dạng "YYYY-MM-DD[ HH:MM:SS]"
+        uploaded_before: Thời điểm tải lên muộn nhất, dạng "YYYY-MM-DD[ HH:MM:SS]"
+        
+    Returns:
+        Biểu thức lọc, hoặc None nếu không có điều kiện nào
+    """
+    clauses = []
+    
+    sources = [source] if isinstance(source, str) else list(source or [])
+    if sources:
+        clauses.append(f"source in [{', '.join(_quote(s) for s in sources)}]")
+    
+    file_types = [file_type] if isinstance(file_type, str) else list(file_type or [])
+    if file_types:
+        # DocumentLoader lưu phần mở rộng dạng ".pdf"
+        normalized = [f".{t.lower().lstrip('.')}" for t in file_types]
+        clauses.append(f"file_type in [{', '.join(_quote(t) for t in normalized)}]")
+    
+    # upload_time lưu dạng "YYYY-MM-DD HH:MM:SS" nên so sánh chuỗi đúng thứ tự thời gian
+    if uploaded_after:
+        clauses.append(f"upload_time >= {_quote(uploaded_after)}")
+    if uploaded_before:
+        before = uploaded_before if len(uploaded_before) > 10 else f"{uploaded_before} 23:59:59"
+        clauses.append(f"upload_time <= {_quote(before)}")
+    
+    return " and ".join(clauses) or None
+
 
 class EmbeddingManager:
     """Lớp quản lý việc tạo embedding và tương tác với vector store."""
     
-    def __init__(self):
-        """Khởi tạo EmbeddingManager."""
-        self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-        self.vector_store = self._create_vector_store()
+    def __init__(
+        self,
+        uri: str = MILVUS_URI,
+        collection_name: str = MILVUS_COLLECTION,
+        backend: str = VECTOR_BACKEND,
+        embeddings: Optional[Embeddings] = None,
+        index_config: Optional[IndexConfig] = None,
+        collections: Optional[CollectionManager] = None,
+        search_mode: str = SEARCH_MODE
+    ):
+        """
+        Khởi tạo EmbeddingManager.
+        
+        Args:
+            uri: Địa chỉ Milvus (server hoặc đường dẫn file Milvus Lite)
+            collection_name: Tên collection lưu trữ tài liệu
+            backend: Loại vector store, "milvus" hoặc "numpy"
+            embeddings: Mô hình embedding dùng thay cho mô hình mặc định
+                (ví dụ mô hình giả lập khi đo hiệu năng)
+            index_config: Cấu hình chỉ mục Milvus, mặc định theo config.py.
+                Nếu collection đã có chỉ mục, cấu hình được đồng bộ theo chỉ mục đó
+                (dùng rebuild_index để đổi)
+            collections: Bộ quản lý collection dùng chung giữa các EmbeddingManager
+                trên cùng Milvus (mặc định tạo mới với backend milvus)
+            search_mode: Chế độ tìm kiếm mặc định: "vector", "hybrid", "lexical" hoặc "auto"
+        """
+        if backend not in ("milvus", "numpy"):
+            raise ValueError(f"Vector store không được hỗ trợ: {backend}")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Chế độ tìm kiếm không được hỗ trợ: {search_mode}")
+        
+        self.uri = uri
+        self.collection_name = collection_name
+        self.backend = backend
+        self.search_mode = search_mode
+        self.index_config = index_config or IndexConfig()
+        self._scalar_indexed = False
+        self.collections = collections
+        if self.collections is None and backend == "milvus":
+            self.collections = CollectionManager(uri, max_loaded=MILVUS_MAX_LOADED_COLLECTIONS)
+        # EmbeddingManager của các tenant/workspace, tạo bởi for_tenant
+        self._tenants: Dict[str, "EmbeddingManager"] = {}
+        self._tenants_lock = threading.Lock()
+        # Client embedding và kết nối vector store được tạo ở lần dùng đầu tiên
+        # (hoặc trên luồng nền qua warm_up) để không làm chậm việc khởi động
+        self.embedding_scheduler = None
+        self._embeddings = Lazy(
+            lambda: embeddings if embeddings is not None else self._create_embeddings()
+        )
+        self._vector_store = Lazy(self._create_vector_store)
+        self._lexical_index = Lazy(self._create_lexical_index)
+        self.manifest = IngestManifest(
+            INGEST_MANIFEST_PATH,
+            namespace=f"{self._store_location()}::{collection_name}"
+        )
+        
+        # Cache phía truy vấn: embedding của truy vấn và kết quả tìm kiếm.
+        # Kết quả tìm kiếm gắn với thế hệ dữ liệu, tăng mỗi khi dữ liệu thay đổi
+        # và được lưu trong manifest để các cache trên đĩa dùng chung.
+        self.query_embedding_cache = LRUCache(QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        self.search_cache = LRUCache(QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        self._corpus_generation = self.manifest.get_version()
+        self._generation_checked_at = time.monotonic()
+        # Số truy vấn (không tính cache) theo cách tìm thực tế: vector, hybrid, lexical
+        self.search_plans: Counter = Counter()
+        
+        # Giới hạn số lời gọi embedding/ghi đồng thời khi nhiều luồng cùng nạp dữ liệu
+        self._embed_slots = threading.BoundedSemaphore(INGEST_MAX_CONCURRENT_EMBEDS)
+        self._insert_slots = threading.BoundedSemaphore(INGEST_MAX_CONCURRENT_INSERTS)
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        """Mô hình embedding, khởi tạo ở lần truy cập đầu tiên."""
+        return self._embeddings.get()
+    
+    @property
+    def vector_store(self):
+        """Vector store, kết nối ở lần truy cập đầu tiên."""
+        return self._vector_store.get()
+    
+    @vector_store.setter
+    def vector_store(self, value) -> None:
+        self._vector_store.set(value)
+    
+    @property
+    def corpus_generation(self) -> int:
+        """
+        Thế hệ dữ liệu hiện tại của collection.
+        
+        Được đọc lại từ manifest (tối đa mỗi GENERATION_CHECK_INTERVAL giây) để
+        thấy cả các lần nạp/xóa dữ liệu của tiến trình khác dùng chung manifest
+        (server, bulk_ingest, hàng đợi nạp của ứng dụng khác).
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at >= GENERATION_CHECK_INTERVAL:
+            self._generation_checked_at = now
+            self._set_corpus_generation(self.manifest.get_version())
+        return self._corpus_generation
+    
+    def _set_corpus_generation(self, version: int) -> None:
+        """
+        Ghi nhận thế hệ dữ liệu mới: bỏ các kết quả tìm kiếm của thế hệ cũ và
+        nạp các đoạn mà tiến trình khác đã thêm/xóa (vector store numpy và
+        chỉ mục từ khóa).
+        """
+        if version != self._corpus_generation:
+            self._corpus_generation = version
+            self.search_cache.clear()
+            if self.backend == "numpy" and self._vector_store.ready:
+                self.vector_store.refresh()
+            if self._lexical_index.ready and self.lexical_index is not None:
+                self.lexical_index.refresh()
+    
+    @property
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        """Chỉ mục từ khóa BM25 (None nếu tắt), nạp từ đĩa ở lần truy cập đầu tiên."""
+        return self._lexical_index.get()
+    
+    def warm_up(self):
+        """
+        Khởi tạo client embedding và kết nối vector store trên luồng nền.
+        
+        Returns:
+            Luồng khởi động (có thể join để chờ sẵn sàng)
+        """
+        steps = [self._embeddings.get, self._vector_store.get, self._lexical_index.get]
+        if VECTOR_STORE_PRELOAD:
+            steps.append(self.preload)
+        return warm_up_in_background(f"warm-up-{self.collection_name}", *steps)
     
-    def _create_vector_store(self) -> Milvus:
+    def for_tenant(self, tenant: Optional[str]) -> "EmbeddingManager":
+        """
+        Lấy EmbeddingManager của collection riêng cho một tenant/workspace.
+        
+        Các manager dùng chung client embedding, cache embedding truy vấn và bộ
+        quản lý collection (nạp/giải phóng theo LRU); dữ liệu, manifest và cache
+        kết quả tìm kiếm là riêng của từng tenant.
+        
+        Args:
+            tenant: Tên tenant/workspace; None hoặc rỗng là collection mặc định
+            
+        Returns:
+            EmbeddingManager của tenant
+        """
+        if not tenant:
+            return self
+        
+        name = tenant_collection_name(self.collection_name, tenant)
+        with self._tenants_lock:
+            manager = self._tenants.get(name)
+            if manager is None:
+                manager = EmbeddingManager(
+                    uri=self.uri,
+                    collection_name=name,
+                    backend=self.backend,
+                    embeddings=self.embeddings,
+                    collections=self.collections,
+                    search_mode=self.search_mode
+                )
+                manager.embedding_scheduler = self.embedding_scheduler
+                manager.query_embedding_cache = self.query_embedding_cache
+                self._tenants[name] = manager
+            return manager
+    
+    def _use_collection(self):
+        """Giữ collection Milvus trong bộ nhớ trong lúc tìm kiếm (backend numpy không cần)."""
+        if self.collections is None:
+            return contextlib.nullcontext()
+        return self.collections.use(self.collection_name)
+    
+    @property
+    def ready(self) -> bool:
+        """True nếu client embedding và vector store đã sẵn sàng."""
+        return self._embeddings.ready and self._vector_store.ready
+    
+    def _create_embeddings(self):
+        """
+        Tạo mô hình embedding, qua bộ lập lịch request và bọc bởi cache trên đĩa nếu được bật.
+        
+        Returns:
+            Đối tượng Embeddings
+        """
+        from langchain_openai import OpenAIEmbeddings
+        
+        embeddings = OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            base_url=OPENAI_BASE_URL,
+            # Bộ lập lịch tự thử lại và giảm tốc khi gặp lỗi 429
+            max_retries=0 if EMBEDDING_SCHEDULER_ENABLED else 2
+        )
+        if EMBEDDING_SCHEDULER_ENABLED:
+            self.embedding_scheduler = ScheduledEmbeddings(
+                embeddings,
+                max_request_tokens=EMBEDDING_REQUEST_MAX_TOKENS,
+                max_request_inputs=EMBEDDING_REQUEST_MAX_INPUTS,
+                initial_concurrency=EMBEDDING_INITIAL_CONCURRENCY,
+                max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                tokens_per_minute=EMBEDDING_TPM_LIMIT,
+                requests_per_minute=EMBEDDING_RPM_LIMIT,
+                max_retries=EMBEDDING_MAX_RETRIES
+            )
+            embeddings = self.embedding_scheduler
+        if not EMBEDDING_CACHE_ENABLED:
+            return embeddings
+        
+        # Vector rút gọn khác vector đầy đủ nên được cache riêng
+        model_name = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
+        return CachedEmbeddings(
+            embeddings,
+            model_name=model_name,
+            store=EmbeddingCacheStore(EMBEDDING_CACHE_DIR)
+        )
+    
+    def _get_cache_stats(self) -> Dict[str, int]:
+        """
+        Lấy thống kê hit/miss của cache embedding.
+        
+        Returns:
+            Từ điển gồm số lần hit và miss, bằng 0 nếu cache bị tắt
+        """
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.get_stats()
+        return {"hits": 0, "misses": 0}
+    
+    def _store_location(self) -> str:
+        """Trả về nơi lưu dữ liệu của vector store (địa chỉ Milvus hoặc thư mục numpy)."""
+        if self.backend == "numpy":
+            return f"numpy:{os.path.abspath(NUMPY_STORE_DIR)}"
+        return self.uri
+    
+    def _create_lexical_index(self) -> Optional[LexicalIndex]:
+        """
+        Mở chỉ mục từ khóa của collection, đặt cạnh dữ liệu vector khi lưu cục bộ.
+        
+        Returns:
+            LexicalIndex, hoặc None nếu LEXICAL_INDEX_ENABLED=false
+        """
+        if not LEXICAL_INDEX_ENABLED:
+            return None
+        if self.backend == "numpy":
+            path = os.path.join(NUMPY_STORE_DIR, f"{self.collection_name}.lexical.sqlite")
+        elif "://" not in self.uri:
+            # Milvus Lite: uri là đường dẫn file dữ liệu
+            path = f"{os.path.splitext(self.uri)[0]}.{self.collection_name}.lexical.sqlite"
+        else:
+            path = os.path.join(
+                LEXICAL_INDEX_DIR, f"{text_hash(self.uri)[:12]}.{self.collection_name}.sqlite"
+            )
+        return LexicalIndex(path)
+    
+    def _create_vector_store(self, drop_old: bool = False):
         """
         Tạo kết nối đến vector store.
         
+        Args:
+            drop_old: Nếu True, xóa collection cũ khi kết nối
+            
         Returns:
-            Đối tượng Milvus vector store
+            Đối tượng Milvus hoặc NumpyVectorStore tùy theo backend
         """
-        return Milvus(
+        if self.backend == "numpy":
+            return NumpyVectorStore(
+                os.path.join(NUMPY_STORE_DIR, self.collection_name),
+                dtype=NUMPY_STORE_DTYPE,
+                drop_old=drop_old,
+                quantization=VECTOR_QUANTIZATION,
+                search_dims=VECTOR_SEARCH_DIMENSIONS,
+                rerank_factor=VECTOR_RERANK_FACTOR,
+                compact_ratio=NUMPY_COMPACT_RATIO
+            )
+        
+        from langchain_milvus import Milvus
+        
+        # Collection do Milvus.from_documents tạo trước đây dùng khóa chính tự sinh.
+        # Chỉ mục theo index_config được tạo khi collection được tạo (lần ghi đầu tiên).
+        vector_store = Milvus(
             embedding_function=self.embeddings,
-            connection_args={"uri": MILVUS_URI},
-            collection_name=MILVUS_COLLECTION
+            connection_args={"uri": self.uri},
+            collection_name=self.collection_name,
+            auto_id=True,
+            drop_old=drop_old,
+            search_params=self.index_config.search_params(),
+            **self._collection_kwargs()
         )
+        self._sync_index_config(vector_store)
+        if vector_store.col is not None:
+            # langchain_milvus nạp collection đã có khi kết nối
+            self.collections.mark_loaded(self.collection_name)
+        self._scalar_indexed = False
+        return vector_store
+    
+    def _ensure_scalar_indexes(self) -> None:
+        """
+        Tạo chỉ mục vô hướng (INVERTED) cho các trường metadata dùng để lọc.
+        
+        Collection của langchain_milvus chỉ có schema sau lần ghi đầu tiên,
+        nên việc này được làm sau khi nạp dữ liệu và khi khởi động.
+        """
+        if self.backend != "milvus" or self._scalar_indexed:
+            return
+        vector_store = self.vector_store
+        if vector_store.col is None:
+            return
+        
+        client = vector_store.client
+        indexed = {
+            client.describe_index(self.collection_name, name)["field_name"]
+            for name in client.list_indexes(self.collection_name)
+        }
+        missing = [
+            field for field in MILVUS_SCALAR_INDEX_FIELDS
+            if field in vector_store.fields and field not in indexed
+        ]
+        if missing:
+            index_params = client.prepare_index_params()
+            for field in missing:
+                index_params.add_index(field, index_type="INVERTED")
+            client.release_collection(self.collection_name)
+            client.create_index(self.collection_name, index_params)
+            client.load_collection(self.collection_name)
+        self._scalar_indexed = True
+    
+    def _collection_kwargs(self) -> Dict[str, Any]:
+        """Tham số tạo collection Milvus: chỉ mục vector và phân vùng theo tên file."""
+        kwargs: Dict[str, Any] = {"index_params": self.index_config.index_params()}
+        if MILVUS_PARTITION_BY_SOURCE:
+            kwargs["partition_key_field"] = "source"
+            kwargs["num_partitions"] = MILVUS_NUM_PARTITIONS
+        return kwargs
+    
+    def _sync_index_config(self, vector_store) -> None:
+        """
+        Đồng bộ cấu hình với chỉ mục đã có của collection.
+        
+        Tham số tìm kiếm phải khớp loại chỉ mục và độ đo thực tế, nên một
+        collection cũ (ví dụ AUTOINDEX/L2) vẫn tìm kiếm đúng khi config.py đã
+        đổi, cho tới khi rebuild_index được gọi.
+        
+        Args:
+            vector_store: Đối tượng Milvus vừa kết nối
+        """
+        if vector_store.col is None:
+            return
+        index = vector_store._get_index(vector_store._vector_field)
+        if index is not None:
+            self.index_config = IndexConfig.from_index(index["index_param"], base=self.index_config)
+            vector_store.search_params = self.index_config.search_params()
+    
+    def get_index_info(self) -> Dict[str, Any]:
+        """
+        Lấy thông tin chỉ mục vector hiện tại.
+        
+        Returns:
+            Từ điển gồm loại chỉ mục, độ đo, tham số xây dựng và tìm kiếm
+        """
+        if self.backend == "numpy":
+            # Backend numpy quét toàn bộ theo cosine, trên mã nén nếu bật VECTOR_QUANTIZATION
+            memory = self.vector_store.memory_stats()
+            return {
+                "index_type": "FLAT",
+                "metric_type": "COSINE",
+                "params": {"quantization": memory["quantization"], "search_dims": memory["search_dims"]},
+                "search": {"rerank_factor": self.vector_store.rerank_factor},
+                "memory": memory
+            }
+        # Kết nối (và đồng bộ cấu hình với chỉ mục đã có) nếu chưa kết nối
+        self._vector_store.get()
+        return self.index_config.to_dict()
+    
+    def rebuild_index(self, index_config: Optional[IndexConfig] = None) -> Dict[str, Any]:
+        """
+        Xóa và tạo lại chỉ mục vector với tham số mới, rồi nạp lại collection.
+        
+        Dữ liệu không đổi; trong lúc tạo lại collection không tìm kiếm được.
+        Với backend numpy (không có chỉ mục), collection được ghi lại bỏ các
+        dòng đã xóa.
+        
+        Args:
+            index_config: Cấu hình mới, mặc định là cấu hình trong config.py
+                (bỏ qua với backend numpy)
+            
+        Returns:
+            Thông tin chỉ mục sau khi tạo lại
+        """
+        if self.backend == "numpy":
+            if self.vector_store.compact():
+                # Khóa chính (chỉ số dòng) của các đoạn đã thay đổi
+                self._bump_corpus_generation()
+            return self.get_index_info()
+        
+        index_config = index_config or IndexConfig()
+        vector_store = self.vector_store
+        field = vector_store._vector_field
+        
+        if vector_store.col is not None:
+            client = vector_store.client
+            client.release_collection(self.collection_name)
+            for index_name in client.list_indexes(self.collection_name, field_name=field):
+                client.drop_index(self.collection_name, index_name)
+            
+            params = index_config.index_params()
+            index_params = client.prepare_index_params()
+            index_params.add_index(
+                field,
+                index_type=params["index_type"],
+                metric_type=params["metric_type"],
+                params=params["params"]
+            )
+            client.create_index(self.collection_name, index_params)
+            client.load_collection(self.collection_name)
+        
+        # Collection chưa có: chỉ mục sẽ được tạo theo cấu hình mới ở lần ghi đầu tiên
+        self.index_config = index_config
+        vector_store.index_params = index_config.index_params()
+        vector_store._index_param_map = {field: vector_store.index_params}
+        vector_store.search_params = index_config.search_params()
+        # Kết quả tìm kiếm có thể khác với chỉ mục mới
+        self._bump_corpus_generation()
+        return self.get_index_info()
+    
+    def _iter_stored_documents(self, batch_size: int) -> Iterator[List[Document]]:
+        """
+        Đọc lại toàn bộ đoạn văn bản đang có trong vector store theo lô.
+        
+        Args:
+            batch_size: Số đoạn mỗi lô
+            
+        Returns:
+            Iterator các lô tài liệu
+        """
+        if self.backend == "numpy":
+            yield from self.vector_store.iter_documents(batch_size)
+            return
+        
+        vector_store = self.vector_store
+        if vector_store.col is None:
+            return
+        output_fields = [field for field in vector_store.fields if field != vector_store._vector_field]
+        with self._use_collection():
+            iterator = vector_store.client.query_iterator(
+                self.collection_name,
+                batch_size=batch_size,
+                filter="",
+                output_fields=output_fields
+            )
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    yield [vector_store._parse_document(dict(row)) for row in rows]
+            finally:
+                iterator.close()
+    
+    def rebuild_lexical_index(self, batch_size: int = INGEST_BATCH_SIZE) -> int:
+        """
+        Dựng lại chỉ mục từ khóa từ dữ liệu đang có trong vector store.
+        
+        Dùng cho collection đã nạp trước khi có chỉ mục từ khóa (file không
+        đổi được bỏ qua khi nạp lại nên không tự vào chỉ mục); không gọi API embedding.
+        
+        Args:
+            batch_size: Số đoạn đọc và ghi mỗi lô
+            
+        Returns:
+            Số đoạn trong chỉ mục sau khi dựng lại
+        """
+        index = self.lexical_index
+        if index is None:
+            raise ValueError("Chỉ mục từ khóa đang tắt (LEXICAL_INDEX_ENABLED=false)")
+        
+        index.clear()
+        with telemetry.span("lexical_index", rebuild=True):
+            for batch in self._iter_stored_documents(batch_size):
+                index.add(batch)
+        self._bump_corpus_generation()
+        return len(index)
+    
+    def preload(self) -> None:
+        """
+        Nạp collection vào bộ nhớ và chạy một truy vấn thử.
+        
+        Truy vấn thử (vector đơn vị, không gọi API embedding) buộc Milvus nạp
+        các segment và chỉ mục, hoặc đọc file vector của backend numpy vào
+        page cache, để truy vấn thật đầu tiên không phải chờ.
+        """
+        vector_store = self.vector_store
+        if self.backend == "numpy":
+            dim = vector_store.dim
+        else:
+            if vector_store.col is None:
+                return
+            self._ensure_scalar_indexes()
+            field = next(
+                f for f in vector_store.col.schema.fields if f.name == vector_store._vector_field
+            )
+            dim = field.params["dim"]
+        
+        if dim:
+            probe = np.zeros(dim, dtype=np.float32)
+            probe[0] = 1.0
+            with self._use_collection(), telemetry.span("preload", backend=self.backend):
+                vector_store.similarity_search_by_vector(probe.tolist(), k=1)
+    
+    @staticmethod
+    def _iter_batches(
+        documents: Iterable[Document],
+        batch_size: int
+    ) -> Iterator[List[Document]]:
+        """
+        Gom các đoạn văn bản của tất cả các file thành các lô kích thước cố định.
+        
+        Args:
+            documents: Iterable các đoạn văn bản
+            batch_size: Số đoạn văn bản tối đa trong một lô
+            
+        Returns:
+            Iterator các lô đoạn văn bản
+        """
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def _embed_batch(self, batch: List[Document]) -> List[List[float]]:
+        """Tạo embedding cho một lô đoạn văn bản."""
+        with self._embed_slots, telemetry.span("embed", chunks=len(batch)):
+            return self.embeddings.embed_documents([doc.page_content for doc in batch])
+    
+    def _insert_batch(self, batch: List[Document], vectors: List[List[float]]) -> List:
+        """Ghi một lô đoạn văn bản đã có embedding vào vector store."""
+        with self._insert_slots:
+            with telemetry.span("insert", chunks=len(batch)):
+                ids = self.vector_store.add_embeddings(
+                    texts=[doc.page_content for doc in batch],
+                    embeddings=vectors,
+                    metadatas=[doc.metadata for doc in batch],
+                    batch_size=len(batch)
+                )
+            # Chỉ mục từ khóa được cập nhật trên cùng luồng ghi, song song với embedding lô sau
+            if self.lexical_index is not None:
+                with telemetry.span("lexical_index", chunks=len(batch)):
+                    self.lexical_index.add(batch)
+            return ids
+    
+    def _ingest_batches(
+        self,
+        batches: Iterable[List[Document]]
+    ) -> Iterator[Tuple[List[Document], List]]:
+        """
+        Tạo embedding và ghi các lô vào vector store theo kiểu đường ống.
+        
+        Việc tạo embedding cho lô N+1 chạy song song với việc ghi lô N,
+        và chỉ có tối đa một lô đang được ghi tại mỗi thời điểm.
+        
+        Args:
+            batches: Iterable các lô đoạn văn bản
+            
+        Returns:
+            Iterator các cặp (lô, danh sách khóa chính) sau khi lô được ghi xong
+        """
+        with ThreadPoolExecutor(max_workers=1) as insert_pool:
+            pending = None
+            try:
+                for batch in batches:
+                    vectors = self._embed_batch(batch)
+                    
+                    # Chờ lô trước ghi xong rồi mới gửi lô tiếp theo
+                    if pending is not None:
+                        yield pending[0], pending[1].result()
+                    pending = (batch, insert_pool.submit(self._insert_batch, batch, vectors))
+            except Exception:
+                # Đọc hoặc embedding lô sau bị lỗi: vẫn báo lô trước đã ghi xong
+                # (để bên gọi ghi checkpoint) rồi mới báo lỗi
+                if pending is not None:
+                    batch, future = pending
+                    pending = None
+                    yield batch, future.result()
+                raise
+            
+            if pending is not None:
+                yield pending[0], pending[1].result()
+    
+    def _flush(self) -> None:
+        """Flush collection một lần sau khi ghi xong để dữ liệu được lưu bền vững."""
+        with telemetry.span("flush"):
+            if self.backend == "numpy":
+                self.vector_store.flush()
+            elif self.vector_store.col is not None:
+                self.vector_store.col.flush()
+    
+    def _bump_corpus_generation(self) -> None:
+        """Đánh dấu dữ liệu đã thay đổi, làm mất hiệu lực cache kết quả tìm kiếm."""
+        self._set_corpus_generation(self.manifest.bump_version())
+        self._generation_checked_at = time.monotonic()
+    
+    def get_query_cache_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê của các cache phía truy vấn.
+        
+        Returns:
+            Từ điển gồm thế hệ dữ liệu hiện tại và thống kê của từng lớp cache
+        """
+        return {
+            "corpus_generation": self.corpus_generation,
+            "query_embedding": self.query_embedding_cache.get_stats(),
+            "search": self.search_cache.get_stats()
+        }
+    
+    def get_collection_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Lấy thống kê nạp/giải phóng collection trên Milvus.
+        
+        Returns:
+            Từ điển thống kê, hoặc None với backend numpy
+        """
+        if self.collections is None:
+            return None
+        return self.collections.get_stats()
+    
+    def get_lexical_index_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Lấy thống kê của chỉ mục từ khóa.
+        
+        Returns:
+            Từ điển thống kê của chỉ mục kèm số truy vấn theo cách tìm
+            ("searches"), hoặc None nếu chỉ mục đang tắt
+        """
+        if self.lexical_index is None:
+            return None
+        return {**self.lexical_index.get_stats(), "searches": dict(self.search_plans)}
+    
+    def get_embedding_scheduler_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Lấy thống kê của bộ lập lịch request embedding.
+        
+        Returns:
+            Từ điển thống kê, hoặc None nếu không dùng bộ lập lịch
+        """
+        if self.embedding_scheduler is None:
+            return None
+        return self.embedding_scheduler.get_stats()
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """
+        Tạo embedding cho truy vấn, dùng cache trong bộ nhớ nếu có.
+        
+        Args:
+            query: Truy vấn
+            
+        Returns:
+            Vector embedding của truy vấn
+        """
+        embedding = self.query_embedding_cache.get(query)
+        if embedding is None:
+            with telemetry.span("embed_query"):
+                embedding = self.embeddings.embed_query(query)
+            self.query_embedding_cache.set(query, embedding)
+        return embedding
+    
+    async def _aembed_query(self, query: str) -> List[float]:
+        """
+        Phiên bản bất đồng bộ của _embed_query.
+        
+        Args:
+            query: Truy vấn
+            
+        Returns:
+            Vector embedding của truy vấn
+        """
+        embedding = self.query_embedding_cache.get(query)
+        if embedding is None:
+            with telemetry.span("embed_query"):
+                embedding = await self.embeddings.aembed_query(query)
+            self.query_embedding_cache.set(query, embedding)
+        return embedding
+    
+    def is_file_unchanged(self, source: str, file_hash: str) -> bool:
+        """
+        Kiểm tra một file đã được nạp với đúng nội dung này hay chưa.
+        
+        Args:
+            source: Tên file
+            file_hash: Mã băm nội dung file
+            
+        Returns:
+            True nếu file đã được nạp và không thay đổi
+        """
+        return self.manifest.get_file_hash(source) == file_hash
+    
+    def _supports_chunk_delete(self) -> bool:
+        """
+        Kiểm tra collection có trường chunk_hash để xóa theo từng đoạn hay không.
+        
+        Collection tạo trước khi có manifest không có trường này, khi đó chỉ
+        có thể xóa toàn bộ đoạn văn bản của một file.
+        """
+        if self.backend == "numpy":
+            return True
+        return self.vector_store.col is None or "chunk_hash" in self.vector_store.fields
+    
+    def _delete_source(self, source: str, chunk_hashes: Optional[Iterable[str]] = None) -> None:
+        """
+        Xóa các đoạn văn bản của một file bằng biểu thức lọc trên trường source.
+        
+        Args:
+            source: Tên file
+            chunk_hashes: Nếu có, chỉ xóa các đoạn có mã băm thuộc danh sách này
+        """
+        if chunk_hashes is not None:
+            chunk_hashes = list(chunk_hashes)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(source, chunk_hashes)
+        
+        if self.backend == "milvus" and self.vector_store.col is None:
+            return
+        
+        source_expr = f"source == {_quote(source)}"
+        if chunk_hashes is None:
+            self.vector_store.delete(expr=source_expr)
+            return
+        
+        for start in range(0, len(chunk_hashes), DELETE_BATCH_SIZE):
+            values = ", ".join(_quote(h) for h in chunk_hashes[start:start + DELETE_BATCH_SIZE])
+            self.vector_store.delete(expr=f"{source_expr} and chunk_hash in [{values}]")
+    
+    def _select_changed_chunks(
+        self,
+        documents: Iterable[Document],
+        file_states: Dict[str, Dict[str, Any]],
+        counters: Dict[str, int],
+        resume: Optional[Dict[str, Set[str]]] = None
+    ) -> Iterator[Document]:
+        """
+        Lọc luồng đoạn văn bản, chỉ giữ lại các đoạn cần ghi mới.
+        
+        File không đổi (cùng mã băm file) bị bỏ qua hoàn toàn. File đã thay
+        đổi chỉ giữ các đoạn có mã băm chưa từng được ghi; nếu collection
+        không hỗ trợ xóa theo từng đoạn hoặc file chưa có trong manifest thì
+        xóa toàn bộ đoạn cũ của file trước khi ghi lại.
+        
+        Args:
+            documents: Iterable các đoạn văn bản
+            file_states: Từ điển trạng thái từng file, được cập nhật trong quá trình lọc
+            counters: Bộ đếm số đoạn không đổi, được cập nhật trong quá trình lọc
+            resume: Mã băm các đoạn đã được ghi theo từng file bởi một lần nạp
+                bị gián đoạn; các đoạn này được giữ lại và không ghi lần nữa
+            
+        Returns:
+            Iterator các đoạn văn bản cần ghi
+        """
+        chunk_delete = self._supports_chunk_delete()
+        resume = resume or {}
+        
+        for doc in documents:
+            source = doc.metadata.get("source", "")
+            state = file_states.get(source)
+            
+            # Lần đầu gặp file: so sánh với manifest
+            if state is None:
+                file_hash = doc.metadata.get("file_hash")
+                record = self.manifest.get_file(source)
+                state = {"file_hash": file_hash, "old": set(), "new": set(), "unchanged": False}
+                
+                if record is not None and file_hash is not None and record[0] == file_hash:
+                    state["unchanged"] = True
+                    # Số đoạn không đổi là số đoạn đang lưu của file (đã bỏ đoạn trùng lặp)
+                    counters["unchanged_chunks"] += len(record[1])
+                elif source in resume:
+                    # Tiếp tục lần nạp dở: không xóa các đoạn đã ghi
+                    state["old"] = (record[1] if record is not None and chunk_delete else set()) | resume[source]
+                elif record is not None and chunk_delete:
+                    state["old"] = record[1]
+                else:
+                    self._delete_source(source)
+                
+                file_states[source] = state
+            
+            if state["unchanged"]:
+                continue
+            
+            chunk_hash = text_hash(f"{source}\0{doc.page_content}")
+            doc.metadata["chunk_hash"] = chunk_hash
+            
+            # Bỏ qua đoạn trùng lặp trong cùng một file
+            if chunk_hash in state["new"]:
+                continue
+            state["new"].add(chunk_hash)
+            
+            if chunk_hash in state["old"]:
+                counters["unchanged_chunks"] += 1
+                continue
+            
+            yield doc
+    
+    def add_documents_stream(
+        self,
+        documents: Iterable[Document],
+        clear_existing: bool = False,
+        batch_size: int = INGEST_BATCH_SIZE,
+        incremental: bool = INCREMENTAL_INGEST,
+        resume: Optional[Dict[str, Set[str]]] = None,
+        sources: Optional[Iterable[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Thêm tài liệu vào vector store từ một luồng đoạn văn bản.
+        
+        Các đoạn văn bản chỉ được lấy từ luồng khi cần, nên bộ nhớ sử dụng bị
+        giới hạn bởi khoảng hai lô (một lô đang tạo embedding, một lô đang
+        ghi) bất kể dữ liệu đầu vào lớn đến đâu; batch_size chính là cửa sổ
+        điều chỉnh giới hạn này.
+        
+        Ở chế độ incremental, file không đổi được bỏ qua và file đã thay đổi
+        chỉ ghi các đoạn mới và xóa các đoạn không còn tồn tại.
+        
+        Args:
+            documents: Iterable các đoạn văn bản, có metadata "source" là tên file
+            clear_existing: Nếu True, sẽ xóa tất cả dữ liệu cũ trước khi thêm dữ liệu mới
+            batch_size: Số đoạn văn bản trong mỗi lô embedding/ghi
+            incremental: Nếu True, dùng manifest để chỉ nạp phần đã thay đổi
+            resume: Mã băm các đoạn đã ghi theo từng file của một lần nạp bị
+                gián đoạn (chỉ dùng ở chế độ incremental)
+            sources: Tên các file đang được nạp. Ở chế độ incremental, file nằm
+                trong danh sách nhưng không có đoạn nào (file rỗng, PDF chỉ có
+                ảnh) bị xóa dữ liệu cũ và bị xóa khỏi manifest
+            
+        Returns:
+            Iterator các sự kiện tiến độ. Sau mỗi lô được ghi là sự kiện
+            {"event": "progress", "file_counts": ..., "total_chunks": ...,
+            "chunk_hashes": ...} với chunk_hashes là mã băm các đoạn của lô;
+            sự kiện cuối cùng là {"event": "done", "results": ...} với kết quả
+            giống add_documents
+        """
+        start_time = time.perf_counter()
+        stats_before = self._get_cache_stats()
+        if sources is not None:
+            sources = list(sources)
+        
+        # Xóa dữ liệu cũ nếu clear_existing=True
+        if clear_existing:
+            self.vector_store = self._create_vector_store(drop_old=True)
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            self.manifest.clear()
+            self._bump_corpus_generation()
+        
+        file_states = {}
+        counters = {"unchanged_chunks": 0, "deleted_chunks": 0}
+        if incremental:
+            documents = self._select_changed_chunks(documents, file_states, counters, resume)
+        
+        file_counts = {}
+        total_chunks = 0
+        for batch, _ in self._ingest_batches(self._iter_batches(documents, batch_size)):
+            for doc in batch:
+                source = doc.metadata.get("source", "")
+                file_counts[source] = file_counts.get(source, 0) + 1
+            total_chunks += len(batch)
+            
+            yield {
+                "event": "progress",
+                "file_counts": dict(file_counts),
+                "total_chunks": total_chunks,
+                "chunk_hashes": [doc.metadata.get("chunk_hash") for doc in batch]
+            }
+        
+        # Xóa các đoạn cũ không còn tồn tại trong phiên bản mới của file
+        for source, state in file_states.items():
+            if state["unchanged"]:
+                continue
+            stale_hashes = state["old"] - state["new"]
+            if stale_hashes:
+                self._delete_source(source, stale_hashes)
+                counters["deleted_chunks"] += len(stale_hashes)
+        
+        # File không còn đoạn văn bản nào: xóa toàn bộ dữ liệu cũ của file
+        emptied = []
+        if incremental and sources is not None:
+            for source in dict.fromkeys(sources):
+                if source in file_states:
+                    continue
+                record = self.manifest.get_file(source)
+                if record is not None:
+                    self._delete_source(source)
+                    counters["deleted_chunks"] += len(record[1])
+                    emptied.append(source)
+        
+        if total_chunks or counters["deleted_chunks"] or emptied:
+            self._flush()
+            self._ensure_scalar_indexes()
+            self._bump_corpus_generation()
+        
+        # Chỉ cập nhật manifest sau khi dữ liệu đã được ghi bền vững
+        for source, state in file_states.items():
+            if not state["unchanged"] and state["file_hash"] is not None:
+                self.manifest.replace_file(source, state["file_hash"], state["new"])
+        for source in emptied:
+            self.manifest.remove_file(source)
+        
+        elapsed = time.perf_counter() - start_time
+        
+        # Cập nhật kết quả
+        results = {source: 0 for source in (*(sources or ()), *file_states)}
+        results.update(file_counts)
+        results["total_chunks"] = total_chunks
+        results["unchanged_chunks"] = counters["unchanged_chunks"]
+        results["deleted_chunks"] = counters["deleted_chunks"]
+        results["chunks_per_second"] = round(total_chunks / elapsed, 1) if elapsed > 0 else 0.0
+        
+        # Thêm thống kê cache embedding của lần thêm này
+        stats_after = self._get_cache_stats()
+        results["cache_hits"] = stats_after["hits"] - stats_before["hits"]
+        results["cache_misses"] = stats_after["misses"] - stats_before["misses"]
+        
+        yield {"event": "done", "results": results}
     
     def add_documents(
         self,
         documents_dict: Dict[str, List[Document]],
-        clear_existing: bool = False
+        clear_existing: bool = False,
+        batch_size: int = INGEST_BATCH_SIZE,
+        incremental: bool = INCREMENTAL_INGEST
     ) -> Dict[str, int]:
         """
         Thêm tài liệu vào vector store.
         
+        Tất cả các file dùng chung một kết nối Milvus; các đoạn văn bản được
+        gom thành lô kích thước cố định và chỉ flush một lần ở cuối.
+        
         Args:
             documents_dict: Từ điển với tên file và danh sách các đoạn văn bản
             clear_existing: Nếu True, sẽ xóa tất cả dữ liệu cũ trước khi thêm dữ liệu mới
+            batch_size: Số đoạn văn bản trong mỗi lô embedding/ghi
+            incremental: Nếu True, dùng manifest để chỉ nạp phần đã thay đổi
             
         Returns:
-            Từ điển với tên file và số lượng chunks đã được thêm
+            Từ điển với tên file và số lượng chunks đã được thêm, kèm theo
+            tổng số chunks, số chunks không đổi/đã xóa, thông lượng (chunks/s)
+            và số lần hit/miss của cache embedding
         """
         results = {}
-        total_chunks = 0
-        is_first = True
-        
-        for file_name, docs in documents_dict.items():
-            # Xóa dữ liệu cũ nếu là file đầu tiên và clear_existing=True
-            drop_old = (is_first and clear_existing)
-            
-            # Thêm tài liệu vào vector store
-            if docs:
-                Milvus.from_documents(
-                    docs,
-                    self.embeddings,
-                    connection_args={"uri": MILVUS_URI},
-                    collection_name=MILVUS_COLLECTION,
-                    drop_old=drop_old
-                )
-                
-                # Cập nhật kết quả
-                results[file_name] = len(docs)
-                total_chunks += len(docs)
-            else:
-                results[file_name] = 0
-            
-            is_first = False
+        for event in self.add_documents_stream(
+            chain.from_iterable(documents_dict.values()),
+            clear_existing=clear_existing,
+            batch_size=batch_size,
+            incremental=incremental,
+            sources=documents_dict.keys()
+        ):
+            if event["event"] == "done":
+                results = event["results"]
         
-        # Cập nhật vector store
-        self.vector_store = self._create_vector_store()
+        return results
+    
+    @staticmethod
+    def _combine_filters(expr: Optional[str], filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Kết hợp biểu thức lọc tự viết với bộ lọc theo metadata."""
+        clauses = [clause for clause in (expr, build_filter_expr(**(filters or {}))) if clause]
+        return " and ".join(clauses) or None
+    
+    def get_sources(self) -> List[str]:
+        """
+        Lấy danh sách các file đã nạp vào collection (theo manifest).
         
-        # Thêm tổng số chunks vào kết quả
-        results["total_chunks"] = total_chunks
+        Returns:
+            Tên các file
+        """
+        return self.manifest.list_sources()
+    
+    def _search_kwargs(self, k: int, search_params: Optional[Dict[str, int]]) -> Dict[str, Any]:
+        """
+        Tham số tìm kiếm truyền cho vector store.
         
-        return results
+        Args:
+            k: Số kết quả cần trả về
+            search_params: Tham số ghi đè cho truy vấn (ef, nprobe)
+            
+        Returns:
+            {"param": ...} cho Milvus; rỗng cho backend numpy (luôn tìm kiếm chính xác)
+        """
+        if self.backend != "milvus":
+            return {}
+        return {"param": self.index_config.search_params(k, **(search_params or {}))}
+    
+    def _plan_search(
+        self,
+        query: str,
+        k: int,
+        expr: Optional[str],
+        filters: Optional[Dict[str, Any]],
+        mode: str
+    ) -> Tuple[str, List[Document]]:
+        """
+        Chọn cách tìm kiếm cho một truy vấn và lấy kết quả từ chỉ mục từ khóa.
+        
+        Args:
+            query: Truy vấn
+            k: Số kết quả cần trả về
+            expr: Biểu thức lọc tự viết; chỉ mục từ khóa không hiểu biểu thức
+                nên khi có expr chỉ tìm bằng vector
+            filters: Bộ lọc theo metadata (áp dụng cho cả hai chỉ mục)
+            mode: Chế độ tìm kiếm được yêu cầu
+            
+        Returns:
+            Tuple gồm cách tìm thực tế ("vector", "hybrid" hoặc "lexical") và
+            kết quả từ chỉ mục từ khóa
+        """
+        index = self.lexical_index
+        # Collection nạp trước khi có chỉ mục từ khóa: giữ nguyên tìm kiếm vector
+        if index is None or expr or mode == "vector" or (mode != "lexical" and not len(index)):
+            self.search_plans["vector"] += 1
+            return "vector", []
+        
+        with telemetry.span("lexical_search", k=k):
+            hits = index.search(query, k if mode == "lexical" else k * HYBRID_CANDIDATE_FACTOR, filters)
+        if mode == "lexical" or (
+            hits and mode == "auto" and index.is_keyword_query(query, LEXICAL_QUERY_MAX_TERMS)
+        ):
+            plan, hits = "lexical", hits[:k]
+        else:
+            plan = "hybrid" if hits else "vector"
+        self.search_plans[plan] += 1
+        return plan, hits
     
-    def similarity_search(self, query: str, k: int = 4) -> Tuple[str, List[Document]]:
+    @staticmethod
+    def _vector_k(k: int, plan: str) -> int:
+        """Số kết quả lấy từ vector store: nhiều hơn k khi còn hợp nhất với kết quả từ khóa."""
+        return k * HYBRID_CANDIDATE_FACTOR if plan == "hybrid" else k
+    
+    @staticmethod
+    def _fuse(plan: str, lexical_docs: List[Document], vector_docs: List[Document], k: int) -> List[Document]:
+        """Ghép kết quả vector và từ khóa theo cách tìm đã chọn."""
+        if plan == "lexical":
+            return lexical_docs[:k]
+        if plan == "hybrid":
+            return reciprocal_rank_fusion([vector_docs, lexical_docs], k, HYBRID_RRF_K)
+        return vector_docs[:k]
+    
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        expr: Optional[str] = None,
+        search_params: Optional[Dict[str, int]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[str, List[Document]]:
         """
         Thực hiện tìm kiếm tương tự dựa trên truy vấn.
         
+        Kết quả vector được hợp nhất theo thứ hạng (RRF) với kết quả BM25 của
+        chỉ mục từ khóa cục bộ; ở chế độ "auto", truy vấn tra cứu theo mã/số
+        hiệu chỉ dùng chỉ mục từ khóa, không gọi API embedding hay Milvus.
+        Kết quả được cache theo (thế hệ dữ liệu, truy vấn, k, biểu thức lọc,
+        tham số tìm kiếm, chế độ), nên các truy vấn lặp lại cũng không cần.
+        
         Args:
             query: Truy vấn cần tìm kiếm
             k: Số lượng kết quả trả về
+            expr: Biểu thức lọc của Milvus (tùy chọn)
+            search_params: Tham số tìm kiếm cho riêng truy vấn này, ví dụ
+                {"ef": 128} (HNSW) hoặc {"nprobe": 64} (IVF) để tăng recall
+            filters: Bộ lọc theo metadata, là các tham số của build_filter_expr
+                (source, file_type, uploaded_after, uploaded_before); kết hợp với expr
+            mode: Chế độ tìm kiếm cho riêng truy vấn này (mặc định search_mode)
             
         Returns:
             Tuple gồm chuỗi kết quả đã được định dạng và danh sách các tài liệu tìm thấy
         """
-        retrieved_docs = self.vector_store.similarity_search(query, k=k)
+        mode = mode or self.search_mode
+        combined_expr = self._combine_filters(expr, filters)
+        cache_key = (
+            self.corpus_generation, query, k, combined_expr,
+            tuple(sorted((search_params or {}).items())), mode
+        )
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        plan, lexical_docs = self._plan_search(query, k, expr, filters, mode)
+        vector_docs = []
+        if plan != "lexical":
+            embedding = self._embed_query(query)
+            vector_k = self._vector_k(k, plan)
+            with self._use_collection(), telemetry.span(
+                "search", k=vector_k, backend=self.backend, filtered=combined_expr is not None
+            ):
+                vector_docs = self.vector_store.similarity_search_by_vector(
+                    embedding,
+                    k=vector_k,
+                    expr=combined_expr,
+                    **self._search_kwargs(vector_k, search_params)
+                )
+        retrieved_docs = self._fuse(plan, lexical_docs, vector_docs, k)
+        
+        result = (self._format_results(retrieved_docs), retrieved_docs)
+        self.search_cache.set(cache_key, result)
+        return result
+    
+    async def asimilarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        expr: Optional[str] = None,
+        search_params: Optional[Dict[str, int]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[str, List[Document]]:
+        """
+        Phiên bản bất đồng bộ của similarity_search.
+        
+        Embedding truy vấn dùng client async; tìm kiếm Milvus chạy trong
+        thread pool vì client async của Milvus gắn với vòng lặp sự kiện lúc
+        khởi tạo, trong khi EmbeddingManager có thể được dùng từ nhiều vòng lặp.
         
-        serialized = "\n\n".join(
-            (f"Source: {doc.metadata}\n" f"Content: {doc.page_content}")
-            for doc in retrieved_docs
+        Args:
+            query: Truy vấn cần tìm kiếm
+            k: Số lượng kết quả trả về
+            expr: Biểu thức lọc của Milvus (tùy chọn)
+            search_params: Tham số tìm kiếm cho riêng truy vấn này, ví dụ
+                {"ef": 128} (HNSW) hoặc {"nprobe": 64} (IVF) để tăng recall
+            filters: Bộ lọc theo metadata, là các tham số của build_filter_expr
+                (source, file_type, uploaded_after, uploaded_before); kết hợp với expr
+            mode: Chế độ tìm kiếm cho riêng truy vấn này (mặc định search_mode)
+            
+        Returns:
+            Tuple gồm chuỗi kết quả đã được định dạng và danh sách các tài liệu tìm thấy
+        """
+        mode = mode or self.search_mode
+        combined_expr = self._combine_filters(expr, filters)
+        cache_key = (
+            self.corpus_generation, query, k, combined_expr,
+            tuple(sorted((search_params or {}).items())), mode
         )
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        plan, lexical_docs = await asyncio.to_thread(self._plan_search, query, k, expr, filters, mode)
+        vector_docs = []
+        if plan != "lexical":
+            embedding = await self._aembed_query(query)
+            vector_k = self._vector_k(k, plan)
+            
+            def search():
+                # Việc nạp collection (nếu đã bị giải phóng) cũng chạy ngoài vòng lặp sự kiện
+                with self._use_collection():
+                    return self.vector_store.similarity_search_by_vector(
+                        embedding,
+                        k=vector_k,
+                        expr=combined_expr,
+                        **self._search_kwargs(vector_k, search_params)
+                    )
+            
+            with telemetry.span("search", k=vector_k, backend=self.backend, filtered=combined_expr is not None):
+                vector_docs = await asyncio.to_thread(search)
+        retrieved_docs = self._fuse(plan, lexical_docs, vector_docs, k)
+        
+        result = (self._format_results(retrieved_docs), retrieved_docs)
+        self.search_cache.set(cache_key, result)
+        return result
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Tạo embedding cho nhiều truy vấn, dùng cache trong bộ nhớ nếu có.
+        
+        Các truy vấn chưa có trong cache được gửi trong một request embed_documents.
+        
+        Args:
+            queries: Danh sách truy vấn
+            
+        Returns:
+            Danh sách vector theo thứ tự truy vấn
+        """
+        embeddings = [self.query_embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing:
+            with telemetry.span("embed_query", queries=len(missing)):
+                computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for query, embedding in computed.items():
+                self.query_embedding_cache.set(query, embedding)
+            embeddings = [e if e is not None else computed[q] for q, e in zip(queries, embeddings)]
+        return embeddings
+    
+    async def _aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Phiên bản bất đồng bộ của _embed_queries.
+        
+        Args:
+            queries: Danh sách truy vấn
+            
+        Returns:
+            Danh sách vector theo thứ tự truy vấn
+        """
+        embeddings = [self.query_embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if missing:
+            with telemetry.span("embed_query", queries=len(missing)):
+                computed = dict(zip(missing, await self.embeddings.aembed_documents(missing)))
+            for query, embedding in computed.items():
+                self.query_embedding_cache.set(query, embedding)
+            embeddings = [e if e is not None else computed[q] for q, e in zip(queries, embeddings)]
+        return embeddings
+    
+    def _search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        expr: Optional[str],
+        search_params: Optional[Dict[str, int]]
+    ) -> List[List[Document]]:
+        """
+        Tìm kiếm nhiều vector truy vấn trong một lần gọi vector store.
+        
+        Args:
+            embeddings: Các vector truy vấn
+            k: Số kết quả cho mỗi truy vấn
+            expr: Biểu thức lọc (tùy chọn)
+            search_params: Tham số tìm kiếm ghi đè (ef, nprobe)
+            
+        Returns:
+            Với mỗi truy vấn, danh sách tài liệu theo thứ tự liên quan giảm dần
+        """
+        with telemetry.span("search", k=k, backend=self.backend, filtered=expr is not None, queries=len(embeddings)):
+            if self.backend == "numpy":
+                results = self.vector_store.similarity_search_with_score_by_vectors(embeddings, k=k, expr=expr)
+                return [[doc for doc, _ in hits] for hits in results]
+            
+            vector_store = self.vector_store
+            if vector_store.col is None:
+                return [[] for _ in embeddings]
+            
+            # langchain_milvus chỉ tìm từng vector; gọi thẳng client để gửi cả lô trong một request
+            if vector_store.enable_dynamic_field:
+                output_fields = ["*"]
+            else:
+                output_fields = vector_store._remove_forbidden_fields(vector_store.fields[:])
+            with self._use_collection():
+                results = vector_store.client.search(
+                    self.collection_name,
+                    data=embeddings,
+                    anns_field=vector_store._vector_field,
+                    search_params=self._search_kwargs(k, search_params)["param"],
+                    limit=k,
+                    filter=expr or "",
+                    output_fields=output_fields
+                )
+            return [
+                [doc for doc, _ in vector_store._parse_documents_from_search_results([hits])]
+                for hits in results
+            ]
+    
+    def _plan_many(
+        self,
+        queries: List[str],
+        k: int,
+        expr: Optional[str],
+        search_params: Optional[Dict[str, int]]
+    ) -> Tuple[List[Optional[List[Document]]], List[str], List[tuple]]:
+        """
+        Tra cache kết quả cho từng truy vấn của similarity_search_many.
+        
+        Returns:
+            Tuple gồm kết quả theo truy vấn (None nếu chưa có), các truy vấn
+            cần tìm (không trùng lặp) và khóa cache của từng truy vấn
+        """
+        params_key = tuple(sorted((search_params or {}).items()))
+        keys = [(self.corpus_generation, query, k, expr, params_key, self.search_mode) for query in queries]
+        results = []
+        for key in keys:
+            cached = self.search_cache.get(key)
+            results.append(cached[1] if cached is not None else None)
+        pending = list(dict.fromkeys(q for q, r in zip(queries, results) if r is None))
+        return results, pending, keys
+    
+    def _plan_many_search(
+        self,
+        pending: List[str],
+        k: int,
+        expr: Optional[str],
+        filters: Optional[Dict[str, Any]]
+    ) -> Tuple[List[Tuple[str, List[Document]]], List[str], int]:
+        """
+        Chọn cách tìm kiếm cho từng truy vấn chưa có trong cache của similarity_search_many.
+        
+        Returns:
+            Tuple gồm (cách tìm, kết quả từ khóa) của từng truy vấn, các truy
+            vấn cần tìm bằng vector và số kết quả vector cần lấy cho mỗi truy vấn
+        """
+        plans = [self._plan_search(query, k, expr, filters, self.search_mode) for query in pending]
+        vector_queries = [query for query, (plan, _) in zip(pending, plans) if plan != "lexical"]
+        vector_k = max((self._vector_k(k, plan) for plan, _ in plans), default=k)
+        return plans, vector_queries, vector_k
+    
+    def _fuse_many(
+        self,
+        plans: List[Tuple[str, List[Document]]],
+        vector_results: List[List[Document]],
+        k: int
+    ) -> List[List[Document]]:
+        """Ghép kết quả vector (theo thứ tự các truy vấn cần tìm bằng vector) với kết quả từ khóa."""
+        vector_results = iter(vector_results)
+        return [
+            self._fuse(plan, lexical_docs, next(vector_results) if plan != "lexical" else [], k)
+            for plan, lexical_docs in plans
+        ]
+    
+    def _finish_many(
+        self,
+        queries: List[str],
+        results: List[Optional[List[Document]]],
+        keys: List[tuple],
+        pending: List[str],
+        found: List[List[Document]]
+    ) -> List[List[Document]]:
+        """Ghép kết quả vừa tìm với kết quả từ cache và lưu vào cache."""
+        found_by_query = dict(zip(pending, found))
+        for i, query in enumerate(queries):
+            if results[i] is None:
+                results[i] = found_by_query[query]
+                self.search_cache.set(keys[i], (self._format_results(results[i]), results[i]))
+        return results
+    
+    def similarity_search_many(
+        self,
+        queries: List[str],
+        k: int = 4,
+        expr: Optional[str] = None,
+        search_params: Optional[Dict[str, int]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """
+        Tìm kiếm tương tự cho nhiều truy vấn cùng lúc.
+        
+        Các truy vấn chưa có trong cache được embedding trong một request và
+        tìm kiếm trong một lần gọi vector store, thay vì mỗi truy vấn một vòng;
+        truy vấn được trả lời chỉ bằng chỉ mục từ khóa không cần embedding.
+        Dùng chung cache và chế độ tìm kiếm mặc định với similarity_search.
+        
+        Args:
+            queries: Danh sách truy vấn
+            k: Số lượng kết quả cho mỗi truy vấn
+            expr: Biểu thức lọc của Milvus (tùy chọn)
+            search_params: Tham số tìm kiếm ghi đè (ef, nprobe)
+            filters: Bộ lọc theo metadata (xem similarity_search)
+            
+        Returns:
+            Với mỗi truy vấn, danh sách tài liệu tìm thấy
+        """
+        combined_expr = self._combine_filters(expr, filters)
+        results, pending, keys = self._plan_many(queries, k, combined_expr, search_params)
+        found = []
+        if pending:
+            plans, vector_queries, vector_k = self._plan_many_search(pending, k, expr, filters)
+            vector_results = []
+            if vector_queries:
+                vector_results = self._search_by_vectors(
+                    self._embed_queries(vector_queries), vector_k, combined_expr, search_params
+                )
+            found = self._fuse_many(plans, vector_results, k)
+        return self._finish_many(queries, results, keys, pending, found)
+    
+    async def asimilarity_search_many(
+        self,
+        queries: List[str],
+        k: int = 4,
+        expr: Optional[str] = None,
+        search_params: Optional[Dict[str, int]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """
+        Phiên bản bất đồng bộ của similarity_search_many.
+        
+        Args:
+            queries: Danh sách truy vấn
+            k: Số lượng kết quả cho mỗi truy vấn
+            expr: Biểu thức lọc của Milvus (tùy chọn)
+            search_params: Tham số tìm kiếm ghi đè (ef, nprobe)
+            filters: Bộ lọc theo metadata (xem similarity_search)
+            
+        Returns:
+            Với mỗi truy vấn, danh sách tài liệu tìm thấy
+        """
+        combined_expr = self._combine_filters(expr, filters)
+        results, pending, keys = self._plan_many(queries, k, combined_expr, search_params)
+        found = []
+        if pending:
+            plans, vector_queries, vector_k = await asyncio.to_thread(
+                self._plan_many_search, pending, k, expr, filters
+            )
+            vector_results = []
+            if vector_queries:
+                embeddings = await self._aembed_queries(vector_queries)
+                vector_results = await asyncio.to_thread(
+                    self._search_by_vectors, embeddings, vector_k, combined_expr, search_params
+                )
+            found = self._fuse_many(plans, vector_results, k)
+        return self._finish_many(queries, results, keys, pending, found)
+    
+    async def aadd_documents(
+        self,
+        documents_dict: Dict[str, List[Document]],
+        **kwargs: Any
+    ) -> Dict[str, int]:
+        """
+        Phiên bản bất đồng bộ của add_documents.
+        
+        Đường ống nạp dữ liệu đã tự chồng lấp embedding và ghi trên luồng
+        riêng, nên ở đây chỉ cần chạy nó ngoài vòng lặp sự kiện.
+        
+        Args:
+            documents_dict: Từ điển với tên file và danh sách các đoạn văn bản
+            **kwargs: Các tham số khác của add_documents
+            
+        Returns:
+            Kết quả giống add_documents
+        """
+        return await asyncio.to_thread(self.add_documents, documents_dict, **kwargs)
+    
+    @staticmethod
+    def _format_results(docs: List[Document]) -> str:
+        """
+        Định dạng kết quả tìm kiếm thành chuỗi cho LLM.
+        
+        Mỗi đoạn chỉ kèm tiêu đề trích dẫn ngắn như pack_context (tên file,
+        trang) thay vì toàn bộ metadata nội bộ (mã băm, khóa chính, vị trí).
         
-        return serialized, retrieved_docs
+        Args:
+            docs: Danh sách các tài liệu tìm thấy
+            
+        Returns:
+            Chuỗi kết quả đã được định dạng
+        """
+        return "\n\n".join(
+            f"{Passage(doc, rank).citation(rank + 1)}\n{doc.page_content}"
+            for rank, doc in enumerate(docs)
+        )
     
     def clear_vector_store(self) -> bool:
         """
@@ -106,25 +1585,22 @@ class EmbeddingManager:
         Returns:
             True nếu xóa thành công
         """
-        # Xóa collection cũ và tạo collection mới
-        Milvus.from_documents(
-            [Document(page_content="Placeholder document", metadata={"source": "placeholder"})],
-            self.embeddings,
-            connection_args={"uri": MILVUS_URI},
-            collection_name=MILVUS_COLLECTION,
-            drop_old=True
-        )
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
         
-        # Xóa document placeholder
-        Milvus.from_documents(
-            [],
-            self.embeddings,
-            connection_args={"uri": MILVUS_URI},
-            collection_name=MILVUS_COLLECTION,
-            drop_old=True
-        )
+        if self.backend == "numpy":
+            self.vector_store.clear()
+            self.manifest.clear()
+            self._bump_corpus_generation()
+            return True
         
-        # Cập nhật vector store
+        # Xóa và tạo lại collection với cùng schema, chỉ mục và phân vùng trực tiếp
+        # qua MilvusClient: không ghi tài liệu mẫu, không gọi API embedding.
+        # Collection chưa tồn tại thì được tạo ở lần ghi đầu tiên với schema theo
+        # metadata thật của tài liệu (source, file_type, upload_time, ...).
+        self.collections.reset(self.collection_name)
         self.vector_store = self._create_vector_store()
+        self.manifest.clear()
+        self._bump_corpus_generation()
         
         return True
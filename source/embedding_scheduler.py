@@ -0,0 +1,378 @@
+# nhập các thư viện cơ bản
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# nhập thư viện langchain
+from langchain_core.embeddings import Embeddings
+
+# nhập các module tùy chỉnh
+from history_manager import TokenCounter
+
+# Độ trễ trung bình vượt quá bội số này của độ trễ nhỏ nhất thì coi là nhà cung cấp đang quá tải
+LATENCY_TOLERANCE = 2.0
+# Thời gian chờ cơ sở và tối đa giữa các lần thử lại (giây)
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Lấy mã HTTP của lỗi từ API (openai.APIStatusError và tương tự)."""
+    return getattr(error, "status_code", None)
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Kiểm tra lỗi có nên thử lại không: 408, 409, 429, lỗi 5xx và lỗi kết nối.
+
+    Args:
+        error: Lỗi khi gọi API
+
+    Returns:
+        True nếu lỗi là tạm thời
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import openai
+        return isinstance(error, openai.APIConnectionError)
+    except ImportError:
+        return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Đọc thời gian chờ nhà cung cấp yêu cầu trong header của phản hồi lỗi.
+
+    Args:
+        error: Lỗi khi gọi API
+
+    Returns:
+        Số giây cần chờ, hoặc None nếu phản hồi không có header
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class RateBudget:
+    """
+    Ngân sách theo phút (token hoặc request) kiểu token bucket.
+
+    Sức chứa bằng lượng của một giây: nhà cung cấp chia giới hạn theo phút
+    thành các khoảng ngắn, nên dồn cả phút vào một lúc vẫn bị lỗi 429.
+    """
+
+    def __init__(self, per_minute: int):
+        """
+        Khởi tạo RateBudget.
+
+        Args:
+            per_minute: Giới hạn mỗi phút
+        """
+        self.rate = per_minute / 60
+        self.capacity = self.rate
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Giữ chỗ một lượng trong ngân sách.
+
+        Args:
+            amount: Lượng cần dùng
+
+        Returns:
+            Số giây cần chờ trước khi dùng
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= amount
+            return max(0.0, -self._available / self.rate)
+
+
+class AdaptiveConcurrency:
+    """
+    Giới hạn số request đồng thời, tự điều chỉnh theo kiểu AIMD.
+
+    Mỗi request thành công tăng giới hạn thêm khoảng một sau mỗi vòng; lỗi 429
+    giảm một nửa, độ trễ tăng cao giảm 10%. Một đợt lỗi đồng thời chỉ làm
+    giảm một lần.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        """
+        Khởi tạo AdaptiveConcurrency.
+
+        Args:
+            initial: Giới hạn ban đầu
+            maximum: Giới hạn lớn nhất
+            minimum: Giới hạn nhỏ nhất
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.inflight = 0
+
+        self._cond = threading.Condition()
+        self._baseline = None
+        self._latency = None
+        self._last_decrease = 0.0
+
+    def acquire(self) -> None:
+        """Chờ đến khi số request đang chạy nhỏ hơn giới hạn."""
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, seconds: Optional[float] = None, rate_limited: bool = False) -> None:
+        """
+        Trả chỗ và điều chỉnh giới hạn theo kết quả request.
+
+        Args:
+            seconds: Độ trễ của request dùng để đo tải (None nếu không dùng)
+            rate_limited: True nếu request bị lỗi 429
+        """
+        with self._cond:
+            self.inflight -= 1
+            if rate_limited:
+                self._decrease(0.5)
+            elif seconds is not None:
+                self._baseline = seconds if self._baseline is None else min(self._baseline, seconds)
+                self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+                if self._latency > LATENCY_TOLERANCE * self._baseline:
+                    self._decrease(0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float) -> None:
+        """Giảm giới hạn, bỏ qua nếu vừa giảm trong khoảng một request."""
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency or 0.0):
+            return
+        self.limit = max(self.minimum, self.limit * factor)
+        self._last_decrease = now
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Lập lịch các request embedding theo giới hạn của nhà cung cấp.
+
+    Các đoạn văn bản được gom thành request theo số token, gửi song song với
+    số request đồng thời tự điều chỉnh theo độ trễ và lỗi 429, và thử lại với
+    thời gian chờ tăng dần có nhiễu ngẫu nhiên. Khi biết giới hạn token/request
+    mỗi phút, các request được giãn đều để không vượt giới hạn.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_request_tokens: int = 8000,
+        max_request_inputs: int = 2048,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 16,
+        tokens_per_minute: int = 0,
+        requests_per_minute: int = 0,
+        max_retries: int = 6,
+        token_counter: Optional[TokenCounter] = None
+    ):
+        """
+        Khởi tạo ScheduledEmbeddings.
+
+        Args:
+            embeddings: Mô hình embedding gốc (nên tắt cơ chế thử lại riêng của client)
+            max_request_tokens: Số token tối đa của một request
+            max_request_inputs: Số đoạn văn bản tối đa của một request
+            initial_concurrency: Số request đồng thời ban đầu
+            max_concurrency: Số request đồng thời tối đa
+            tokens_per_minute: Giới hạn token mỗi phút của nhà cung cấp (0 là không biết)
+            requests_per_minute: Giới hạn request mỗi phút của nhà cung cấp (0 là không biết)
+            max_retries: Số lần thử lại tối đa của một request
+            token_counter: Bộ đếm token
+        """
+        self.embeddings = embeddings
+        self.max_request_tokens = max_request_tokens
+        self.max_request_inputs = max_request_inputs
+        self.max_retries = max_retries
+        self.token_counter = token_counter or TokenCounter()
+
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, max_concurrency)
+        self._token_budget = RateBudget(tokens_per_minute) if tokens_per_minute else None
+        self._request_budget = RateBudget(requests_per_minute) if requests_per_minute else None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+
+        # Sau lỗi 429 mọi request cùng tạm dừng đến thời điểm này
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "tokens": 0, "retries": 0, "rate_limited": 0, "errors": 0}
+        self._started = None
+        self._finished = None
+
+    def _pack(self, texts: List[str]) -> List[Tuple[int, int, int]]:
+        """
+        Gom các đoạn văn bản liên tiếp thành request theo số token.
+
+        Args:
+            texts: Danh sách đoạn văn bản
+
+        Returns:
+            Danh sách (vị trí đầu, vị trí cuối, số token) của từng request
+        """
+        requests = []
+        start, tokens = 0, 0
+        for index, text in enumerate(texts):
+            count = self.token_counter.count_text(text)
+            if index > start and (
+                tokens + count > self.max_request_tokens or index - start >= self.max_request_inputs
+            ):
+                requests.append((start, index, tokens))
+                start, tokens = index, 0
+            tokens += count
+        if start < len(texts):
+            requests.append((start, len(texts), tokens))
+        return requests
+
+    def _wait_for_budget(self, tokens: int) -> None:
+        """Chờ hết thời gian tạm dừng sau lỗi 429 và giữ chỗ trong ngân sách theo phút."""
+        delay = self._resume_at - time.monotonic()
+        if self._token_budget is not None:
+            delay = max(delay, self._token_budget.reserve(tokens))
+        if self._request_budget is not None:
+            delay = max(delay, self._request_budget.reserve(1))
+        if delay > 0:
+            time.sleep(delay)
+
+    def _record(self, **counts: int) -> None:
+        """Cộng dồn số liệu thống kê."""
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+
+    def _send(self, texts: List[str], tokens: int) -> List[List[float]]:
+        """
+        Gửi một request embedding, thử lại khi gặp lỗi tạm thời.
+
+        Args:
+            texts: Các đoạn văn bản của request
+            tokens: Tổng số token của request
+
+        Returns:
+            Danh sách vector theo thứ tự của texts
+        """
+        # Chỉ request gần đầy mới dùng để đo tải: độ trễ của request nhỏ
+        # (truy vấn, phần dư cuối lô) chủ yếu là chi phí cố định
+        measured = tokens * 2 >= self.max_request_tokens
+        attempt = 0
+        while True:
+            # Chờ ngân sách sau khi đã giữ chỗ: request đang đợi chỗ không được vượt
+            # qua thời gian tạm dừng do một lỗi 429 vừa xảy ra trong lúc đợi
+            self.concurrency.acquire()
+            self._wait_for_budget(tokens)
+            start = time.monotonic()
+            with self._lock:
+                self._started = self._started or start
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as error:
+                rate_limited = _status_code(error) == 429
+                self.concurrency.release(rate_limited=rate_limited)
+                if not _is_transient(error) or attempt >= self.max_retries:
+                    self._record(errors=1)
+                    raise
+
+                # Chờ đúng thời gian nhà cung cấp yêu cầu (thêm chút nhiễu để các request
+                # không cùng gửi lại một lúc); nếu không có thì dùng full jitter:
+                # ngẫu nhiên trong [0, min(giới hạn, cơ sở * 2^lần thử)]
+                retry_after = _retry_after(error)
+                if retry_after is not None:
+                    delay = retry_after * random.uniform(1.0, 1.2)
+                else:
+                    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                if rate_limited:
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                self._record(retries=1, rate_limited=int(rate_limited))
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            end = time.monotonic()
+            self.concurrency.release(end - start if measured else None)
+            self._record(requests=1, tokens=tokens)
+            with self._lock:
+                self._finished = end
+            return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Tạo embedding cho danh sách đoạn văn bản.
+
+        Args:
+            texts: Danh sách đoạn văn bản
+
+        Returns:
+            Danh sách vector theo thứ tự của texts
+        """
+        requests = self._pack(texts)
+        if len(requests) <= 1:
+            return self._send(texts, requests[0][2]) if requests else []
+
+        futures = [
+            self._executor.submit(self._send, texts[start:end], tokens)
+            for start, end, tokens in requests
+        ]
+        return [vector for future in futures for vector in future.result()]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Tạo embedding cho một truy vấn.
+
+        Args:
+            text: Truy vấn
+
+        Returns:
+            Vector của truy vấn
+        """
+        return self._send([text], self.token_counter.count_text(text))[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Phiên bản bất đồng bộ của embed_documents (chạy trên luồng khác)."""
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Phiên bản bất đồng bộ của embed_query (chạy trên luồng khác)."""
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê của bộ lập lịch.
+
+        Returns:
+            Từ điển gồm số request, token, lần thử lại, lỗi 429, giới hạn đồng thời
+            hiện tại và thông lượng token mỗi phút
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            elapsed = (self._finished - self._started) if self._finished and self._started else 0.0
+        stats["concurrency_limit"] = int(self.concurrency.limit)
+        stats["inflight"] = self.concurrency.inflight
+        stats["tokens_per_minute"] = round(stats["tokens"] / elapsed * 60) if elapsed > 0 else 0
+        return stats
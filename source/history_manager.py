@@ -0,0 +1,262 @@
+# nhập các thư viện cơ bản
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# nhập thư viện langchain
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# nhập các module tùy chỉnh
+from query_cache import LRUCache
+
+# nhập cấu hình
+from config import (
+    TOKENIZER_ENCODING,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    HISTORY_SUMMARY_CACHE_SIZE
+)
+
+# Số token ước lượng thêm cho mỗi tin nhắn (vai trò, phân tách) theo định dạng chat của OpenAI
+TOKENS_PER_MESSAGE = 4
+
+SUMMARY_PROMPT = """Bạn đang duy trì bản tóm tắt của một cuộc trò chuyện giữa người dùng và trợ lý.
+Hãy cập nhật bản tóm tắt hiện có bằng các tin nhắn mới bên dưới.
+Giữ lại các sự kiện, tên riêng, con số, yêu cầu của người dùng và kết luận đã đưa ra; bỏ qua lời chào và nội dung lặp lại.
+Chỉ trả về bản tóm tắt mới, bằng tiếng Việt, tối đa khoảng {max_tokens} token.
+
+Bản tóm tắt hiện có:
+{summary}
+
+Tin nhắn mới:
+{messages}"""
+
+
+class TokenCounter:
+    """Đếm token bằng tiktoken, ước lượng theo số ký tự nếu không tải được bộ mã hóa."""
+
+    def __init__(self, encoding_name: str = TOKENIZER_ENCODING):
+        """
+        Khởi tạo TokenCounter.
+
+        Args:
+            encoding_name: Tên bộ mã hóa của tiktoken
+        """
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            # Lần đầu tiktoken cần tải bộ mã hóa qua mạng; khi không có mạng thì ước lượng
+            self._encoding = None
+
+    def count_text(self, text: str) -> int:
+        """
+        Đếm số token của một chuỗi.
+
+        Args:
+            text: Chuỗi cần đếm
+
+        Returns:
+            Số token
+        """
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: BaseMessage) -> int:
+        """
+        Đếm số token của một tin nhắn, gồm cả phần định dạng.
+
+        Args:
+            message: Tin nhắn cần đếm
+
+        Returns:
+            Số token
+        """
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        return self.count_text(content) + TOKENS_PER_MESSAGE
+
+    def count_messages(self, messages: List[BaseMessage]) -> int:
+        """
+        Đếm tổng số token của danh sách tin nhắn.
+
+        Args:
+            messages: Danh sách tin nhắn
+
+        Returns:
+            Tổng số token
+        """
+        return sum(self.count_message(message) for message in messages)
+
+
+def _message_key(previous: str, message: BaseMessage) -> str:
+    """Băm nối tiếp: khóa của tiền tố lịch sử kết thúc tại tin nhắn này."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return hashlib.sha256(f"{previous}\0{message.type}\0{content}".encode("utf-8")).hexdigest()
+
+
+class HistoryManager:
+    """
+    Thu gọn lịch sử trò chuyện trong một ngân sách token cố định.
+
+    Các lượt gần nhất được giữ nguyên văn trong ngân sách; các lượt cũ hơn
+    được gộp vào một bản tóm tắt cuốn chiếu. Bản tóm tắt được cache theo mã
+    băm nối tiếp của phần lịch sử mà nó bao phủ, nên mỗi lần chỉ cần tóm tắt
+    thêm các tin nhắn mới bị đẩy ra khỏi cửa sổ, không phải tạo lại từ đầu.
+    Khi phải gộp, cửa sổ nguyên văn được thu về một nửa ngân sách để lần
+    tóm tắt tiếp theo chỉ xảy ra sau vài lượt.
+    """
+
+    def __init__(
+        self,
+        llm,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        summary_max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+        token_counter: Optional[TokenCounter] = None
+    ):
+        """
+        Khởi tạo HistoryManager.
+
+        Args:
+            llm: Mô hình ngôn ngữ dùng để tóm tắt
+            token_budget: Số token tối đa của phần lịch sử giữ nguyên văn
+            summary_max_tokens: Độ dài mong muốn của bản tóm tắt (token)
+            token_counter: Bộ đếm token (mặc định tạo mới)
+        """
+        self.llm = llm
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.token_counter = token_counter or TokenCounter()
+        # Mã băm tiền tố lịch sử -> bản tóm tắt của tiền tố đó
+        self.summary_cache = LRUCache(HISTORY_SUMMARY_CACHE_SIZE)
+        self.summary_calls = 0
+
+    def _plan(self, messages: List[BaseMessage]) -> Tuple[List[str], int, Optional[int]]:
+        """
+        Xác định điểm cắt giữa phần cần tóm tắt và phần giữ nguyên văn.
+
+        Args:
+            messages: Lịch sử trò chuyện đầy đủ
+
+        Returns:
+            Tuple gồm mã băm nối tiếp của từng tiền tố, điểm cắt và vị trí
+            kết thúc của tiền tố dài nhất đã có bản tóm tắt trong cache
+            (None nếu chưa có)
+        """
+        keys = []
+        previous = ""
+        for message in messages:
+            previous = _message_key(previous, message)
+            keys.append(previous)
+
+        # Token tích lũy tính từ cuối lịch sử
+        suffix_tokens = [0] * (len(messages) + 1)
+        for i in range(len(messages) - 1, -1, -1):
+            suffix_tokens[i] = suffix_tokens[i + 1] + self.token_counter.count_message(messages[i])
+
+        if suffix_tokens[0] <= self.token_budget:
+            return keys, 0, None
+
+        # Điểm cắt nhỏ nhất để phần nguyên văn vừa ngân sách
+        needed = next(i for i in range(len(messages) + 1) if suffix_tokens[i] <= self.token_budget)
+
+        # Dùng lại bản tóm tắt đã có nếu nó bao phủ ít nhất tới điểm cắt cần thiết
+        cached_end = None
+        for end in range(len(messages), 0, -1):
+            if self.summary_cache.get(keys[end - 1]) is not None:
+                cached_end = end
+                break
+
+        if cached_end is not None and cached_end >= needed:
+            return keys, cached_end, cached_end
+
+        # Gộp thêm để phần nguyên văn còn khoảng một nửa ngân sách
+        split = next(
+            i for i in range(needed, len(messages) + 1)
+            if suffix_tokens[i] <= self.token_budget // 2
+        )
+        # Không cắt giữa một lượt: phần nguyên văn bắt đầu bằng câu hỏi của người dùng
+        while split < len(messages) and not isinstance(messages[split], HumanMessage):
+            split += 1
+        return keys, split, cached_end
+
+    def _summary_messages(
+        self,
+        summary: Optional[str],
+        new_messages: List[BaseMessage]
+    ) -> List[BaseMessage]:
+        """Tạo prompt cập nhật bản tóm tắt với các tin nhắn mới."""
+        lines = "\n".join(
+            f"{'Người dùng' if message.type == 'human' else 'Trợ lý'}: {message.content}"
+            for message in new_messages
+        )
+        return [HumanMessage(SUMMARY_PROMPT.format(
+            max_tokens=self.summary_max_tokens,
+            summary=summary or "(chưa có)",
+            messages=lines
+        ))]
+
+    def _result(
+        self,
+        summary: Optional[str],
+        recent: List[BaseMessage],
+        summarized: int
+    ) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """Ghép bản tóm tắt với phần nguyên văn và tính số liệu."""
+        history = list(recent)
+        if summary:
+            history.insert(0, SystemMessage(f"Tóm tắt phần trò chuyện trước đó:\n{summary}"))
+        stats = {
+            "history_tokens": self.token_counter.count_messages(history),
+            "summarized_messages": summarized,
+            "verbatim_messages": len(recent)
+        }
+        return history, stats
+
+    def compact(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """
+        Thu gọn lịch sử trò chuyện trong ngân sách token.
+
+        Args:
+            messages: Lịch sử trò chuyện đầy đủ
+
+        Returns:
+            Tuple gồm lịch sử đã thu gọn (bản tóm tắt + các lượt gần nhất)
+            và số liệu: history_tokens, summarized_messages, verbatim_messages
+        """
+        keys, split, cached_end = self._plan(messages)
+        if split == 0:
+            return self._result(None, messages, 0)
+
+        summary = self.summary_cache.get(keys[cached_end - 1]) if cached_end else None
+        if cached_end != split:
+            start = cached_end or 0
+            response = self.llm.invoke(self._summary_messages(summary, messages[start:split]))
+            summary = response.content
+            self.summary_calls += 1
+            self.summary_cache.set(keys[split - 1], summary)
+
+        return self._result(summary, messages[split:], split)
+
+    async def acompact(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """
+        Phiên bản bất đồng bộ của compact.
+
+        Args:
+            messages: Lịch sử trò chuyện đầy đủ
+
+        Returns:
+            Kết quả giống compact
+        """
+        keys, split, cached_end = self._plan(messages)
+        if split == 0:
+            return self._result(None, messages, 0)
+
+        summary = self.summary_cache.get(keys[cached_end - 1]) if cached_end else None
+        if cached_end != split:
+            start = cached_end or 0
+            response = await self.llm.ainvoke(self._summary_messages(summary, messages[start:split]))
+            summary = response.content
+            self.summary_calls += 1
+            self.summary_cache.set(keys[split - 1], summary)
+
+        return self._result(summary, messages[split:], split)
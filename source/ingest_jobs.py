@@ -0,0 +1,584 @@
+# nhập các thư viện cơ bản
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# nhập các module tùy chỉnh
+from document_loader import DocumentLoader
+from embedding_manager import EmbeddingManager
+from uploads import LocalFile
+
+# nhập cấu hình
+from config import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    INGEST_JOB_DIR,
+    INGEST_WORKERS,
+    INGEST_JOB_MAX_ATTEMPTS,
+    INGEST_JOB_LEASE
+)
+
+# Trạng thái của một job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJobStore:
+    """
+    Bảng job nạp tài liệu lưu trong SQLite.
+
+    Mỗi job nạp một file. Sau mỗi lô được ghi vào vector store, mã băm các
+    đoạn của lô được lưu làm checkpoint để lần chạy lại bỏ qua chúng.
+
+    Bảng có thể được nhiều tiến trình dùng chung (Streamlit và server). Job
+    đang chạy ghi tên tiến trình nhận nó và thời hạn nhận (lease); chỉ job đã
+    hết hạn (tiến trình nhận đã dừng) mới được đưa lại hàng đợi.
+    """
+
+    def __init__(self, path: str):
+        """
+        Khởi tạo IngestJobStore.
+
+        Args:
+            path: Đường dẫn file SQLite
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                workspace TEXT NOT NULL DEFAULT '',
+                path TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                chunk_overlap INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                chunks_done INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                run_after REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_chunks (
+                job_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                PRIMARY KEY (job_id, chunk_hash)
+            );
+            """
+        )
+        # Bổ sung các cột mới cho bảng tạo bởi phiên bản trước
+        # (job cũ thuộc collection mặc định, không có tiến trình nhận)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in (
+            ("workspace", "TEXT NOT NULL DEFAULT ''"),
+            ("owner", "TEXT"),
+            ("lease_until", "REAL NOT NULL DEFAULT 0")
+        ):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """Chuyển một dòng của bảng jobs thành từ điển (bỏ đường dẫn file tạm)."""
+        job = dict(row)
+        job.pop("path", None)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(
+        self,
+        source: str,
+        path: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        workspace: str = ""
+    ) -> str:
+        """
+        Thêm một job mới vào hàng đợi.
+
+        Args:
+            source: Tên file
+            path: Đường dẫn bản sao của file trên đĩa
+            chunk_size: Kích thước của mỗi đoạn văn bản
+            chunk_overlap: Độ chồng lập giữa các đoạn
+            workspace: Workspace nhận dữ liệu; rỗng là collection mặc định
+
+        Returns:
+            Mã job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs "
+                "(id, source, workspace, path, chunk_size, chunk_overlap, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, source, workspace, path, chunk_size, chunk_overlap, QUEUED, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self, owner: str, lease: float) -> Optional[Dict[str, Any]]:
+        """
+        Nhận job đang chờ lâu nhất để xử lý.
+
+        Các job của cùng một file trong cùng workspace được xử lý lần lượt: bỏ
+        qua file đang có job chạy. Job đang chờ thử lại chỉ được nhận sau thời
+        điểm run_after. Việc chọn và cập nhật job nằm trong một giao dịch giữ
+        khóa ghi của SQLite nên hai tiến trình không nhận cùng một job.
+
+        Args:
+            owner: Định danh của tiến trình nhận job
+            lease: Thời hạn nhận (giây), cần được gia hạn bằng renew
+
+        Returns:
+            Thông tin job (gồm cả đường dẫn file), hoặc None nếu không có job
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._expire_leases(now)
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND run_after <= ? AND (workspace, source) NOT IN "
+                    "(SELECT workspace, source FROM jobs WHERE status = ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, now, RUNNING)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1, "
+                        "error = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                        (RUNNING, owner, now + lease, now, row["id"], QUEUED)
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+        if row is None:
+            return None
+        return {
+            **dict(row),
+            "status": RUNNING,
+            "owner": owner,
+            "lease_until": now + lease,
+            "attempts": row["attempts"] + 1
+        }
+
+    def renew(self, owner: str, lease: float) -> int:
+        """
+        Gia hạn các job đang chạy của một tiến trình.
+
+        Args:
+            owner: Định danh của tiến trình
+            lease: Thời hạn mới tính từ bây giờ (giây)
+
+        Returns:
+            Số job được gia hạn
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                (time.time() + lease, owner, RUNNING)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def release(self, job_id: str) -> None:
+        """
+        Trả một job đang chạy dở về hàng đợi khi tiến trình dừng có kiểm soát.
+
+        Lần chạy bị gián đoạn không tính vào số lần thử; checkpoint được giữ lại.
+
+        Args:
+            job_id: Mã job
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = 0, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, RUNNING)
+            )
+            self._conn.commit()
+
+    def _expire_leases(self, now: float) -> int:
+        """Đưa các job đang chạy đã hết hạn nhận trở lại hàng đợi (gọi khi đã giữ khóa)."""
+        return self._conn.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND lease_until < ?",
+            (QUEUED, now, RUNNING, now)
+        ).rowcount
+
+    def checkpoint(self, job_id: str, chunk_hashes: Iterable[str]) -> int:
+        """
+        Ghi nhận một lô đã được ghi vào vector store.
+
+        Args:
+            job_id: Mã job
+            chunk_hashes: Mã băm các đoạn của lô
+
+        Returns:
+            Tổng số đoạn đã ghi của job
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_chunks (job_id, chunk_hash) VALUES (?, ?)",
+                [(job_id, chunk_hash) for chunk_hash in chunk_hashes if chunk_hash]
+            )
+            chunks_done = self._conn.execute(
+                "SELECT COUNT(*) FROM job_chunks WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "UPDATE jobs SET chunks_done = ?, updated_at = ? WHERE id = ?",
+                (chunks_done, time.time(), job_id)
+            )
+            self._conn.commit()
+            return chunks_done
+
+    def committed_hashes(self, job_id: str) -> Set[str]:
+        """
+        Lấy mã băm các đoạn đã ghi của job (từ các lần chạy trước).
+
+        Args:
+            job_id: Mã job
+
+        Returns:
+            Tập mã băm
+        """
+        with self._lock:
+            return {
+                chunk_hash for (chunk_hash,) in self._conn.execute(
+                    "SELECT chunk_hash FROM job_chunks WHERE job_id = ?", (job_id,)
+                )
+            }
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        """
+        Đánh dấu job hoàn tất và xóa checkpoint.
+
+        Args:
+            job_id: Mã job
+            result: Kết quả nạp của add_documents_stream
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def fail(self, job_id: str, error: str, retry_delay: Optional[float] = None) -> None:
+        """
+        Ghi nhận lỗi của job.
+
+        Args:
+            job_id: Mã job
+            error: Thông báo lỗi
+            retry_delay: Nếu có, đưa job trở lại hàng đợi (giữ checkpoint) để
+                chạy lại sau số giây này; None để đánh dấu job thất bại
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                (
+                    FAILED if retry_delay is None else QUEUED,
+                    error,
+                    now + (retry_delay or 0),
+                    now,
+                    job_id
+                )
+            )
+            self._conn.commit()
+
+    def requeue(self, job_id: Optional[str] = None) -> int:
+        """
+        Đưa job trở lại hàng đợi.
+
+        Args:
+            job_id: Mã job thất bại cần chạy lại; None để đưa các job "running"
+                đã hết hạn nhận (tiến trình nhận đã dừng) trở lại hàng đợi
+
+        Returns:
+            Số job được đưa lại hàng đợi
+        """
+        with self._lock:
+            if job_id is None:
+                count = self._expire_leases(time.time())
+                self._conn.commit()
+                return count
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, updated_at = ? WHERE id = ? AND status = ?",
+                    (QUEUED, time.time(), job_id, FAILED)
+                )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy trạng thái của một job.
+
+        Args:
+            job_id: Mã job
+
+        Returns:
+            Thông tin job, hoặc None nếu không có
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Lấy các job gần nhất.
+
+        Args:
+            limit: Số job tối đa
+
+        Returns:
+            Danh sách job, mới nhất trước
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+class IngestJobQueue:
+    """
+    Hàng đợi nạp tài liệu chạy nền.
+
+    File tải lên được lưu ra đĩa cùng một job trong IngestJobStore, nên việc
+    nạp không phụ thuộc vào phiên trình duyệt. Các luồng xử lý nhận job, phân
+    tích file trên một tiến trình con (có giới hạn thời gian), nạp các đoạn
+    theo từng lô và ghi checkpoint sau mỗi lô; job bị lỗi được thử
+    lại từ checkpoint, job bị gián đoạn khi tiến trình dừng được chạy tiếp
+    khi hết hạn nhận. Một luồng nền gia hạn các job đang chạy của tiến trình.
+    Số lời gọi embedding/ghi đồng thời do EmbeddingManager giới hạn chung cho
+    mọi luồng.
+    """
+
+    def __init__(
+        self,
+        embedding_manager: EmbeddingManager,
+        job_dir: str = INGEST_JOB_DIR,
+        workers: int = INGEST_WORKERS,
+        max_attempts: int = INGEST_JOB_MAX_ATTEMPTS,
+        lease: float = INGEST_JOB_LEASE
+    ):
+        """
+        Khởi tạo IngestJobQueue.
+
+        Args:
+            embedding_manager: Đối tượng EmbeddingManager để nạp dữ liệu
+            job_dir: Thư mục chứa bảng job và các file chờ nạp
+            workers: Số luồng xử lý
+            max_attempts: Số lần chạy tối đa của một job trước khi báo lỗi
+            lease: Thời hạn nhận job (giây); job của tiến trình đã dừng được
+                chạy lại sau khoảng thời gian này
+        """
+        self.embedding_manager = embedding_manager
+        self.job_dir = job_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.store = IngestJobStore(os.path.join(job_dir, "jobs.sqlite"))
+
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "IngestJobQueue":
+        """
+        Khởi động các luồng xử lý (gọi nhiều lần không có tác dụng thêm).
+
+        Returns:
+            Chính đối tượng này
+        """
+        if self._threads:
+            return self
+
+        resumed = self.store.requeue()
+        if resumed:
+            logger.info("Tiếp tục %d job nạp bị gián đoạn", resumed)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(
+            threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True)
+        )
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Dừng các luồng xử lý sau khi xong lô hiện tại của chúng.
+
+        Job đang chạy dở được trả về hàng đợi và tiếp tục từ checkpoint.
+
+        Args:
+            timeout: Thời gian chờ mỗi luồng dừng (giây)
+        """
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(
+        self,
+        uploaded_file,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        workspace: str = ""
+    ) -> str:
+        """
+        Lưu file ra đĩa và thêm job nạp file vào hàng đợi.
+
+        Args:
+            uploaded_file: File tải lên (có name và getbuffer())
+            chunk_size: Kích thước của mỗi đoạn văn bản
+            chunk_overlap: Độ chồng lập giữa các đoạn
+            workspace: Workspace nhận dữ liệu (EmbeddingManager.for_tenant);
+                rỗng là collection mặc định
+
+        Returns:
+            Mã job
+        """
+        # Mỗi file nằm trong một thư mục riêng để giữ nguyên tên file gốc
+        spool_dir = os.path.join(self.job_dir, "files", uuid.uuid4().hex)
+        os.makedirs(spool_dir, exist_ok=True)
+        path = os.path.join(spool_dir, os.path.basename(uploaded_file.name))
+        with open(path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+
+        job_id = self.store.create(uploaded_file.name, path, chunk_size, chunk_overlap, workspace)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def retry(self, job_id: str) -> bool:
+        """
+        Chạy lại một job thất bại từ checkpoint của nó.
+
+        Args:
+            job_id: Mã job
+
+        Returns:
+            True nếu job được đưa lại hàng đợi
+        """
+        requeued = self.store.requeue(job_id) > 0
+        if requeued:
+            with self._wakeup:
+                self._wakeup.notify()
+        return requeued
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy trạng thái của một job."""
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Lấy trạng thái các job gần nhất, mới nhất trước."""
+        return self.store.list(limit)
+
+    def _work(self) -> None:
+        """Vòng lặp của một luồng xử lý: nhận job và chạy cho đến khi dừng."""
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                job = self.store.claim(self.owner, self.lease)
+                if job is None:
+                    # Chờ job mới (hoặc job khác của cùng file chạy xong)
+                    self._wakeup.wait(timeout=1.0)
+                    continue
+            self._run(job)
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _heartbeat(self) -> None:
+        """Gia hạn định kỳ các job đang chạy của tiến trình cho đến khi dừng."""
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                self._wakeup.wait(timeout=self.lease / 3)
+                if self._stopping:
+                    return
+            try:
+                self.store.renew(self.owner, self.lease)
+            except sqlite3.Error as e:
+                logger.warning("Không gia hạn được job nạp: %s", e)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        """
+        Nạp file của một job, ghi checkpoint sau mỗi lô.
+
+        Args:
+            job: Thông tin job từ IngestJobStore.claim
+        """
+        job_id = job["id"]
+        try:
+            committed = self.store.committed_hashes(job_id)
+            # Phân tích file trên tiến trình con dùng lại được: không giữ GIL của các
+            # luồng xử lý khác, file treo bị dừng sau LOADER_FILE_TIMEOUT giây và các
+            # đoạn được gửi về theo từng trang nên bộ nhớ không phụ thuộc cỡ file
+            documents = DocumentLoader.stream_documents(
+                [LocalFile(job["path"])],
+                chunk_size=job["chunk_size"],
+                chunk_overlap=job["chunk_overlap"]
+            )
+            result = {}
+            embedding_manager = self.embedding_manager.for_tenant(job["workspace"])
+            # Checkpoint dựa trên mã băm đoạn nên job luôn chạy ở chế độ incremental
+            for event in embedding_manager.add_documents_stream(
+                documents,
+                incremental=True,
+                resume={job["source"]: committed} if committed else None,
+                sources=[job["source"]]
+            ):
+                if event["event"] == "progress":
+                    self.store.checkpoint(job_id, event["chunk_hashes"])
+                    if self._stopping:
+                        # Dừng giữa chừng; job chạy tiếp từ checkpoint ở lần khởi động sau
+                        self.store.release(job_id)
+                        return
+                else:
+                    result = event["results"]
+        except Exception as e:
+            logger.warning("Job nạp %s (%s) lỗi lần %d: %s", job_id, job["source"], job["attempts"], e)
+            # Thử lại với thời gian chờ tăng dần (2, 4, 8, ... giây)
+            retry_delay = 2.0 ** job["attempts"] if job["attempts"] < self.max_attempts else None
+            self.store.fail(job_id, str(e), retry_delay)
+            return
+
+        self.store.finish(job_id, result)
+        shutil.rmtree(os.path.dirname(job["path"]), ignore_errors=True)
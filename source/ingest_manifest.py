@@ -0,0 +1,196 @@
+# nhập các thư viện cơ bản
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set, Tuple
+
+
+class IngestManifest:
+    """
+    Sổ ghi các file đã nạp vào một collection.
+
+    Với mỗi file, lưu mã băm nội dung file và mã băm của từng đoạn văn bản
+    đã ghi vào vector store, để lần nạp sau chỉ xử lý phần đã thay đổi.
+    """
+
+    def __init__(self, path: str, namespace: str):
+        """
+        Khởi tạo IngestManifest.
+
+        Args:
+            path: Đường dẫn file SQLite lưu manifest
+            namespace: Định danh collection (ví dụ "uri::collection")
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                namespace TEXT NOT NULL,
+                source TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, source)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                namespace TEXT NOT NULL,
+                source TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                PRIMARY KEY (namespace, source, chunk_hash)
+            );
+            CREATE TABLE IF NOT EXISTS versions (
+                namespace TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_file(self, source: str) -> Optional[Tuple[str, Set[str]]]:
+        """
+        Lấy thông tin đã ghi của một file.
+
+        Args:
+            source: Tên file
+
+        Returns:
+            Tuple gồm mã băm file và tập mã băm các đoạn văn bản,
+            hoặc None nếu file chưa từng được nạp
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM files WHERE namespace = ? AND source = ?",
+                (self.namespace, source)
+            ).fetchone()
+            if row is None:
+                return None
+
+            chunk_hashes = {
+                chunk_hash for (chunk_hash,) in self._conn.execute(
+                    "SELECT chunk_hash FROM chunks WHERE namespace = ? AND source = ?",
+                    (self.namespace, source)
+                )
+            }
+            return row[0], chunk_hashes
+
+    def get_file_hash(self, source: str) -> Optional[str]:
+        """
+        Lấy mã băm nội dung đã ghi của một file.
+
+        Args:
+            source: Tên file
+
+        Returns:
+            Mã băm file, hoặc None nếu file chưa từng được nạp
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM files WHERE namespace = ? AND source = ?",
+                (self.namespace, source)
+            ).fetchone()
+            return row[0] if row else None
+
+    def list_sources(self) -> List[str]:
+        """
+        Lấy danh sách các file đã nạp.
+
+        Returns:
+            Tên các file, sắp xếp theo thứ tự chữ cái
+        """
+        with self._lock:
+            return [
+                source for (source,) in self._conn.execute(
+                    "SELECT source FROM files WHERE namespace = ? ORDER BY source",
+                    (self.namespace,)
+                )
+            ]
+
+    def replace_file(self, source: str, file_hash: str, chunk_hashes: Iterable[str]) -> None:
+        """
+        Ghi đè thông tin của một file sau khi nạp xong.
+
+        Args:
+            source: Tên file
+            file_hash: Mã băm nội dung file
+            chunk_hashes: Mã băm các đoạn văn bản hiện có của file
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE namespace = ? AND source = ?",
+                (self.namespace, source)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (namespace, source, chunk_hash) VALUES (?, ?, ?)",
+                [(self.namespace, source, chunk_hash) for chunk_hash in chunk_hashes]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (namespace, source, file_hash, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, source, file_hash, time.time())
+            )
+            self._conn.commit()
+
+    def remove_file(self, source: str) -> None:
+        """
+        Xóa thông tin của một file không còn dữ liệu trong collection.
+
+        Args:
+            source: Tên file
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE namespace = ? AND source = ?",
+                (self.namespace, source)
+            )
+            self._conn.execute(
+                "DELETE FROM files WHERE namespace = ? AND source = ?",
+                (self.namespace, source)
+            )
+            self._conn.commit()
+
+    def get_version(self) -> int:
+        """
+        Lấy phiên bản dữ liệu hiện tại của collection.
+
+        Returns:
+            Số phiên bản, 0 nếu dữ liệu chưa từng thay đổi
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM versions WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def bump_version(self) -> int:
+        """
+        Tăng phiên bản dữ liệu sau khi collection thay đổi.
+
+        Phiên bản được lưu cùng manifest nên vẫn giữ sau khi khởi động lại,
+        dùng để làm mất hiệu lực các cache lưu trên đĩa.
+
+        Returns:
+            Số phiên bản mới
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO versions (namespace, version) VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+                (self.namespace,)
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT version FROM versions WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def clear(self) -> None:
+        """Xóa toàn bộ manifest của collection."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (self.namespace,))
+            self._conn.execute("DELETE FROM files WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
@@ -0,0 +1,76 @@
+# nhập các thư viện cơ bản
+import logging
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class Lazy(Generic[T]):
+    """
+    Giá trị được tạo ở lần truy cập đầu tiên.
+
+    Dùng cho các đối tượng tốn thời gian khởi tạo (client mạng, thư viện nặng)
+    để việc khởi động ứng dụng không phải chờ chúng. Việc tạo được khóa nên
+    nhiều luồng truy cập cùng lúc chỉ tạo một lần.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        """
+        Khởi tạo Lazy.
+
+        Args:
+            factory: Hàm tạo giá trị
+        """
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Trả về giá trị, tạo mới nếu chưa có."""
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._value = self._factory()
+                    self._ready = True
+        return self._value
+
+    def set(self, value: T) -> None:
+        """Thay giá trị hiện tại (ví dụ khi tạo lại kết nối)."""
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+    @property
+    def ready(self) -> bool:
+        """True nếu giá trị đã được tạo."""
+        return self._ready
+
+
+def warm_up_in_background(name: str, *steps: Callable[[], object]) -> threading.Thread:
+    """
+    Chạy các bước khởi tạo trên một luồng nền.
+
+    Lỗi chỉ được ghi log: bước bị lỗi sẽ được chạy lại (và báo lỗi) ở lần
+    dùng thật đầu tiên.
+
+    Args:
+        name: Tên luồng
+        *steps: Các hàm khởi tạo, chạy lần lượt
+
+    Returns:
+        Luồng daemon đã được khởi động
+    """
+    def run():
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                logger.warning("Khởi động nền %s thất bại: %s", name, e)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
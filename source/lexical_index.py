@@ -0,0 +1,451 @@
+# nhập các thư viện cơ bản
+import os
+import re
+import json
+import math
+import zlib
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+# nhập các module tùy chỉnh
+from embedding_cache import text_hash
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Mức nén zlib của dữ liệu lưu trên đĩa (nén nhanh, dung lượng gần như mức mặc định)
+COMPRESS_LEVEL = 1
+
+# Từ gồm chữ/số; mã định danh như "HĐ-2024/015" là chuỗi từ nối bởi - _ / .
+_WORD_RE = re.compile(r"[^\W_]+")
+_RUN_RE = re.compile(r"[^\W_]+(?:[-_/.][^\W_]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách văn bản thành các từ khóa (chữ thường).
+
+    Mã định danh nối bởi - _ / . cho ra cả từng phần lẫn nguyên mã, để truy
+    vấn theo đúng mã khớp chính xác mà truy vấn theo một phần vẫn tìm được.
+
+    Args:
+        text: Văn bản
+
+    Returns:
+        Danh sách từ khóa (có lặp lại)
+    """
+    # Một lượt quét lấy cả từ đơn lẫn mã; chỉ tách lại các mã (ít gặp)
+    runs = _RUN_RE.findall(text.lower())
+    tokens = [run for run in runs if run.isalnum()]
+    if len(tokens) < len(runs):
+        for run in runs:
+            if not run.isalnum():
+                tokens += _WORD_RE.findall(run)
+                tokens.append(run)
+    return tokens
+
+
+def chunk_key(doc: Document) -> Tuple[str, str]:
+    """
+    Khóa định danh một đoạn văn bản: (tên file, mã băm đoạn).
+
+    Dùng mã băm giống _select_changed_chunks của EmbeddingManager, nên cùng
+    một đoạn có cùng khóa dù đến từ vector store hay chỉ mục từ khóa.
+    """
+    source = doc.metadata.get("source", "")
+    return source, doc.metadata.get("chunk_hash") or text_hash(f"{source}\0{doc.page_content}")
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Hợp nhất nhiều danh sách kết quả theo thứ hạng (Reciprocal Rank Fusion).
+
+    Mỗi đoạn được cộng 1 / (rrf_k + hạng) từ mỗi danh sách chứa nó; chỉ dùng
+    thứ hạng nên không cần chuẩn hóa điểm BM25 và điểm tương tự vector.
+
+    Args:
+        rankings: Các danh sách tài liệu, mỗi danh sách theo thứ tự liên quan giảm dần
+        k: Số kết quả trả về
+        rrf_k: Hằng số làm mượt của RRF
+
+    Returns:
+        k tài liệu có điểm hợp nhất cao nhất (bằng điểm thì giữ thứ tự danh sách đầu)
+    """
+    scores: Dict[Tuple[str, str], float] = {}
+    docs: Dict[Tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    order = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in order[:k]]
+
+
+class LexicalIndex:
+    """
+    Chỉ mục từ khóa BM25 chạy trong tiến trình, dựng dần theo từng lô được nạp.
+
+    Trên đĩa (SQLite), mỗi đoạn văn bản là một dòng gồm tần suất từ khóa và
+    nội dung đã nén zlib. Trong bộ nhớ chỉ giữ danh sách posting (mảng số
+    nguyên cho mỗi từ khóa) và độ dài từng đoạn; văn bản chỉ được đọc cho
+    các kết quả trả về. Đoạn bị xóa chỉ được đánh dấu trong bộ nhớ và bị
+    loại khỏi posting ở lần mở chỉ mục sau. Thay đổi của tiến trình khác
+    được nạp khi gọi refresh.
+    """
+
+    def __init__(self, path: str):
+        """
+        Khởi tạo LexicalIndex và nạp posting từ đĩa.
+
+        Args:
+            path: Đường dẫn file SQLite lưu chỉ mục
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                file_type TEXT,
+                upload_time TEXT,
+                terms BLOB NOT NULL,
+                document BLOB NOT NULL,
+                UNIQUE (source, chunk_hash)
+            );
+            """
+        )
+        self._conn.commit()
+        self._load()
+
+    def _reset_memory(self) -> None:
+        """Xóa toàn bộ cấu trúc trong bộ nhớ."""
+        # Vị trí trong bộ nhớ -> id, độ dài, còn sống, source, file_type, upload_time
+        self._ids = array("q")
+        self._lengths = array("i")
+        self._alive = bytearray()
+        self._sources: List[str] = []
+        self._file_types: List[Optional[str]] = []
+        self._upload_times: List[Optional[str]] = []
+        # (source, chunk_hash) -> vị trí, cho việc xóa và bỏ qua đoạn đã có
+        self._positions: Dict[Tuple[str, str], int] = {}
+        # Từ khóa -> (vị trí các đoạn, tần suất trong đoạn); df chỉ đếm đoạn còn sống
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._df: Counter = Counter()
+        self._total_length = 0
+        self._count = 0
+
+    def _append(
+        self,
+        row_id: int,
+        source: str,
+        chunk_hash: str,
+        file_type: Optional[str],
+        upload_time: Optional[str],
+        terms: Dict[str, int]
+    ) -> None:
+        """Thêm một đoạn vào cấu trúc trong bộ nhớ (gọi khi giữ khóa)."""
+        position = len(self._ids)
+        length = sum(terms.values())
+        self._ids.append(row_id)
+        self._lengths.append(length)
+        self._alive.append(1)
+        self._sources.append(source)
+        self._file_types.append(file_type)
+        self._upload_times.append(upload_time)
+        self._positions[(source, chunk_hash)] = position
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("i"))
+            postings[0].append(position)
+            postings[1].append(tf)
+        self._df.update(terms.keys())
+        self._total_length += length
+        self._count += 1
+
+    def _load(self) -> None:
+        """Dựng posting trong bộ nhớ từ tần suất từ khóa đã lưu."""
+        with self._lock:
+            self._reset_memory()
+            self._data_version = self._read_data_version()
+            self._load_rows(0)
+
+    def _read_data_version(self) -> int:
+        """Số phiên bản dữ liệu của SQLite, đổi khi một kết nối khác ghi vào file."""
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load_rows(self, after_id: int) -> None:
+        """Thêm vào bộ nhớ các dòng có id lớn hơn after_id (gọi khi giữ khóa)."""
+        rows = self._conn.execute(
+            "SELECT id, source, chunk_hash, file_type, upload_time, terms FROM chunks "
+            "WHERE id > ? ORDER BY id",
+            (after_id,)
+        )
+        for row_id, source, chunk_hash, file_type, upload_time, terms in rows:
+            self._append(
+                row_id, source, chunk_hash, file_type, upload_time,
+                json.loads(zlib.decompress(terms))
+            )
+
+    def refresh(self) -> bool:
+        """
+        Nạp các thay đổi do tiến trình khác ghi vào chỉ mục (server, bulk_ingest).
+
+        Chỉ các dòng mới được thêm vào posting; nếu số đoạn không khớp sau đó
+        (tiến trình khác đã xóa đoạn) thì dựng lại toàn bộ từ đĩa.
+
+        Returns:
+            True nếu file đã bị tiến trình khác thay đổi
+        """
+        with self._lock:
+            version = self._read_data_version()
+            if version == self._data_version:
+                return False
+            self._data_version = version
+            self._load_rows(self._ids[-1] if self._ids else 0)
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            if count != self._count:
+                self._reset_memory()
+                self._load_rows(0)
+            return True
+
+    def __len__(self) -> int:
+        """Trả về số đoạn văn bản trong chỉ mục."""
+        return self._count
+
+    def add(self, documents: Iterable[Document]) -> int:
+        """
+        Thêm các đoạn văn bản vào chỉ mục; đoạn đã có (cùng file, cùng mã băm) được bỏ qua.
+
+        Args:
+            documents: Các đoạn văn bản, có metadata "source"
+
+        Returns:
+            Số đoạn được thêm mới
+        """
+        rows = []
+        for doc in documents:
+            source, chunk_hash = chunk_key(doc)
+            terms = Counter(tokenize(doc.page_content))
+            rows.append((
+                source,
+                chunk_hash,
+                doc.metadata.get("file_type"),
+                doc.metadata.get("upload_time"),
+                terms,
+                zlib.compress(json.dumps(terms, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL),
+                zlib.compress(json.dumps(
+                    {"text": doc.page_content, "metadata": doc.metadata},
+                    ensure_ascii=False,
+                    default=str
+                ).encode("utf-8"), COMPRESS_LEVEL)
+            ))
+
+        added = 0
+        with self._lock:
+            for source, chunk_hash, file_type, upload_time, terms, terms_blob, document in rows:
+                if (source, chunk_hash) in self._positions:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks "
+                    "(source, chunk_hash, file_type, upload_time, terms, document) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, chunk_hash, file_type, upload_time, terms_blob, document)
+                )
+                if cursor.rowcount:
+                    self._append(cursor.lastrowid, source, chunk_hash, file_type, upload_time, terms)
+                    added += 1
+            self._conn.commit()
+        return added
+
+    def delete(self, source: str, chunk_hashes: Optional[Iterable[str]] = None) -> int:
+        """
+        Xóa các đoạn văn bản của một file.
+
+        Args:
+            source: Tên file
+            chunk_hashes: Nếu có, chỉ xóa các đoạn có mã băm thuộc danh sách này
+
+        Returns:
+            Số đoạn đã xóa
+        """
+        with self._lock:
+            if chunk_hashes is None:
+                keys = [key for key in self._positions if key[0] == source]
+            else:
+                keys = [(source, h) for h in chunk_hashes if (source, h) in self._positions]
+            if not keys:
+                return 0
+
+            for key in keys:
+                position = self._positions.pop(key)
+                row_id = self._ids[position]
+                (terms,) = self._conn.execute(
+                    "SELECT terms FROM chunks WHERE id = ?", (row_id,)
+                ).fetchone()
+                self._df.subtract(json.loads(zlib.decompress(terms)).keys())
+                self._conn.execute("DELETE FROM chunks WHERE id = ?", (row_id,))
+                self._alive[position] = 0
+                self._total_length -= self._lengths[position]
+                self._count -= 1
+            self._conn.commit()
+            return len(keys)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ chỉ mục."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._reset_memory()
+
+    def document_frequency(self, term: str) -> int:
+        """Số đoạn văn bản (còn sống) chứa từ khóa."""
+        return self._df.get(term, 0)
+
+    def is_keyword_query(self, query: str, max_terms: int = 8) -> bool:
+        """
+        Nhận diện truy vấn tra cứu theo từ khóa: ngắn và có mã/số hiệu có trong chỉ mục.
+
+        Ví dụ "hợp đồng HĐ-2024/015" hay "mã sản phẩm SP1234"; với các truy vấn
+        này tìm theo từ khóa chính xác hơn embedding và không cần gọi API.
+
+        Args:
+            query: Truy vấn
+            max_terms: Số từ tối đa của truy vấn
+
+        Returns:
+            True nếu nên trả lời chỉ bằng chỉ mục từ khóa
+        """
+        terms = tokenize(query)
+        words = [term for term in terms if term.isalnum()]
+        if not words or len(words) > max_terms:
+            return False
+        return any(
+            (not term.isalnum() or any(c.isdigit() for c in term)) and self.document_frequency(term)
+            for term in terms
+        )
+
+    def _matches(self, position: int, filters: Dict[str, Any]) -> bool:
+        """Kiểm tra một đoạn có thỏa bộ lọc metadata (cùng ý nghĩa với build_filter_expr)."""
+        source = filters.get("source")
+        if source:
+            sources = [source] if isinstance(source, str) else source
+            if self._sources[position] not in sources:
+                return False
+
+        file_type = filters.get("file_type")
+        if file_type:
+            file_types = [file_type] if isinstance(file_type, str) else file_type
+            if self._file_types[position] not in {f".{t.lower().lstrip('.')}" for t in file_types}:
+                return False
+
+        upload_time = self._upload_times[position] or ""
+        after = filters.get("uploaded_after")
+        if after and upload_time < after:
+            return False
+        before = filters.get("uploaded_before")
+        if before:
+            before = before if len(before) > 10 else f"{before} 23:59:59"
+            if upload_time > before:
+                return False
+        return True
+
+    def _score(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tính điểm BM25 của các đoạn chứa ít nhất một từ khóa (gọi khi giữ khóa).
+
+        Các view numpy lên mảng posting chỉ tồn tại trong hàm này, nên mảng
+        không bị thay đổi kích thước (thêm đoạn) trong lúc đang được đọc.
+
+        Returns:
+            Tuple gồm vị trí các đoạn ứng viên còn sống và điểm tương ứng
+        """
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        average_length = self._total_length / self._count
+        for term in set(terms):
+            df = self._df.get(term, 0)
+            if not df:
+                continue
+            positions_buf, tfs_buf = self._postings[term]
+            positions = np.frombuffer(positions_buf, dtype=np.int32)
+            tfs = np.frombuffer(tfs_buf, dtype=np.int32).astype(np.float32)
+            idf = math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[positions] / average_length)
+            scores[positions] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        candidates = np.flatnonzero((scores > 0) & (alive == 1))
+        return candidates, scores[candidates]
+
+    def search(self, query: str, k: int = 4, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Tìm các đoạn văn bản khớp từ khóa của truy vấn theo điểm BM25.
+
+        Args:
+            query: Truy vấn
+            k: Số kết quả trả về
+            filters: Bộ lọc theo metadata, là các tham số của build_filter_expr
+                (source, file_type, uploaded_after, uploaded_before)
+
+        Returns:
+            Danh sách tài liệu theo điểm giảm dần
+        """
+        terms = tokenize(query)
+        with self._lock:
+            if not terms or not self._count:
+                return []
+            candidates, scores = self._score(terms)
+            if filters:
+                keep = np.array([self._matches(int(p), filters) for p in candidates], dtype=bool)
+                candidates, scores = candidates[keep], scores[keep]
+            if len(candidates) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                candidates, scores = candidates[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            row_ids = [self._ids[int(p)] for p in candidates[order]]
+            if not row_ids:
+                return []
+
+            placeholders = ", ".join("?" * len(row_ids))
+            documents = dict(self._conn.execute(
+                f"SELECT id, document FROM chunks WHERE id IN ({placeholders})", row_ids
+            ))
+
+        results = []
+        for row_id in row_ids:
+            record = json.loads(zlib.decompress(documents[row_id]))
+            results.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê của chỉ mục.
+
+        Returns:
+            Từ điển gồm số đoạn, số từ khóa và dung lượng file trên đĩa (byte)
+        """
+        return {
+            "chunks": self._count,
+            "terms": sum(1 for df in self._df.values() if df > 0),
+            "disk_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
@@ -0,0 +1,321 @@
+# nhập các thư viện cơ bản
+import json
+import time
+import uuid
+import base64
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện web
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Tính phân vị q (0-100) của một danh sách giá trị.
+
+    Args:
+        values: Danh sách giá trị
+        q: Phân vị cần tính
+
+    Returns:
+        Giá trị phân vị, 0 nếu danh sách rỗng
+    """
+    if not values:
+        return 0.0
+    return float(np.percentile(values, q))
+
+
+def fake_embedding(value: Any, dim: int) -> np.ndarray:
+    """
+    Tạo vector embedding giả lập, xác định theo nội dung đầu vào.
+
+    Args:
+        value: Văn bản hoặc danh sách token
+        dim: Số chiều vector
+
+    Returns:
+        Vector float32 đã chuẩn hóa
+    """
+    seed = int.from_bytes(hashlib.sha256(str(value).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StubRateLimit:
+    """
+    Giới hạn theo phút của server giả lập, chia theo từng giây như nhà cung cấp thật.
+
+    Request vượt giới hạn bị từ chối ngay (không chờ).
+    """
+
+    def __init__(self, per_minute: int):
+        """
+        Khởi tạo StubRateLimit.
+
+        Args:
+            per_minute: Giới hạn mỗi phút
+        """
+        self.rate = per_minute / 60
+        self.capacity = self.rate
+        self._available = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Tính thời gian cần chờ để đủ ngân sách cho một request.
+
+        Args:
+            amount: Lượng request cần dùng
+
+        Returns:
+            Số giây cần chờ, 0 nếu có thể phục vụ ngay
+        """
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+        return max(0.0, (min(amount, self.capacity) - self._available) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Trừ lượng đã dùng khỏi ngân sách."""
+        self._available -= amount
+
+
+def create_stub_app(
+    latency: float = 0.1,
+    dim: int = 1536,
+    tokens_per_minute: int = 0,
+    requests_per_minute: int = 0,
+    token_latency: float = 0.0
+) -> Starlette:
+    """
+    Tạo server giả lập API embedding và chat completions tương thích OpenAI.
+
+    Mô hình chat giả lập luôn gọi công cụ retrieve một lần với câu hỏi của
+    người dùng, sau đó trả lời bằng một câu cố định, giống luồng thật của agent.
+    Khi đặt giới hạn token/request mỗi phút, API embedding trả lỗi 429 kèm
+    header retry-after-ms giống OpenAI khi bị vượt giới hạn.
+
+    Args:
+        latency: Độ trễ giả lập của mỗi request (giây)
+        dim: Số chiều vector embedding
+        tokens_per_minute: Giới hạn token embedding mỗi phút (0 là không giới hạn)
+        requests_per_minute: Giới hạn request embedding mỗi phút (0 là không giới hạn)
+        token_latency: Độ trễ thêm của request embedding cho mỗi 1000 token (giây)
+
+    Returns:
+        Ứng dụng Starlette
+    """
+    from history_manager import TokenCounter
+
+    token_counter = TokenCounter()
+    token_limit = StubRateLimit(tokens_per_minute) if tokens_per_minute else None
+    request_limit = StubRateLimit(requests_per_minute) if requests_per_minute else None
+
+    async def embeddings(request: Request) -> JSONResponse:
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        # Kiểm tra mọi giới hạn trước rồi mới trừ, request bị từ chối không tốn ngân sách
+        tokens = sum(
+            len(value) if isinstance(value, list) else token_counter.count_text(value)
+            for value in inputs
+        )
+        amounts = []
+        if token_limit is not None:
+            amounts.append((token_limit, tokens))
+        if request_limit is not None:
+            amounts.append((request_limit, 1))
+        wait = max((limit.wait_time(amount) for limit, amount in amounts), default=0.0)
+        if wait > 0:
+            return JSONResponse(
+                {"error": {
+                    "message": f"Rate limit reached. Please try again in {wait * 1000:.0f}ms.",
+                    "type": "tokens",
+                    "code": "rate_limit_exceeded"
+                }},
+                status_code=429,
+                headers={"retry-after-ms": str(int(wait * 1000) + 1)}
+            )
+        for limit, amount in amounts:
+            limit.consume(amount)
+
+        await asyncio.sleep(latency + tokens / 1000 * token_latency)
+
+        data = []
+        for index, value in enumerate(inputs):
+            vector = fake_embedding(value, dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        return JSONResponse({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        })
+
+    def _next_message(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chọn phản hồi tiếp theo: gọi retrieve trước, trả lời sau khi có kết quả."""
+        if messages and messages[-1].get("role") == "tool":
+            return {"role": "assistant", "content": "Đây là câu trả lời giả lập dựa trên tài liệu."}
+
+        question = next(
+            (m.get("content") for m in reversed(messages) if m.get("role") == "user"),
+            ""
+        )
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": "retrieve",
+                    "arguments": json.dumps({"query": question}, ensure_ascii=False)
+                }
+            }]
+        }
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        message = _next_message(body.get("messages", []))
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        model = body.get("model", "stub")
+
+        await asyncio.sleep(latency)
+
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+
+        async def event_stream():
+            def chunk(delta, finish=None):
+                payload = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+                }
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            if message.get("tool_calls"):
+                tool_call = dict(message["tool_calls"][0], index=0)
+                yield chunk({"role": "assistant", "content": None, "tool_calls": [tool_call]})
+            else:
+                yield chunk({"role": "assistant", "content": ""})
+                for word in message["content"].split(" "):
+                    yield chunk({"content": word + " "})
+            yield chunk({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+    ])
+
+
+async def run_load(url: str, sessions: int, turns: int, timeout: float) -> Dict[str, Any]:
+    """
+    Chạy kiểm thử tải: nhiều phiên trò chuyện đồng thời, mỗi phiên gửi nhiều lượt.
+
+    Args:
+        url: Địa chỉ server (ví dụ http://localhost:8000)
+        sessions: Số phiên trò chuyện đồng thời
+        turns: Số lượt trong mỗi phiên
+        timeout: Thời gian chờ tối đa của mỗi request (giây)
+
+    Returns:
+        Từ điển thống kê độ trễ và thông lượng
+    """
+    latencies = []
+    errors = 0
+
+    limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=sessions)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+
+        async def run_session(index: int):
+            nonlocal errors
+            session_id = f"load-{index}"
+            for turn in range(turns):
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json={
+                        "session_id": session_id,
+                        "message": f"Câu hỏi số {turn} của phiên {index}"
+                    })
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(run_session(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - start_time
+
+    return {
+        "sessions": sessions,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_p99": round(percentile(latencies, 99), 3)
+    }
+
+
+def main():
+    """Chạy server giả lập hoặc bộ sinh tải."""
+    parser = argparse.ArgumentParser(description="Kiểm thử tải cho server.py")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stub_parser = subparsers.add_parser("stub", help="Chạy server giả lập OpenAI/xAI")
+    stub_parser.add_argument("--host", default="127.0.0.1")
+    stub_parser.add_argument("--port", type=int, default=9000)
+    stub_parser.add_argument("--latency", type=float, default=0.1)
+    stub_parser.add_argument("--dim", type=int, default=1536)
+    stub_parser.add_argument("--tpm", type=int, default=0, help="Giới hạn token embedding mỗi phút (0 là không giới hạn)")
+    stub_parser.add_argument("--rpm", type=int, default=0, help="Giới hạn request embedding mỗi phút (0 là không giới hạn)")
+    stub_parser.add_argument("--token-latency", type=float, default=0.0, help="Độ trễ thêm của request embedding cho mỗi 1000 token (giây)")
+
+    run_parser = subparsers.add_parser("run", help="Sinh tải tới /chat")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--sessions", type=int, default=200)
+    run_parser.add_argument("--turns", type=int, default=3)
+    run_parser.add_argument("--timeout", type=float, default=120.0)
+
+    args = parser.parse_args()
+
+    if args.command == "stub":
+        uvicorn.run(create_stub_app(args.latency, args.dim, args.tpm, args.rpm, args.token_latency), host=args.host, port=args.port, log_level="warning")
+    else:
+        print(json.dumps(asyncio.run(run_load(args.url, args.sessions, args.turns, args.timeout)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
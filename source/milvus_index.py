@@ -0,0 +1,123 @@
+# nhập các thư viện cơ bản
+from typing import Any, Dict, Optional
+
+# nhập cấu hình
+from config import (
+    MILVUS_INDEX_TYPE,
+    MILVUS_METRIC_TYPE,
+    MILVUS_HNSW_M,
+    MILVUS_HNSW_EF_CONSTRUCTION,
+    MILVUS_IVF_NLIST,
+    MILVUS_SEARCH_EF,
+    MILVUS_SEARCH_NPROBE
+)
+
+# Các loại chỉ mục dựa trên đồ thị (tham số tìm kiếm ef) và phân cụm (tham số nprobe)
+GRAPH_INDEXES = {"HNSW"}
+IVF_INDEXES = {"IVF_FLAT", "IVF_SQ8", "IVF_PQ"}
+
+
+class IndexConfig:
+    """Cấu hình chỉ mục vector của Milvus: tham số xây dựng và tham số tìm kiếm mặc định."""
+
+    def __init__(
+        self,
+        index_type: str = MILVUS_INDEX_TYPE,
+        metric_type: str = MILVUS_METRIC_TYPE,
+        m: int = MILVUS_HNSW_M,
+        ef_construction: int = MILVUS_HNSW_EF_CONSTRUCTION,
+        nlist: int = MILVUS_IVF_NLIST,
+        ef: int = MILVUS_SEARCH_EF,
+        nprobe: int = MILVUS_SEARCH_NPROBE
+    ):
+        """
+        Khởi tạo IndexConfig.
+
+        Args:
+            index_type: Loại chỉ mục (AUTOINDEX, FLAT, HNSW, IVF_FLAT, IVF_SQ8, IVF_PQ)
+            metric_type: Độ đo khoảng cách (L2, IP, COSINE)
+            m: Số cạnh mỗi nút của HNSW
+            ef_construction: Độ rộng tìm kiếm khi xây dựng HNSW
+            nlist: Số cụm của chỉ mục IVF
+            ef: Độ rộng tìm kiếm mặc định của HNSW
+            nprobe: Số cụm được quét mặc định của IVF
+        """
+        self.index_type = index_type.upper()
+        self.metric_type = metric_type.upper()
+        self.m = m
+        self.ef_construction = ef_construction
+        self.nlist = nlist
+        self.ef = ef
+        self.nprobe = nprobe
+
+    @classmethod
+    def from_index(cls, index: Dict[str, Any], base: Optional["IndexConfig"] = None) -> "IndexConfig":
+        """
+        Tạo cấu hình khớp với một chỉ mục đã có trong collection.
+
+        Args:
+            index: Mô tả chỉ mục (index_type, metric_type, params) từ Milvus
+            base: Cấu hình lấy tham số tìm kiếm mặc định
+
+        Returns:
+            IndexConfig mới
+        """
+        base = base or cls()
+        params = index.get("params") or {}
+        return cls(
+            index_type=index.get("index_type", base.index_type),
+            metric_type=index.get("metric_type", base.metric_type),
+            m=int(params.get("M", base.m)),
+            ef_construction=int(params.get("efConstruction", base.ef_construction)),
+            nlist=int(params.get("nlist", base.nlist)),
+            ef=base.ef,
+            nprobe=base.nprobe
+        )
+
+    def index_params(self) -> Dict[str, Any]:
+        """
+        Tham số tạo chỉ mục theo định dạng của langchain_milvus/pymilvus.
+
+        Returns:
+            Từ điển gồm index_type, metric_type và params
+        """
+        params: Dict[str, Any] = {}
+        if self.index_type in GRAPH_INDEXES:
+            params = {"M": self.m, "efConstruction": self.ef_construction}
+        elif self.index_type in IVF_INDEXES:
+            params = {"nlist": self.nlist}
+            if self.index_type == "IVF_PQ":
+                # Số không gian con; số chiều vector phải chia hết cho giá trị này
+                params["m"] = 8
+        return {"index_type": self.index_type, "metric_type": self.metric_type, "params": params}
+
+    def search_params(
+        self,
+        k: int = 4,
+        ef: Optional[int] = None,
+        nprobe: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Tham số tìm kiếm cho một truy vấn.
+
+        Args:
+            k: Số kết quả cần trả về (HNSW yêu cầu ef >= k)
+            ef: Độ rộng tìm kiếm HNSW, mặc định theo cấu hình
+            nprobe: Số cụm IVF được quét, mặc định theo cấu hình
+
+        Returns:
+            Từ điển gồm metric_type và params
+        """
+        params: Dict[str, Any] = {}
+        if self.index_type in GRAPH_INDEXES:
+            params["ef"] = max(ef or self.ef, k)
+        elif self.index_type in IVF_INDEXES:
+            params["nprobe"] = min(nprobe or self.nprobe, self.nlist)
+        return {"metric_type": self.metric_type, "params": params}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Trả về cấu hình dạng từ điển (để ghi log hoặc báo cáo)."""
+        return {
+            **self.index_params(),
+            "search": self.search_params()["params"]
+        }
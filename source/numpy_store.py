@@ -0,0 +1,973 @@
+# nhập các thư viện cơ bản
+import os
+import re
+import json
+import shutil
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+# Số dòng đổi kiểu mỗi lần khi tính điểm trên ma trận float16 (vừa cache CPU)
+SEARCH_BLOCK_ROWS = 1024
+
+# Kiểu mã của lượt tìm kiếm đầu: vector đầy đủ, cắt bớt số chiều, int8 hoặc nhị phân (1 bit/chiều)
+QUANTIZATIONS = ("none", "truncated", "int8", "binary")
+
+# Số dòng mã nhị phân xử lý mỗi lần khi tính khoảng cách Hamming
+BINARY_BLOCK_ROWS = 65536
+
+# Số dòng mã int8 đổi sang float32 mỗi lần, vào một bộ đệm dùng lại (vừa cache L2)
+INT8_BLOCK_ROWS = 512
+
+# Số dòng lấy mẫu (cách đều) để hiệu chỉnh hệ số int8 khi dựng lại mã
+INT8_CALIBRATION_ROWS = 65536
+
+# Tỉ lệ giá trị bị cắt trong một lô mới vượt ngưỡng này thì hệ số int8 được
+# hiệu chỉnh lại trên toàn bộ dữ liệu (hệ số nhắm tới 0.1% giá trị bị cắt)
+INT8_MAX_CLIP_RATIO = 0.01
+
+# Số bit 1 của mỗi giá trị byte (dùng khi numpy chưa có bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Các phép so sánh được hỗ trợ trong biểu thức lọc
+_CLAUSE_PATTERN = re.compile(r"\s*([A-Za-z_][A-Za-z0-9_]*)\s*(==|!=|>=|<=|>|<|\bin\b)\s*")
+_AND_PATTERN = re.compile(r"\s*\band\b\s*")
+
+
+def parse_expr(expr: str) -> List[Tuple[str, str, Any]]:
+    """
+    Phân tích biểu thức lọc theo cú pháp Milvus (tập con) thành các điều kiện.
+
+    Hỗ trợ các điều kiện dạng `trường op giá trị` nối với nhau bằng `and`,
+    với op là ==, !=, >, >=, <, <= hoặc in; giá trị là chuỗi/số JSON hoặc
+    danh sách JSON (với in).
+
+    Args:
+        expr: Biểu thức lọc, ví dụ 'source == "a.pdf" and chunk_hash in ["x", "y"]'
+
+    Returns:
+        Danh sách các bộ (trường, op, giá trị)
+    """
+    decoder = json.JSONDecoder()
+    clauses = []
+    pos = 0
+    while True:
+        match = _CLAUSE_PATTERN.match(expr, pos)
+        if match is None:
+            raise ValueError(f"Biểu thức lọc không hợp lệ tại vị trí {pos}: {expr!r}")
+        field, op = match.group(1), match.group(2)
+
+        try:
+            value, pos = decoder.raw_decode(expr, match.end())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Giá trị không hợp lệ trong biểu thức lọc: {expr!r}") from e
+        if (op == "in") != isinstance(value, list):
+            raise ValueError(f"Phép '{op}' không phù hợp với giá trị {value!r}")
+        clauses.append((field, op, value))
+
+        if expr[pos:].strip() == "":
+            return clauses
+        match = _AND_PATTERN.match(expr, pos)
+        if match is None:
+            raise ValueError(f"Biểu thức lọc không hợp lệ tại vị trí {pos}: {expr!r}")
+        pos = match.end()
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Đếm số bit 1 của từng byte."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values]
+
+
+def _comparable(a: Any, b: Any) -> bool:
+    """Kiểm tra hai giá trị có so sánh thứ tự được không (cùng là số hoặc cùng là chuỗi)."""
+    if isinstance(a, str) and isinstance(b, str):
+        return True
+    numbers = (int, float)
+    return (
+        isinstance(a, numbers) and isinstance(b, numbers)
+        and not isinstance(a, bool) and not isinstance(b, bool)
+    )
+
+
+def _value_key(value: Any) -> Any:
+    """Khóa băm được của một giá trị metadata (danh sách/từ điển đổi sang JSON)."""
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("\0json", json.dumps(value, sort_keys=True, default=str))
+
+
+class _Column:
+    """
+    Một trường metadata dạng mã phân loại: mỗi dòng giữ chỉ số của giá trị
+    trong danh sách giá trị phân biệt, để biểu thức lọc tính bằng numpy.
+    """
+
+    def __init__(self):
+        """Khởi tạo cột rỗng."""
+        self.codes = array("i")
+        self.values: List[Any] = []
+        self.index: Dict[Any, int] = {}
+
+    def extend(self, values: Iterable[Any]) -> None:
+        """
+        Thêm giá trị của các dòng mới.
+
+        Args:
+            values: Giá trị của trường ở từng dòng (None nếu thiếu)
+        """
+        for value in values:
+            key = _value_key(value)
+            code = self.index.get(key)
+            if code is None:
+                code = self.index[key] = len(self.values)
+                self.values.append(value)
+            self.codes.append(code)
+
+    def match(self, op: str, value: Any) -> np.ndarray:
+        """
+        Tính mặt nạ các dòng thỏa một điều kiện.
+
+        ==, != và in chỉ tra từ điển giá trị; so sánh thứ tự chỉ duyệt các
+        giá trị phân biệt bằng Python, phần theo dòng đều chạy trên numpy.
+
+        Args:
+            op: Phép so sánh
+            value: Giá trị so sánh
+
+        Returns:
+            Mảng bool độ dài bằng số dòng
+        """
+        codes = np.frombuffer(self.codes, dtype=np.int32) if self.codes else np.zeros(0, np.int32)
+        if op in ("==", "!=", "in"):
+            wanted = value if op == "in" else [value]
+            hits = [self.index[key] for key in map(_value_key, wanted) if key in self.index]
+            matched = np.isin(codes, hits)
+            return ~matched if op == "!=" else matched
+
+        # So sánh thứ tự: dòng thiếu trường hoặc khác kiểu không thỏa
+        compare = {
+            ">": lambda v: v > value,
+            ">=": lambda v: v >= value,
+            "<": lambda v: v < value,
+            "<=": lambda v: v <= value
+        }[op]
+        table = np.fromiter(
+            (_comparable(v, value) and compare(v) for v in self.values),
+            dtype=bool,
+            count=len(self.values)
+        )
+        return table[codes]
+
+
+class NumpyVectorStore:
+    """
+    Vector store chạy ngay trong tiến trình, không cần dịch vụ bên ngoài.
+
+    Vector được lưu trong một ma trận liền khối (float32 hoặc float16) trên
+    đĩa và đọc qua memory-map; văn bản và metadata nằm trong file JSONL đi
+    kèm, truy cập ngẫu nhiên qua bảng offset. Xóa chỉ đánh dấu dòng (tombstone);
+    compact ghi lại collection bỏ các dòng đã xóa.
+
+    Các file trong thư mục của collection:
+        state.json: số chiều và kiểu dữ liệu của vector
+        vectors.bin: ma trận vector, ghi nối tiếp
+        meta.jsonl: mỗi dòng {"text": ..., "metadata": ...}
+        offsets.i64: offset bắt đầu của từng dòng trong meta.jsonl; số phần
+            tử của file này là số dòng đã ghi xong (commit)
+        deleted.u8: cờ đã xóa của từng dòng
+        codes.bin: mã nén của từng vector cho lượt tìm kiếm đầu (nếu bật)
+
+    Vector được chuẩn hóa khi ghi nên điểm tương tự là tích vô hướng (cosine).
+
+    Khi bật nén, lượt tìm kiếm đầu chỉ đọc mã nén (nhỏ hơn 4-32 lần, là phần
+    duy nhất cần nằm trong bộ nhớ); danh sách ngắn k * rerank_factor ứng viên
+    được xếp hạng lại bằng vector đầy đủ đọc từ đĩa.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float32",
+        drop_old: bool = False,
+        quantization: str = "none",
+        search_dims: Optional[int] = None,
+        rerank_factor: int = 4,
+        compact_ratio: float = 0.0
+    ):
+        """
+        Khởi tạo NumpyVectorStore.
+
+        Args:
+            path: Thư mục lưu dữ liệu của collection
+            dtype: Kiểu lưu vector, "float32" hoặc "float16"
+            drop_old: Nếu True, xóa dữ liệu cũ trong thư mục
+            quantization: Kiểu mã của lượt tìm kiếm đầu: "none" (tìm trực tiếp
+                trên vector đầy đủ), "truncated", "int8" hoặc "binary"
+            search_dims: Số chiều đầu tiên dùng cho lượt tìm kiếm đầu
+                (None là tất cả; bắt buộc với "truncated")
+            rerank_factor: Số ứng viên được xếp hạng lại, tính theo bội số của k
+            compact_ratio: Khi flush, tỉ lệ dòng đã xóa vượt ngưỡng này thì
+                collection được ghi lại bỏ các dòng đó (0 là không tự động)
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Kiểu dữ liệu không được hỗ trợ: {dtype}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Kiểu nén không được hỗ trợ: {quantization}")
+        if quantization == "truncated" and not search_dims:
+            raise ValueError("Kiểu nén 'truncated' cần search_dims")
+
+        self.path = path
+        self.quantization = quantization
+        self.search_dims = search_dims or None
+        self.rerank_factor = max(1, rerank_factor)
+        self._lock = threading.RLock()
+
+        self.compact_ratio = compact_ratio
+
+        self._recover()
+        if drop_old and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+        state = self._read_state()
+        self.dim: Optional[int] = state.get("dim")
+        self.dtype = np.dtype(state.get("dtype", dtype))
+        # Cấu hình mã nén đã ghi; khác cấu hình hiện tại thì mã được dựng lại khi mở
+        self._codes_state: Dict[str, Any] = state.get("codes", {})
+
+        self._vectors: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._deleted = np.zeros(0, dtype=np.uint8)
+        # Cột metadata dùng cho biểu thức lọc, chỉ được dựng khi cần
+        self._columns: Optional[List[Dict[str, Any]]] = None
+        # Trường metadata -> cột mã phân loại, dựng khi trường được lọc lần đầu
+        self._column_cache: Dict[str, _Column] = {}
+        self._meta_file = None
+        self._stamp: Tuple[int, int] = (0, 0)
+        self._open()
+
+    def _file(self, name: str) -> str:
+        """Trả về đường dẫn của một file trong thư mục collection."""
+        return os.path.join(self.path, name)
+
+    def _read_state(self) -> Dict[str, Any]:
+        """Đọc file state.json (rỗng nếu collection chưa có dữ liệu)."""
+        try:
+            with open(self._file("state.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self) -> None:
+        """Ghi số chiều, kiểu dữ liệu và cấu hình mã nén vào state.json."""
+        with open(self._file("state.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name, "codes": self._codes_state}, f)
+
+    def _code_config(self) -> Dict[str, Any]:
+        """Cấu hình mã nén mong muốn (không gồm tham số hiệu chỉnh)."""
+        return {"quantization": self.quantization, "search_dims": self.search_dims}
+
+    def _code_dims(self) -> int:
+        """Số chiều vector dùng cho lượt tìm kiếm đầu."""
+        return min(self.search_dims or self.dim, self.dim)
+
+    def _code_shape(self) -> Tuple[np.dtype, int]:
+        """Kiểu dữ liệu và số phần tử mỗi dòng của mã nén."""
+        dims = self._code_dims()
+        if self.quantization == "int8":
+            return np.dtype(np.int8), dims
+        if self.quantization == "binary":
+            return np.dtype(np.uint8), (dims + 7) // 8
+        return np.dtype(np.float32), dims
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Tính mã nén cho lượt tìm kiếm đầu.
+
+        Args:
+            vectors: Ma trận vector đã chuẩn hóa (float32)
+
+        Returns:
+            Ma trận mã theo _code_shape
+        """
+        if self.quantization == "binary":
+            return np.packbits(vectors[:, :self._code_dims()] > 0, axis=1)
+
+        # Chuẩn hóa lại phần đầu của vector (embedding dạng Matryoshka)
+        vectors = self._code_vectors(vectors)
+        if self.quantization == "truncated":
+            return np.ascontiguousarray(vectors, dtype=np.float32)
+
+        # int8: một hệ số chung (giữ nguyên thứ hạng tích vô hướng). Lô đầu tiên
+        # đặt hệ số tạm thời; _build_codes hiệu chỉnh lại trên toàn bộ dữ liệu.
+        if "scale" not in self._codes_state:
+            self._codes_state["scale"] = self._calibrate(vectors)
+        return np.clip(np.rint(vectors * self._codes_state["scale"]), -127, 127).astype(np.int8)
+
+    def _code_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """Phần vector dùng cho mã nén (cắt số chiều và chuẩn hóa lại nếu cần)."""
+        vectors = vectors[:, :self._code_dims()]
+        if self._code_dims() < self.dim:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors
+
+    @staticmethod
+    def _calibrate(vectors: np.ndarray) -> float:
+        """
+        Tính hệ số int8 sao cho 99.9% giá trị không bị cắt.
+
+        Args:
+            vectors: Mẫu các vector (đã qua _code_vectors)
+
+        Returns:
+            Hệ số nhân trước khi làm tròn về [-127, 127]
+        """
+        peak = float(np.quantile(np.abs(vectors), 0.999)) if vectors.size else 1.0
+        return 127.0 / max(peak, 1e-6)
+
+    def _needs_recalibration(self, vectors: np.ndarray) -> bool:
+        """
+        Kiểm tra lô vector mới có bị cắt quá nhiều với hệ số int8 hiện tại không.
+
+        Args:
+            vectors: Lô vector đã chuẩn hóa (float32)
+
+        Returns:
+            True nếu cần dựng lại mã với hệ số mới
+        """
+        if self.quantization != "int8" or "scale" not in self._codes_state:
+            return False
+        scaled = np.abs(self._code_vectors(vectors)) * self._codes_state["scale"]
+        return float(np.mean(scaled > 127.5)) > INT8_MAX_CLIP_RATIO
+
+    def _build_codes(self, rows: int) -> None:
+        """
+        Dựng lại file mã nén từ các vector đã lưu (khi đổi cấu hình nén
+        hoặc khi hệ số int8 cần hiệu chỉnh lại).
+
+        Args:
+            rows: Số dòng đã commit
+        """
+        vectors = np.memmap(
+            self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim)
+        )
+        self._codes_state = self._code_config()
+        if self.quantization == "int8":
+            step = max(1, rows // INT8_CALIBRATION_ROWS)
+            sample = self._code_vectors(np.asarray(vectors[::step], dtype=np.float32))
+            self._codes_state["scale"] = self._calibrate(sample)
+        with open(self._file("codes.bin"), "wb") as f:
+            for start in range(0, rows, BINARY_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + BINARY_BLOCK_ROWS], dtype=np.float32)
+                f.write(self._encode(block).tobytes())
+        del vectors
+        self._write_state()
+
+    def _open(self) -> None:
+        """
+        Mở memory-map của các file dữ liệu.
+
+        Số dòng hợp lệ do file offset quyết định; phần ghi dở ở cuối các file
+        còn lại (nếu lần ghi trước bị gián đoạn) bị bỏ qua và ghi đè ở lần sau.
+        """
+        offsets_path = self._file("offsets.i64")
+        rows = os.path.getsize(offsets_path) // 8 if os.path.exists(offsets_path) else 0
+        self._stamp = self._read_stamp()
+        if rows == 0 or self.dim is None:
+            self._vectors = None
+            self._codes = None
+            self._offsets = np.zeros(0, dtype=np.int64)
+            self._deleted = np.zeros(0, dtype=np.uint8)
+            return
+
+        self._vectors = np.memmap(
+            self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim)
+        )
+        if self.quantization != "none":
+            code_dtype, width = self._code_shape()
+            codes_path = self._file("codes.bin")
+            stale = {k: self._codes_state.get(k) for k in self._code_config()} != self._code_config()
+            if stale or not os.path.exists(codes_path) or (
+                os.path.getsize(codes_path) < rows * width * code_dtype.itemsize
+            ):
+                self._build_codes(rows)
+            self._codes = np.memmap(codes_path, dtype=code_dtype, mode="r", shape=(rows, width))
+        self._offsets = np.memmap(offsets_path, dtype=np.int64, mode="r", shape=(rows,))
+
+        deleted_path = self._file("deleted.u8")
+        if not os.path.exists(deleted_path) or os.path.getsize(deleted_path) < rows:
+            with open(deleted_path, "ab") as f:
+                f.truncate(rows)
+        self._deleted = np.memmap(deleted_path, dtype=np.uint8, mode="r+", shape=(rows,))
+
+    def _read_stamp(self) -> Tuple[int, int]:
+        """Dấu hiệu thay đổi trên đĩa: inode của thư mục (đổi khi compact/clear) và số dòng."""
+        offsets_path = self._file("offsets.i64")
+        size = os.path.getsize(offsets_path) if os.path.exists(offsets_path) else 0
+        return os.stat(self.path).st_ino, size
+
+    def refresh(self) -> bool:
+        """
+        Mở lại collection nếu tiến trình khác đã ghi thêm, compact hoặc xóa dữ liệu.
+
+        Cờ xóa dùng chung memory-map nên thay đổi của chúng đã được thấy ngay.
+
+        Returns:
+            True nếu collection đã được mở lại
+        """
+        with self._lock:
+            if not os.path.isdir(self.path) or self._read_stamp() == self._stamp:
+                return False
+            self._close()
+            state = self._read_state()
+            self.dim = state.get("dim")
+            self.dtype = np.dtype(state.get("dtype", self.dtype.name))
+            self._codes_state = state.get("codes", {})
+            self._columns = None
+            self._column_cache = {}
+            self._open()
+            return True
+
+    def __len__(self) -> int:
+        """Trả về số dòng chưa bị xóa."""
+        with self._lock:
+            return int(len(self._offsets) - np.count_nonzero(self._deleted))
+
+    def _read_rows(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """
+        Đọc văn bản và metadata của các dòng từ file JSONL.
+
+        Args:
+            rows: Danh sách chỉ số dòng
+
+        Returns:
+            Danh sách từ điển {"text": ..., "metadata": ...} theo thứ tự đầu vào
+        """
+        if self._meta_file is None:
+            self._meta_file = open(self._file("meta.jsonl"), "rb")
+
+        records = []
+        for row in rows:
+            self._meta_file.seek(int(self._offsets[row]))
+            records.append(json.loads(self._meta_file.readline()))
+        return records
+
+    def _meta_end(self) -> int:
+        """Trả về vị trí kết thúc của dòng metadata cuối cùng đã commit."""
+        if len(self._offsets) == 0:
+            return 0
+        if self._meta_file is None:
+            self._meta_file = open(self._file("meta.jsonl"), "rb")
+        self._meta_file.seek(int(self._offsets[-1]))
+        return int(self._offsets[-1]) + len(self._meta_file.readline())
+
+    def _get_columns(self) -> List[Dict[str, Any]]:
+        """Trả về metadata của mọi dòng (đọc tuần tự file JSONL ở lần gọi đầu tiên)."""
+        if self._columns is None:
+            self._columns = []
+            if len(self._offsets):
+                with open(self._file("meta.jsonl"), "rb") as f:
+                    for _ in range(len(self._offsets)):
+                        self._columns.append(json.loads(f.readline())["metadata"])
+        return self._columns
+
+    def _get_column(self, field: str) -> _Column:
+        """Trả về cột mã phân loại của một trường metadata (dựng ở lần lọc đầu tiên)."""
+        column = self._column_cache.get(field)
+        if column is None:
+            column = self._column_cache[field] = _Column()
+            column.extend(metadata.get(field) for metadata in self._get_columns())
+        return column
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any
+    ) -> List[int]:
+        """
+        Ghi thêm các đoạn văn bản đã có embedding.
+
+        Args:
+            texts: Danh sách văn bản
+            embeddings: Danh sách vector tương ứng
+            metadatas: Danh sách metadata tương ứng (tùy chọn)
+            **kwargs: Bỏ qua, để tương thích với giao diện của Milvus
+
+        Returns:
+            Danh sách khóa chính (chỉ số dòng) của các đoạn vừa ghi
+        """
+        if not texts:
+            return []
+
+        metadatas = metadatas or [{} for _ in texts]
+        normalized = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(normalized, axis=1, keepdims=True)
+        normalized = normalized / np.where(norms == 0, 1, norms)
+        vectors = normalized.astype(self.dtype)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                if self.quantization != "none":
+                    self._codes_state = self._code_config()
+                    codes = self._encode(normalized)
+                self._write_state()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Số chiều vector không khớp ({vectors.shape[1]} != {self.dim})")
+            elif self.quantization != "none":
+                codes = self._encode(normalized)
+            # Lô mới lệch phân phối so với hệ số int8: bỏ mã cũ, _open dựng lại
+            # toàn bộ mã với hệ số hiệu chỉnh trên tất cả dữ liệu
+            recalibrate = self._needs_recalibration(normalized)
+
+            first_row = len(self._offsets)
+            vector_end = first_row * self.dim * self.dtype.itemsize
+            meta_end = self._meta_end()
+
+            # Ghi vector và metadata trước, file offset ghi sau cùng để đánh dấu commit
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.truncate(vector_end)
+                f.write(vectors.tobytes())
+
+            offsets = []
+            with open(self._file("meta.jsonl"), "ab") as f:
+                f.truncate(meta_end)
+                position = meta_end
+                for text, metadata in zip(texts, metadatas):
+                    line = json.dumps(
+                        {"text": text, "metadata": metadata}, ensure_ascii=False, default=str
+                    ).encode("utf-8") + b"\n"
+                    offsets.append(position)
+                    f.write(line)
+                    position += len(line)
+
+            if self.quantization != "none":
+                code_dtype, width = self._code_shape()
+                with open(self._file("codes.bin"), "ab") as f:
+                    if recalibrate:
+                        f.truncate(0)
+                    else:
+                        f.truncate(first_row * width * code_dtype.itemsize)
+                        f.write(codes.tobytes())
+
+            with open(self._file("deleted.u8"), "ab") as f:
+                f.truncate(first_row)
+                f.write(bytes(len(texts)))
+
+            with open(self._file("offsets.i64"), "ab") as f:
+                f.truncate(first_row * 8)
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+
+            if self._columns is not None:
+                self._columns.extend(metadatas)
+            for field, column in self._column_cache.items():
+                column.extend(metadata.get(field) for metadata in metadatas)
+            self._close()
+            self._open()
+
+        return list(range(first_row, first_row + len(texts)))
+
+    def _mask(self, expr: Optional[str]) -> np.ndarray:
+        """
+        Tính mặt nạ các dòng hợp lệ: chưa bị xóa và thỏa biểu thức lọc.
+
+        Args:
+            expr: Biểu thức lọc (tùy chọn)
+
+        Returns:
+            Mảng bool độ dài bằng số dòng
+        """
+        mask = self._deleted == 0
+        if not expr:
+            return mask
+
+        rows = len(mask)
+        for field, op, value in parse_expr(expr):
+            if field == "pk":
+                matched = self._pk_mask(rows, op, value)
+            else:
+                matched = self._get_column(field).match(op, value)
+            mask &= matched
+        return mask
+
+    @staticmethod
+    def _pk_mask(rows: int, op: str, value: Any) -> np.ndarray:
+        """Tính mặt nạ của một điều kiện trên khóa chính (chỉ số dòng)."""
+        pks = np.arange(rows)
+        if op in ("==", "!=", "in"):
+            wanted = value if op == "in" else [value]
+            matched = np.zeros(rows, dtype=bool)
+            hits = [
+                int(v) for v in wanted
+                if _comparable(v, 0) and float(v).is_integer() and 0 <= v < rows
+            ]
+            matched[hits] = True
+            return ~matched if op == "!=" else matched
+        if not _comparable(value, 0):
+            return np.zeros(rows, dtype=bool)
+        return {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}[op](pks, value)
+
+    def _scores(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Tính điểm tương tự của các vector với các truy vấn.
+
+        Args:
+            vectors: Ma trận vector đã lưu (hoặc một phần của nó)
+            queries: Ma trận truy vấn đã chuẩn hóa, kích thước (số truy vấn, dim)
+
+        Returns:
+            Ma trận điểm float32 kích thước (số vector, số truy vấn)
+        """
+        if vectors.dtype == np.float32:
+            return vectors @ queries.T
+
+        # float16 không có BLAS: đổi kiểu từng khối nhỏ để giới hạn bộ nhớ tạm.
+        # Tiết kiệm một nửa bộ nhớ nhưng tìm kiếm chậm hơn float32 nhiều lần.
+        scores = np.empty((len(vectors), len(queries)), dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+    def _code_scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Tính điểm xấp xỉ của lượt tìm kiếm đầu trên mã nén.
+
+        Args:
+            codes: Ma trận mã nén (hoặc một phần của nó)
+            queries: Ma trận truy vấn đã chuẩn hóa, kích thước (số truy vấn, dim)
+
+        Returns:
+            Ma trận điểm float32 kích thước (số vector, số truy vấn); chỉ dùng
+            để so sánh thứ hạng giữa các vector với cùng một truy vấn
+        """
+        queries = queries[:, :self._code_dims()]
+        if self.quantization == "int8":
+            return self._int8_scores(codes, queries)
+        if self.quantization != "binary":
+            return self._scores(codes, np.ascontiguousarray(queries))
+
+        # Nhị phân: điểm là số bit khác nhau (khoảng cách Hamming) lấy âm
+        query_codes = np.packbits(queries > 0, axis=1)
+        # Đếm bit trên từng từ 64 bit thay vì từng byte khi độ dài mã cho phép
+        wide = hasattr(np, "bitwise_count") and query_codes.shape[1] % 8 == 0
+        if wide:
+            query_codes = query_codes.view(np.uint64)
+        scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+        for start in range(0, len(codes), BINARY_BLOCK_ROWS):
+            block = np.ascontiguousarray(codes[start:start + BINARY_BLOCK_ROWS])
+            if wide:
+                block = block.view(np.uint64)
+            for column, query_code in enumerate(query_codes):
+                distances = _popcount(block ^ query_code).sum(axis=1, dtype=np.int32)
+                scores[start:start + len(block), column] = -distances
+        return scores
+
+    def _int8_scores(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Tính điểm xấp xỉ trên mã int8.
+
+        Mỗi khối nhỏ được đổi sang float32 vào một bộ đệm dùng lại (không cấp
+        phát mới) rồi nhân bằng BLAS; truy vấn được chia sẵn cho hệ số nên
+        điểm xấp xỉ trực tiếp cosine.
+
+        Args:
+            codes: Ma trận mã int8 (hoặc một phần của nó)
+            queries: Ma trận truy vấn đã cắt số chiều, kích thước (số truy vấn, số chiều mã)
+
+        Returns:
+            Ma trận điểm float32 kích thước (số vector, số truy vấn)
+        """
+        if self._code_dims() < self.dim:
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms == 0, 1, norms)
+        weights = np.ascontiguousarray((queries / self._codes_state["scale"]).T, dtype=np.float32)
+        scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+        buffer = np.empty((min(INT8_BLOCK_ROWS, len(codes)), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), INT8_BLOCK_ROWS):
+            block = codes[start:start + INT8_BLOCK_ROWS]
+            rows = len(block)
+            np.copyto(buffer[:rows], block, casting="unsafe")
+            np.matmul(buffer[:rows], weights, out=scores[start:start + rows])
+        return scores
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê dung lượng vector của collection.
+
+        Returns:
+            Từ điển gồm số dòng, dung lượng vector đầy đủ và dung lượng mã nén
+            (byte) cùng tỉ lệ nén của lượt tìm kiếm đầu
+        """
+        with self._lock:
+            rows = len(self._offsets)
+            vector_bytes = rows * (self.dim or 0) * self.dtype.itemsize
+            code_bytes = self._codes.nbytes if self._codes is not None else vector_bytes
+            return {
+                "rows": rows,
+                "quantization": self.quantization,
+                "search_dims": self._code_dims() if self.dim else self.search_dims,
+                "vector_bytes": vector_bytes,
+                "search_bytes": code_bytes,
+                "compression": round(vector_bytes / code_bytes, 1) if code_bytes else 1.0
+            }
+
+    def similarity_search_with_score_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        expr: Optional[str] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Tìm kiếm top-k cho nhiều truy vấn cùng lúc bằng một phép nhân ma trận.
+
+        Args:
+            embeddings: Danh sách vector truy vấn
+            k: Số lượng kết quả cho mỗi truy vấn
+            expr: Biểu thức lọc (tùy chọn)
+
+        Returns:
+            Với mỗi truy vấn, danh sách (tài liệu, điểm cosine) giảm dần theo điểm
+        """
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self._vectors is None or k <= 0:
+                return [[] for _ in embeddings]
+
+            mask = self._mask(expr)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return [[] for _ in embeddings]
+
+            # Lượt đầu tính trên mã nén nếu có, ngược lại trên vector đầy đủ
+            if self._codes is not None:
+                matrix, score_fn = self._codes, self._code_scores
+            else:
+                matrix, score_fn = self._vectors, self._scores
+
+            # Bộ lọc chọn ít dòng thì chỉ tính điểm trên các dòng đó
+            if len(candidates) * 2 < len(mask):
+                scores = score_fn(matrix[candidates], queries)
+            else:
+                scores = score_fn(matrix, queries)
+                scores = scores[candidates] if len(candidates) < len(mask) else scores
+
+            k = min(k, len(candidates))
+            shortlist = k if self._codes is None else min(k * self.rerank_factor, len(candidates))
+            if shortlist < len(scores):
+                top = np.argpartition(-scores, shortlist - 1, axis=0)[:shortlist]
+            else:
+                top = np.broadcast_to(np.arange(len(scores))[:, None], scores.shape)
+
+            results = []
+            for column in range(len(queries)):
+                positions = top[:, column]
+                if self._codes is not None:
+                    # Xếp hạng lại danh sách ngắn bằng vector đầy đủ
+                    exact = self._scores(
+                        self._vectors[candidates[positions]], queries[column:column + 1]
+                    )[:, 0]
+                    order = np.argsort(-exact, kind="stable")[:k]
+                    positions, column_scores = positions[order], exact[order]
+                else:
+                    positions = positions[np.argsort(-scores[positions, column], kind="stable")]
+                    column_scores = scores[positions, column]
+                rows = candidates[positions]
+                records = self._read_rows(rows.tolist())
+                results.append([
+                    (
+                        Document(
+                            page_content=record["text"],
+                            metadata={**record["metadata"], "pk": int(row)}
+                        ),
+                        float(score)
+                    )
+                    for row, score, record in zip(rows, column_scores, records)
+                ])
+            return results
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        expr: Optional[str] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        """
+        Tìm kiếm top-k cho một vector truy vấn.
+
+        Args:
+            embedding: Vector truy vấn
+            k: Số lượng kết quả trả về
+            expr: Biểu thức lọc (tùy chọn)
+            **kwargs: Bỏ qua, để tương thích với giao diện của Milvus
+
+        Returns:
+            Danh sách tài liệu giảm dần theo độ tương tự
+        """
+        results = self.similarity_search_with_score_by_vectors([embedding], k=k, expr=expr)
+        return [doc for doc, _ in results[0]]
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[Document]]:
+        """
+        Duyệt các dòng chưa bị xóa theo lô, ví dụ để dựng một chỉ mục khác từ dữ liệu đã lưu.
+
+        Args:
+            batch_size: Số dòng mỗi lô
+
+        Returns:
+            Iterator các lô tài liệu
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._deleted == 0).tolist()
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            with self._lock:
+                records = self._read_rows(batch)
+            yield [
+                Document(page_content=record["text"], metadata={**record["metadata"], "pk": row})
+                for row, record in zip(batch, records)
+            ]
+
+    def delete(self, expr: str, **kwargs: Any) -> int:
+        """
+        Đánh dấu xóa các dòng thỏa biểu thức lọc.
+
+        Args:
+            expr: Biểu thức lọc
+            **kwargs: Bỏ qua, để tương thích với giao diện của Milvus
+
+        Returns:
+            Số dòng bị xóa
+        """
+        with self._lock:
+            if self._vectors is None:
+                return 0
+            rows = np.flatnonzero(self._mask(expr))
+            self._deleted[rows] = 1
+            return len(rows)
+
+    def flush(self) -> None:
+        """Ghi các cờ xóa xuống đĩa, rồi dọn dẹp nếu tỉ lệ dòng đã xóa vượt ngưỡng."""
+        with self._lock:
+            if isinstance(self._deleted, np.memmap):
+                self._deleted.flush()
+            rows = len(self._offsets)
+            if self.compact_ratio > 0 and rows and (
+                np.count_nonzero(self._deleted) / rows > self.compact_ratio
+            ):
+                self.compact()
+
+    def compact(self) -> int:
+        """
+        Ghi lại collection chỉ với các dòng chưa bị xóa.
+
+        Các file mới được ghi vào thư mục tạm rồi thay thế thư mục cũ bằng hai
+        lần đổi tên; nếu bị gián đoạn giữa hai lần đổi tên, lần mở sau hoàn tất
+        việc thay thế. Khóa chính (chỉ số dòng) của các dòng còn lại thay đổi.
+
+        Returns:
+            Số dòng đã bị loại bỏ
+        """
+        with self._lock:
+            rows = len(self._offsets)
+            live = np.flatnonzero(self._deleted == 0)
+            removed = rows - len(live)
+            if removed == 0:
+                return 0
+
+            staging = f"{self.path}.compact"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            offsets = []
+            if len(live):
+                with open(os.path.join(staging, "vectors.bin"), "wb") as f:
+                    for start in range(0, len(live), BINARY_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(
+                            self._vectors[live[start:start + BINARY_BLOCK_ROWS]]
+                        ).tobytes())
+                if self._codes is not None:
+                    with open(os.path.join(staging, "codes.bin"), "wb") as f:
+                        for start in range(0, len(live), BINARY_BLOCK_ROWS):
+                            f.write(np.ascontiguousarray(
+                                self._codes[live[start:start + BINARY_BLOCK_ROWS]]
+                            ).tobytes())
+
+                # Đọc tuần tự file JSONL, chỉ giữ các dòng còn sống
+                keep = self._deleted == 0
+                position = 0
+                with open(self._file("meta.jsonl"), "rb") as src, \
+                        open(os.path.join(staging, "meta.jsonl"), "wb") as dst:
+                    for row in range(rows):
+                        line = src.readline()
+                        if keep[row]:
+                            offsets.append(position)
+                            dst.write(line)
+                            position += len(line)
+                with open(os.path.join(staging, "deleted.u8"), "wb") as f:
+                    f.write(bytes(len(live)))
+                with open(os.path.join(staging, "offsets.i64"), "wb") as f:
+                    f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            # state.json ghi sau cùng: thư mục tạm có state.json là đã ghi xong
+            with open(os.path.join(staging, "state.json"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name, "codes": self._codes_state}, f)
+
+            self._close()
+            retired = f"{self.path}.old"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.rename(self.path, retired)
+            os.rename(staging, self.path)
+            shutil.rmtree(retired, ignore_errors=True)
+
+            if self._columns is not None:
+                self._columns = [self._columns[row] for row in live.tolist()]
+            self._column_cache = {}
+            self._open()
+            return removed
+
+    def _recover(self) -> None:
+        """Hoàn tất lần compact bị gián đoạn giữa hai lần đổi tên thư mục."""
+        staging = f"{self.path}.compact"
+        if not os.path.isdir(self.path) and os.path.exists(os.path.join(staging, "state.json")):
+            os.rename(staging, self.path)
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(f"{self.path}.old", ignore_errors=True)
+
+    def _close(self) -> None:
+        """Đóng các file và memory-map đang mở."""
+        if self._meta_file is not None:
+            self._meta_file.close()
+            self._meta_file = None
+        self._vectors = None
+        self._codes = None
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._deleted = np.zeros(0, dtype=np.uint8)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ dữ liệu của collection."""
+        with self._lock:
+            self._close()
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+            self.dim = None
+            self._codes_state = {}
+            self._columns = None
+            self._column_cache = {}
+            self._open()
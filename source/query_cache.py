@@ -0,0 +1,136 @@
+# nhập các thư viện cơ bản
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Ước lượng kích thước (byte) của một giá trị trong cache.
+
+    Duyệt đệ quy qua list/tuple/dict và các Document của langchain,
+    đủ chính xác để theo dõi xu hướng sử dụng bộ nhớ.
+
+    Args:
+        value: Giá trị cần ước lượng
+
+    Returns:
+        Số byte ước lượng
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif hasattr(value, "page_content") and hasattr(value, "metadata"):
+        size += estimate_size(value.page_content) + estimate_size(value.metadata)
+    return size
+
+
+class LRUCache:
+    """Cache LRU an toàn luồng trong bộ nhớ, có thời gian sống (TTL) và thống kê."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: Optional[float] = None,
+        size_fn: Callable[[Any], int] = estimate_size
+    ):
+        """
+        Khởi tạo LRUCache.
+
+        Args:
+            max_size: Số mục tối đa; mục ít được dùng nhất bị loại khi đầy
+            ttl: Thời gian sống của mỗi mục (giây), None nếu không giới hạn
+            size_fn: Hàm ước lượng kích thước của một giá trị
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size_fn = size_fn
+
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Lấy giá trị theo khóa.
+
+        Args:
+            key: Khóa cần tìm
+
+        Returns:
+            Giá trị đã lưu, hoặc None nếu không có hoặc đã hết hạn
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                # Mục đã hết hạn
+                del self._data[key]
+                self._bytes -= size
+
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Lưu giá trị theo khóa.
+
+        Args:
+            key: Khóa
+            value: Giá trị cần lưu
+        """
+        if self.max_size <= 0:
+            return
+
+        size = self.size_fn(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._data) > self.max_size:
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (giữ nguyên thống kê hit/miss)."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Trả về thống kê của cache.
+
+        Returns:
+            Từ điển gồm số mục, dung lượng ước lượng, hit, miss, tỉ lệ hit và số mục bị loại
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_size,
+                "memory_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,276 @@
+# nhập các thư viện cơ bản
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+
+# nhập các module tùy chỉnh
+from embedding_cache import text_hash
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Chuẩn hóa câu hỏi để các cách viết chỉ khác hoa thường/khoảng trắng dùng chung cache.
+
+    Args:
+        text: Câu hỏi gốc
+
+    Returns:
+        Câu hỏi đã chuẩn hóa Unicode, viết thường và gộp khoảng trắng
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_ids(docs: Iterable[Document]) -> List[str]:
+    """
+    Lấy định danh của các đoạn văn bản tìm được.
+
+    Dùng khóa chính trong vector store nếu có, nếu không thì mã băm nội dung.
+
+    Args:
+        docs: Các đoạn văn bản
+
+    Returns:
+        Danh sách định danh theo thứ tự của docs
+    """
+    return [
+        str(doc.metadata["pk"]) if doc.metadata.get("pk") is not None
+        else text_hash(f"{doc.metadata.get('source', '')}\n{doc.page_content}")
+        for doc in docs
+    ]
+
+
+def response_key(
+    namespace: str,
+    model: str,
+    temperature: Optional[float],
+    prompt: str,
+    history: List[BaseMessage],
+    evidence: List[str],
+    corpus_version: int
+) -> str:
+    """
+    Tính khóa cache của một câu trả lời.
+
+    Các đoạn mà agent tự tìm trong lượt trò chuyện chỉ biết sau khi chạy agent
+    nên không nằm trong khóa; phiên bản dữ liệu thay cho chúng.
+
+    Args:
+        namespace: Định danh collection
+        model: Tên mô hình
+        temperature: Nhiệt độ sinh
+        prompt: Câu hỏi (sẽ được chuẩn hóa)
+        history: Lịch sử đã thu gọn được gửi cho mô hình
+        evidence: Định danh các đoạn văn bản tìm trước cho câu hỏi (rỗng nếu không tìm trước)
+        corpus_version: Phiên bản dữ liệu của collection
+
+    Returns:
+        Chuỗi hex SHA-256
+    """
+    payload = json.dumps(
+        {
+            "namespace": namespace,
+            "model": model,
+            "temperature": temperature,
+            "prompt": normalize_prompt(prompt),
+            "history": [(message.type, message.content) for message in history],
+            "evidence": evidence,
+            "corpus": corpus_version
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache câu trả lời của LLM trên đĩa (SQLite).
+
+    Khi tổng dung lượng vượt giới hạn, các mục lâu không được dùng nhất bị
+    loại. Mỗi mục ghi kèm phiên bản dữ liệu của collection để các mục cũ bị
+    xóa ngay khi dữ liệu thay đổi.
+
+    Đọc không ghi vào SQLite: thời điểm dùng gần nhất được gom trong bộ nhớ và
+    ghi cùng lần set kế tiếp; tổng dung lượng cũng được theo dõi trong bộ nhớ.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        Khởi tạo ResponseCache.
+
+        Args:
+            path: Đường dẫn file SQLite
+            max_bytes: Tổng dung lượng câu trả lời tối đa (byte)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                corpus_version INTEGER NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE INDEX IF NOT EXISTS responses_namespace ON responses (namespace, corpus_version);
+            """
+        )
+        self._conn.commit()
+
+        # Thời điểm dùng gần nhất chưa ghi xuống đĩa: key -> timestamp
+        self._touched: Dict[str, float] = {}
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy câu trả lời đã lưu.
+
+        Args:
+            key: Khóa từ response_key
+
+        Returns:
+            Câu trả lời đã lưu, hoặc None nếu không có
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._touched[key] = time.time()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, namespace: str, corpus_version: int, response: Dict[str, Any]) -> None:
+        """
+        Lưu câu trả lời và loại bớt mục cũ nếu vượt giới hạn dung lượng.
+
+        Args:
+            key: Khóa từ response_key
+            namespace: Định danh collection
+            corpus_version: Phiên bản dữ liệu khi tạo câu trả lời
+            response: Câu trả lời (phải chuyển được sang JSON)
+        """
+        data = json.dumps(response, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._flush_touched()
+
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, namespace, corpus_version, response, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, corpus_version, data, size, time.time())
+            )
+            self._total += size - (old[0] if old else 0)
+
+            if self._total > self.max_bytes:
+                evicted = 0
+                for old_key, old_size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_used"
+                ).fetchall():
+                    if self._total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    self._total -= old_size
+                    evicted += 1
+                self.evictions += evicted
+            self._conn.commit()
+
+    def _flush_touched(self) -> None:
+        """Ghi các thời điểm dùng gần nhất đang gom trong bộ nhớ (gọi khi đã giữ khóa)."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def invalidate(self, namespace: str, corpus_version: int) -> int:
+        """
+        Xóa các câu trả lời được tạo trên phiên bản dữ liệu khác của collection.
+
+        Args:
+            namespace: Định danh collection
+            corpus_version: Phiên bản dữ liệu hiện tại
+
+        Returns:
+            Số mục đã xóa
+        """
+        with self._lock:
+            removed = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses "
+                "WHERE namespace = ? AND corpus_version != ?",
+                (namespace, corpus_version)
+            ).fetchone()[0]
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE namespace = ? AND corpus_version != ?",
+                (namespace, corpus_version)
+            )
+            self._conn.commit()
+            self._total -= removed
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (giữ nguyên thống kê hit/miss)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._touched.clear()
+            self._total = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Trả về thống kê của cache.
+
+        Returns:
+            Từ điển gồm số mục, dung lượng, hit, miss, tỉ lệ hit và số mục bị loại
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions
+            }
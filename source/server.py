@@ -0,0 +1,289 @@
+# nhập các thư viện cơ bản
+import uuid
+import asyncio
+import contextlib
+from typing import Dict, List, Tuple
+
+# nhập thư viện web
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+# nhập thư viện langchain
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage
+
+# nhập các module tùy chỉnh
+from document_loader import DocumentLoader
+from embedding_manager import EmbeddingManager
+from agent_manager import AgentManager
+from ingest_jobs import IngestJobQueue
+from query_cache import LRUCache
+from uploads import UploadedBytes
+from telemetry import telemetry
+from config import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP,
+    SERVER_MAX_AGENTS,
+    SERVER_MAX_SESSIONS,
+    SERVER_SESSION_TTL
+)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    Khởi tạo các đối tượng quản lý dùng chung cho mọi phiên trò chuyện.
+
+    Các client OpenAI/xAI/Milvus được tạo một lần và dùng lại (connection pool)
+    cho tất cả các request. Chúng được khởi tạo trên luồng nền để server nhận
+    kết nối ngay; /health báo "starting" cho tới khi sẵn sàng.
+    """
+    embedding_manager = EmbeddingManager()
+    app.state.embedding_manager = embedding_manager
+    app.state.agent_manager = AgentManager(embedding_manager)
+    embedding_manager.warm_up()
+    app.state.agent_manager.warm_up()
+    # AgentManager của từng workspace (collection riêng), tạo ở request đầu tiên;
+    # workspace ít dùng nhất bị loại khi đầy (tạo lại khi được dùng tiếp)
+    app.state.agents = LRUCache(SERVER_MAX_AGENTS, size_fn=lambda _: 0)
+    # Lịch sử trò chuyện theo phiên, phiên ít dùng nhất bị loại khi đầy
+    app.state.sessions = LRUCache(SERVER_MAX_SESSIONS, ttl=SERVER_SESSION_TTL, size_fn=lambda _: 0)
+    # Hàng đợi nạp tài liệu chạy nền; job bị gián đoạn được tiếp tục từ checkpoint
+    app.state.ingest_queue = IngestJobQueue(embedding_manager).start()
+    yield
+    app.state.ingest_queue.stop()
+
+
+def _get_agent(app: Starlette, workspace: str) -> AgentManager:
+    """
+    Lấy (hoặc tạo mới) AgentManager truy xuất trên collection của một workspace.
+
+    Args:
+        app: Ứng dụng Starlette
+        workspace: Tên workspace; rỗng là collection mặc định
+
+    Returns:
+        AgentManager của workspace
+    """
+    if not workspace:
+        return app.state.agent_manager
+    agent = app.state.agents.get(workspace)
+    if agent is None:
+        # Dùng chung client LLM với agent mặc định
+        agent = AgentManager(
+            app.state.embedding_manager.for_tenant(workspace),
+            llm=app.state.agent_manager.llm
+        )
+        app.state.agents.set(workspace, agent)
+    return agent
+
+
+def _get_session(app: Starlette, session_id: str) -> dict:
+    """
+    Lấy (hoặc tạo mới) trạng thái của một phiên trò chuyện.
+
+    Args:
+        app: Ứng dụng Starlette
+        session_id: Mã phiên
+
+    Returns:
+        Từ điển gồm lịch sử tin nhắn và khóa tuần tự hóa các lượt của phiên
+    """
+    session = app.state.sessions.get(session_id)
+    if session is None:
+        session = {"messages": [], "lock": asyncio.Lock()}
+        app.state.sessions.set(session_id, session)
+    return session
+
+
+async def chat(request: Request) -> JSONResponse:
+    """
+    Trả lời một câu hỏi trong một phiên trò chuyện.
+
+    Body JSON: {"message": str, "session_id": str (tùy chọn), "workspace": str (tùy chọn)}
+    """
+    body = await request.json()
+    message = (body.get("message") or "").strip()
+    if not message:
+        return JSONResponse({"error": "Thiếu trường 'message'"}, status_code=400)
+
+    session_id = body.get("session_id") or uuid.uuid4().hex
+    session = _get_session(request.app, session_id)
+    agent = _get_agent(request.app, body.get("workspace") or "")
+
+    # Các lượt trong cùng một phiên chạy tuần tự; các phiên khác nhau chạy đồng thời
+    async with session["lock"]:
+        result = await agent.ainvoke(
+            message,
+            chat_history=list(session["messages"])
+        )
+        answer = result["output"]
+        session["messages"].extend([HumanMessage(message), AIMessage(answer)])
+
+    return JSONResponse({"session_id": session_id, "answer": answer})
+
+
+def _parse_files(
+    files: List[UploadedBytes],
+    chunk_size: int,
+    chunk_overlap: int
+) -> Tuple[Dict[str, List[Document]], Dict[str, str]]:
+    """
+    Phân tích song song các file tải lên, tách riêng các file bị lỗi.
+
+    Args:
+        files: Các file tải lên
+        chunk_size: Kích thước của mỗi đoạn văn bản
+        chunk_overlap: Độ chồng lập giữa các đoạn
+
+    Returns:
+        Tuple gồm từ điển tên file -> các đoạn văn bản và từ điển tên file -> lỗi
+    """
+    documents_dict, failed_files = {}, {}
+    for file_name, docs, error in DocumentLoader.load_and_split_documents_parallel(
+        files,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    ):
+        if error is None:
+            documents_dict[file_name] = docs
+        else:
+            failed_files[file_name] = error
+    return documents_dict, failed_files
+
+
+async def ingest(request: Request) -> JSONResponse:
+    """
+    Nạp tài liệu vào vector store.
+
+    Form multipart: files (nhiều file), chunk_size, chunk_overlap, clear_existing,
+    workspace (tùy chọn, nạp vào collection riêng của workspace)
+    """
+    form = await request.form()
+    files = [
+        UploadedBytes(upload.filename, await upload.read())
+        for upload in form.getlist("files")
+    ]
+    if not files:
+        return JSONResponse({"error": "Thiếu trường 'files'"}, status_code=400)
+
+    chunk_size = int(form.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    chunk_overlap = int(form.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+    clear_existing = str(form.get("clear_existing", "false")).lower() == "true"
+
+    # Phân tích file tốn CPU nên chạy trên các tiến trình con, ngoài vòng lặp sự kiện
+    documents_dict, failed_files = await asyncio.to_thread(
+        _parse_files, files, chunk_size, chunk_overlap
+    )
+    embedding_manager = request.app.state.embedding_manager.for_tenant(form.get("workspace") or "")
+    results = await embedding_manager.aadd_documents(
+        documents_dict,
+        clear_existing=clear_existing
+    )
+    results["failed_files"] = failed_files
+    return JSONResponse(results)
+
+
+async def submit_jobs(request: Request) -> JSONResponse:
+    """
+    Đưa tài liệu vào hàng đợi nạp chạy nền và trả về ngay.
+
+    Form multipart: files (nhiều file), chunk_size, chunk_overlap,
+    workspace (tùy chọn, nạp vào collection riêng của workspace)
+    """
+    form = await request.form()
+    files = [
+        UploadedBytes(upload.filename, await upload.read())
+        for upload in form.getlist("files")
+    ]
+    if not files:
+        return JSONResponse({"error": "Thiếu trường 'files'"}, status_code=400)
+
+    chunk_size = int(form.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    chunk_overlap = int(form.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP))
+    workspace = form.get("workspace") or ""
+
+    queue = request.app.state.ingest_queue
+    job_ids = [
+        await asyncio.to_thread(queue.submit, uploaded_file, chunk_size, chunk_overlap, workspace)
+        for uploaded_file in files
+    ]
+    return JSONResponse({"jobs": job_ids}, status_code=202)
+
+
+async def list_jobs(request: Request) -> JSONResponse:
+    """
+    Liệt kê các job nạp tài liệu gần nhất.
+
+    Query: limit (mặc định 50)
+    """
+    limit = int(request.query_params.get("limit", 50))
+    return JSONResponse({"jobs": request.app.state.ingest_queue.list_jobs(limit)})
+
+
+async def get_job(request: Request) -> JSONResponse:
+    """Trả về trạng thái và tiến độ của một job nạp tài liệu."""
+    job = request.app.state.ingest_queue.get_job(request.path_params["job_id"])
+    if job is None:
+        return JSONResponse({"error": "Không tìm thấy job"}, status_code=404)
+    return JSONResponse(job)
+
+
+async def retry_job(request: Request) -> JSONResponse:
+    """Chạy lại một job thất bại từ checkpoint cuối cùng."""
+    queue = request.app.state.ingest_queue
+    job_id = request.path_params["job_id"]
+    if queue.get_job(job_id) is None:
+        return JSONResponse({"error": "Không tìm thấy job"}, status_code=404)
+    if not queue.retry(job_id):
+        return JSONResponse({"error": "Chỉ chạy lại được job thất bại"}, status_code=409)
+    return JSONResponse(queue.get_job(job_id))
+
+
+async def health(request: Request) -> JSONResponse:
+    """
+    Kiểm tra trạng thái server.
+
+    Trả về mã 503 khi các client chưa khởi tạo xong, dùng được làm readiness probe.
+    """
+    ready = request.app.state.embedding_manager.ready and request.app.state.agent_manager.ready
+    return JSONResponse(
+        {"status": "ok" if ready else "starting"},
+        status_code=200 if ready else 503
+    )
+
+
+async def metrics(request: Request) -> PlainTextResponse:
+    """Xuất số liệu thời gian từng bước theo định dạng Prometheus."""
+    return PlainTextResponse(
+        telemetry.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+async def traces(request: Request) -> JSONResponse:
+    """
+    Trả về các trace gần nhất.
+
+    Query: limit (mặc định 20)
+    """
+    limit = int(request.query_params.get("limit", 20))
+    return JSONResponse({"enabled": telemetry.enabled, "traces": telemetry.get_traces(limit)})
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/ingest", ingest, methods=["POST"]),
+        Route("/jobs", submit_jobs, methods=["POST"]),
+        Route("/jobs", list_jobs, methods=["GET"]),
+        Route("/jobs/{job_id}", get_job, methods=["GET"]),
+        Route("/jobs/{job_id}/retry", retry_job, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/traces", traces, methods=["GET"]),
+    ],
+    lifespan=lifespan
+)
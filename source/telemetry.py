@@ -0,0 +1,449 @@
+# nhập các thư viện cơ bản
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+# nhập thư viện langchain
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# nhập cấu hình
+from config import TELEMETRY_ENABLED, TELEMETRY_MAX_TRACES, TELEMETRY_TRACE_FILE
+
+# Các mốc histogram (giây), giống mặc định của thư viện Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Context manager rỗng dùng chung khi tắt đo đạc
+_NOOP = contextlib.nullcontext()
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+class Histogram:
+    """Histogram tích lũy theo nhãn, xuất ra định dạng Prometheus."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=DEFAULT_BUCKETS):
+        """
+        Khởi tạo Histogram.
+
+        Args:
+            name: Tên metric
+            help_text: Mô tả metric
+            label: Tên nhãn phân loại (ví dụ "stage")
+            buckets: Các mốc giá trị (tăng dần)
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        # nhãn -> [số đếm theo từng mốc (không tích lũy) + mốc +Inf, tổng, số lần]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        """
+        Ghi nhận một giá trị.
+
+        Args:
+            label_value: Giá trị nhãn
+            value: Giá trị đo được
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_value] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        """Xuất các dòng theo định dạng văn bản của Prometheus."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total, count) in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+                lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Trả về tổng thời gian và số lần theo từng nhãn."""
+        with self._lock:
+            return {
+                label_value: {"count": count, "sum": round(total, 6)}
+                for label_value, (_, total, count) in self._series.items()
+            }
+
+
+class Trace:
+    """Dấu vết của một yêu cầu: danh sách các span có thời điểm bắt đầu và thời lượng."""
+
+    def __init__(self, name: str, **attrs: Any):
+        """
+        Khởi tạo Trace.
+
+        Args:
+            name: Tên yêu cầu (ví dụ "chat_turn")
+            **attrs: Thuộc tính bổ sung
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float, attrs: Dict[str, Any]) -> None:
+        """
+        Thêm một span vào trace.
+
+        Args:
+            name: Tên bước
+            start: Thời điểm bắt đầu (perf_counter)
+            duration: Thời lượng (giây)
+            attrs: Thuộc tính của span
+        """
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **attrs
+            })
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Chuyển trace thành từ điển có thể ghi ra JSON."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+            **self.attrs,
+            "spans": spans
+        }
+
+
+class _Span:
+    """Context manager đo thời gian một bước và ghi vào histogram và trace hiện tại."""
+
+    __slots__ = ("telemetry", "name", "attrs", "start")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attrs: Dict[str, Any]):
+        """Khởi tạo span (chưa bắt đầu đo)."""
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+
+    def __enter__(self) -> Dict[str, Any]:
+        """Bắt đầu đo."""
+        self.start = time.perf_counter()
+        # Trả về attrs để người gọi bổ sung thuộc tính trong lúc chạy
+        return self.attrs
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        """Kết thúc đo và ghi span, đánh dấu lỗi nếu có ngoại lệ."""
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.telemetry.record_span(
+            self.name, time.perf_counter() - self.start, start=self.start, **self.attrs
+        )
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    Callback của LangChain ghi span cho từng lời gọi LLM và công cụ.
+
+    Mỗi yêu cầu dùng một handler riêng gắn với trace của yêu cầu đó, nên span
+    được ghi đúng trace kể cả khi callback chạy trên luồng khác.
+    """
+
+    # Chạy trực tiếp trong vòng lặp sự kiện thay vì qua thread pool
+    run_inline = True
+
+    def __init__(self, telemetry: "Telemetry", trace: Optional[Trace]):
+        """
+        Khởi tạo TelemetryCallbackHandler.
+
+        Args:
+            telemetry: Đối tượng Telemetry ghi số liệu
+            trace: Trace của yêu cầu hiện tại (có thể None)
+        """
+        self.telemetry = telemetry
+        self.trace = trace
+        self._starts: Dict[UUID, tuple] = {}
+        self._llm_calls = 0
+
+    def _start(self, run_id: UUID, name: str, attrs: Dict[str, Any]) -> None:
+        """Ghi nhận thời điểm bắt đầu của một run."""
+        self._starts[run_id] = (name, time.perf_counter(), attrs)
+
+    def _end(self, run_id: UUID, **extra: Any) -> None:
+        """Kết thúc một run và ghi span tương ứng."""
+        entry = self._starts.pop(run_id, None)
+        if entry is None:
+            return
+        name, start, attrs = entry
+        self.telemetry.record_span(
+            name, time.perf_counter() - start, start=start, trace=self.trace, **attrs, **extra
+        )
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        """Bắt đầu một lời gọi chat model."""
+        self._llm_calls += 1
+        self._start(run_id, "llm", {"call": self._llm_calls})
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        """Bắt đầu một lời gọi LLM dạng văn bản."""
+        self._llm_calls += 1
+        self._start(run_id, "llm", {"call": self._llm_calls})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """Kết thúc lời gọi LLM, ghi kèm số token."""
+        prompt_tokens, completion_tokens = _token_usage(response)
+        self.telemetry.add_tokens("prompt", prompt_tokens)
+        self.telemetry.add_tokens("completion", completion_tokens)
+        self._end(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Lời gọi LLM bị lỗi."""
+        self._end(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        """Bắt đầu một lời gọi công cụ."""
+        tool_name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, "tool", {"tool": tool_name})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        """Kết thúc lời gọi công cụ."""
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Lời gọi công cụ bị lỗi."""
+        self._end(run_id, error=type(error).__name__)
+
+
+def _token_usage(response: LLMResult) -> tuple:
+    """
+    Lấy số token prompt/completion từ kết quả của LLM.
+
+    Returns:
+        Tuple (prompt_tokens, completion_tokens), 0 nếu nhà cung cấp không trả về
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class Telemetry:
+    """
+    Đo thời gian từng bước của pipeline RAG và xuất số liệu.
+
+    Mỗi span được ghi vào histogram Prometheus theo tên bước và vào trace
+    của yêu cầu đang chạy (nếu có). Khi tắt, span() trả về một context
+    manager rỗng dùng chung nên gần như không tốn chi phí.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = TELEMETRY_ENABLED,
+        max_traces: int = TELEMETRY_MAX_TRACES,
+        trace_file: Optional[str] = TELEMETRY_TRACE_FILE
+    ):
+        """
+        Khởi tạo Telemetry.
+
+        Args:
+            enabled: Bật/tắt đo đạc
+            max_traces: Số trace gần nhất giữ trong bộ nhớ
+            trace_file: File JSONL để ghi thêm mỗi trace khi kết thúc (tùy chọn)
+        """
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.stage_seconds = Histogram(
+            "rag_stage_duration_seconds",
+            "Thời gian của từng bước trong pipeline RAG",
+            label="stage"
+        )
+        self.request_seconds = Histogram(
+            "rag_request_duration_seconds",
+            "Thời gian của toàn bộ yêu cầu",
+            label="request"
+        )
+        self.tokens: Dict[str, int] = {}
+        self.traces: deque = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attrs: Any):
+        """
+        Đo thời gian một bước.
+
+        Args:
+            name: Tên bước (parse, split, embed, insert, search, ...)
+            **attrs: Thuộc tính của span (số đoạn, tên file, ...)
+
+        Returns:
+            Context manager; giá trị trả về khi vào là từ điển thuộc tính
+            có thể bổ sung trong lúc chạy
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def record_span(
+        self,
+        name: str,
+        duration: float,
+        start: Optional[float] = None,
+        trace: Optional[Trace] = None,
+        **attrs: Any
+    ) -> None:
+        """
+        Ghi một span đã đo sẵn thời lượng.
+
+        Args:
+            name: Tên bước
+            duration: Thời lượng (giây)
+            start: Thời điểm bắt đầu (perf_counter), mặc định suy ra từ thời lượng
+            trace: Trace cần ghi vào, mặc định là trace hiện tại
+            **attrs: Thuộc tính của span
+        """
+        if not self.enabled:
+            return
+        self.stage_seconds.observe(name, duration)
+
+        trace = trace or _current_trace.get()
+        if trace is not None:
+            if start is None:
+                start = time.perf_counter() - duration
+            trace.add_span(name, start, duration, attrs)
+
+    def add_tokens(self, kind: str, count: int) -> None:
+        """
+        Cộng dồn số token của LLM.
+
+        Args:
+            kind: "prompt" hoặc "completion"
+            count: Số token
+        """
+        if not self.enabled or not count:
+            return
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    @contextlib.contextmanager
+    def trace(self, name: str, **attrs: Any):
+        """
+        Mở một trace cho một yêu cầu; các span bên trong được gắn vào trace này.
+
+        Args:
+            name: Tên yêu cầu
+            **attrs: Thuộc tính của trace
+
+        Returns:
+            Context manager trả về Trace, hoặc None nếu đo đạc bị tắt
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        trace = Trace(name, **attrs)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            trace.duration = time.perf_counter() - trace._t0
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # Async generator được tiếp tục trong context khác
+                _current_trace.set(None)
+            self.request_seconds.observe(name, trace.duration)
+            self._finish_trace(trace)
+
+    def _finish_trace(self, trace: Trace) -> None:
+        """Lưu trace vào bộ nhớ và ghi ra file (nếu có cấu hình)."""
+        data = trace.to_dict()
+        self.traces.append(data)
+        if self.trace_file:
+            with self._lock, open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+
+    def callbacks(self, trace: Optional[Trace] = None) -> List[BaseCallbackHandler]:
+        """
+        Tạo danh sách callback cho một lời gọi LangChain.
+
+        Args:
+            trace: Trace của yêu cầu, mặc định là trace hiện tại
+
+        Returns:
+            Danh sách gồm một TelemetryCallbackHandler, rỗng nếu đo đạc bị tắt
+        """
+        if not self.enabled:
+            return []
+        return [TelemetryCallbackHandler(self, trace or _current_trace.get())]
+
+    def get_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Lấy các trace gần nhất.
+
+        Args:
+            limit: Số trace tối đa
+
+        Returns:
+            Danh sách trace, mới nhất ở cuối
+        """
+        return list(self.traces)[-limit:]
+
+    def get_stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Trả về tổng thời gian và số lần của từng bước."""
+        return self.stage_seconds.snapshot()
+
+    def render_prometheus(self) -> str:
+        """
+        Xuất toàn bộ số liệu theo định dạng văn bản của Prometheus.
+
+        Returns:
+            Chuỗi metrics
+        """
+        lines = self.stage_seconds.render() + self.request_seconds.render()
+        lines += [
+            "# HELP rag_llm_tokens_total Số token LLM đã dùng",
+            "# TYPE rag_llm_tokens_total counter"
+        ]
+        with self._lock:
+            for kind, count in sorted(self.tokens.items()):
+                lines.append(f'rag_llm_tokens_total{{type="{kind}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+# Đối tượng dùng chung cho toàn bộ ứng dụng
+telemetry = Telemetry()
@@ -0,0 +1,34 @@
+# nhập các thư viện cơ bản
+import os
+import sys
+import uuid
+import tempfile
+
+# nhập thư viện kiểm thử
+import pytest
+
+# Cấu hình đọc biến môi trường lúc import, nên phải trỏ dữ liệu vào thư mục tạm
+# trước khi nạp các module của ứng dụng để không đụng tới dữ liệu thật
+WORKDIR = tempfile.mkdtemp(prefix="rag-test-")
+os.environ["NUMPY_STORE_DIR"] = os.path.join(WORKDIR, "vector_store")
+os.environ["INGEST_MANIFEST_PATH"] = os.path.join(WORKDIR, "manifest.sqlite")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(WORKDIR, "responses.sqlite")
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# Các module của ứng dụng được import phẳng từ thư mục source/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import HashEmbeddings  # noqa: E402
+from embedding_manager import EmbeddingManager  # noqa: E402
+
+
+@pytest.fixture
+def manager() -> EmbeddingManager:
+    """EmbeddingManager trên backend numpy với embedding giả lập và collection riêng cho mỗi test."""
+    return EmbeddingManager(
+        collection_name=f"test_{uuid.uuid4().hex[:12]}",
+        backend="numpy",
+        embeddings=HashEmbeddings(32),
+        search_mode="vector"
+    )
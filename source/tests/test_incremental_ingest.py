@@ -0,0 +1,73 @@
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+
+def _chunks(source, texts, file_hash):
+    """Tạo các đoạn văn bản của một file như DocumentLoader trả về."""
+    return [
+        Document(page_content=text, metadata={"source": source, "file_hash": file_hash})
+        for text in texts
+    ]
+
+
+def _stored_texts(manager):
+    """Nội dung các đoạn đang lưu trong vector store."""
+    return sorted(
+        doc.page_content
+        for batch in manager.vector_store.iter_documents()
+        for doc in batch
+    )
+
+
+def test_unchanged_file_is_skipped(manager):
+    manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "beta"], "h1")})
+
+    results = manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "beta"], "h1")})
+
+    assert results["total_chunks"] == 0
+    assert results["unchanged_chunks"] == 2
+    assert results["deleted_chunks"] == 0
+    assert _stored_texts(manager) == ["alpha", "beta"]
+
+
+def test_unchanged_chunks_are_counted_once(manager):
+    manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "alpha", "beta"], "h1")})
+
+    unchanged = manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "alpha", "beta"], "h1")})
+    changed = manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "alpha", "gamma"], "h2")})
+
+    assert unchanged["unchanged_chunks"] == 2
+    assert changed["unchanged_chunks"] == 1
+    assert changed["total_chunks"] == 1
+
+
+def test_changed_file_writes_only_new_chunks(manager):
+    manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "beta"], "h1")})
+    generation = manager.corpus_generation
+
+    results = manager.add_documents({"a.txt": _chunks("a.txt", ["alpha", "gamma"], "h2")})
+
+    assert results["total_chunks"] == 1
+    assert results["unchanged_chunks"] == 1
+    assert results["deleted_chunks"] == 1
+    assert _stored_texts(manager) == ["alpha", "gamma"]
+    file_hash, chunk_hashes = manager.manifest.get_file("a.txt")
+    assert file_hash == "h2"
+    assert len(chunk_hashes) == 2
+    assert manager.corpus_generation > generation
+
+
+def test_emptied_file_is_removed(manager):
+    manager.add_documents({
+        "a.txt": _chunks("a.txt", ["alpha", "beta"], "h1"),
+        "b.txt": _chunks("b.txt", ["delta"], "h3")
+    })
+
+    results = manager.add_documents({"a.txt": []})
+
+    assert results["a.txt"] == 0
+    assert results["deleted_chunks"] == 2
+    assert _stored_texts(manager) == ["delta"]
+    assert manager.manifest.get_file("a.txt") is None
+    assert manager.manifest.get_file("b.txt") is not None
+    assert [doc.page_content for doc in manager.lexical_index.search("alpha")] == []
@@ -0,0 +1,116 @@
+# nhập các thư viện cơ bản
+import time
+
+# nhập thư viện kiểm thử
+import pytest
+
+# nhập các module tùy chỉnh
+from ingest_jobs import DONE, FAILED, QUEUED, RUNNING, IngestJobQueue, IngestJobStore
+from uploads import UploadedBytes
+
+
+@pytest.fixture
+def store(tmp_path) -> IngestJobStore:
+    """Bảng job trong thư mục tạm."""
+    return IngestJobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def _create(store, source="a.txt", workspace=""):
+    """Thêm một job với tham số phân đoạn mặc định."""
+    return store.create(source, f"/tmp/{source}", 1000, 200, workspace)
+
+
+def test_claim_takes_oldest_job_once(store, tmp_path):
+    first = _create(store, "a.txt")
+    second = _create(store, "b.txt")
+    # Tiến trình khác dùng chung file SQLite qua kết nối riêng
+    other = IngestJobStore(str(tmp_path / "jobs.sqlite"))
+
+    claimed = [store.claim("p1", 60), other.claim("p2", 60), store.claim("p1", 60)]
+
+    assert [job["id"] for job in claimed[:2]] == [first, second]
+    assert claimed[2] is None
+    assert store.get(first)["owner"] == "p1"
+    assert store.get(second)["owner"] == "p2"
+    assert store.get(first)["attempts"] == 1
+
+
+def test_jobs_of_same_file_run_one_at_a_time(store):
+    first = _create(store, "a.txt")
+    second = _create(store, "a.txt")
+    other_workspace = _create(store, "a.txt", workspace="acme")
+
+    assert store.claim("p1", 60)["id"] == first
+    assert store.claim("p1", 60)["id"] == other_workspace
+    assert store.claim("p1", 60) is None
+
+    store.finish(first, {"total_chunks": 1})
+    assert store.claim("p1", 60)["id"] == second
+
+
+def test_requeue_moves_only_expired_leases(store):
+    active = _create(store, "a.txt")
+    expired = _create(store, "b.txt")
+    store.claim("p1", 60)
+    store.claim("p2", -1)
+
+    assert store.requeue() == 1
+    assert store.get(active)["status"] == RUNNING
+    assert store.get(expired)["status"] == QUEUED
+    assert store.get(expired)["owner"] is None
+
+
+def test_renew_keeps_lease_alive(store):
+    job_id = _create(store)
+    store.claim("p1", -1)
+
+    assert store.renew("p1", 60) == 1
+    assert store.requeue() == 0
+    assert store.get(job_id)["status"] == RUNNING
+
+
+def test_release_keeps_checkpoint_and_attempts(store):
+    job_id = _create(store)
+    store.claim("p1", 60)
+    store.checkpoint(job_id, ["h1", "h2"])
+
+    store.release(job_id)
+
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert job["attempts"] == 0
+    assert job["chunks_done"] == 2
+    assert store.committed_hashes(job_id) == {"h1", "h2"}
+
+
+def test_failed_job_waits_for_retry_and_can_be_requeued(store):
+    job_id = _create(store)
+    store.claim("p1", 60)
+
+    store.fail(job_id, "lỗi tạm thời", retry_delay=60)
+    assert store.claim("p1", 60) is None
+
+    store.fail(job_id, "lỗi")
+    assert store.get(job_id)["status"] == FAILED
+    assert store.requeue(job_id) == 1
+    assert store.claim("p1", 60)["id"] == job_id
+
+
+def test_queue_ingests_file_into_workspace(manager, tmp_path):
+    queue = IngestJobQueue(manager, job_dir=str(tmp_path / "jobs"), workers=1).start()
+    try:
+        job_id = queue.submit(
+            UploadedBytes("notes.txt", "Mã hợp đồng HĐ-2024/015.".encode("utf-8")),
+            workspace="acme"
+        )
+        deadline = time.monotonic() + 60
+        while queue.get_job(job_id)["status"] in (QUEUED, RUNNING) and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        queue.stop(timeout=30)
+
+    job = queue.get_job(job_id)
+    assert job["status"] == DONE, job["error"]
+    assert job["result"]["total_chunks"] == 1
+    assert len(manager.for_tenant("acme").vector_store) == 1
+    assert len(manager.vector_store) == 0
@@ -0,0 +1,93 @@
+# nhập thư viện langchain
+from langchain_core.documents import Document
+
+# nhập các module tùy chỉnh
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def _doc(text, source="a.txt"):
+    """Tạo một đoạn văn bản của file source."""
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_rrf_ranks_documents_found_by_both_lists_first():
+    a, b, c, d = (_doc(text) for text in ("alpha", "beta", "gamma", "delta"))
+
+    fused = reciprocal_rank_fusion([[a, b, c], [c, d, a]], k=4)
+
+    # a: 1/61 + 1/63, c: 1/63 + 1/61 bằng nhau nên giữ thứ tự danh sách đầu
+    assert [doc.page_content for doc in fused] == ["alpha", "gamma", "beta", "delta"]
+
+
+def test_rrf_merges_same_chunk_from_different_sources_of_results():
+    vector_hit = Document(page_content="alpha", metadata={"source": "a.txt", "pk": 7})
+    lexical_hit = Document(page_content="alpha", metadata={"source": "a.txt"})
+
+    fused = reciprocal_rank_fusion([[vector_hit], [lexical_hit, _doc("beta")]], k=2)
+
+    assert len(fused) == 2
+    assert fused[0] is vector_hit
+
+
+def test_rrf_keeps_chunks_of_different_files_apart():
+    fused = reciprocal_rank_fusion([[_doc("alpha", "a.txt")], [_doc("alpha", "b.txt")]], k=5)
+
+    assert [doc.metadata["source"] for doc in fused] == ["a.txt", "b.txt"]
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("Hợp đồng HĐ-2024/015")
+
+    assert "hđ-2024/015" in tokens
+    assert {"hợp", "đồng", "hđ", "2024", "015"} <= set(tokens)
+
+
+def test_search_filters_and_deletes(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite"))
+    index.add([
+        _doc("hợp đồng HĐ-2024/015 giao hàng", "a.txt"),
+        _doc("hợp đồng HĐ-2024/016", "b.txt"),
+        _doc("biên bản nghiệm thu", "b.txt")
+    ])
+
+    assert [doc.metadata["source"] for doc in index.search("HĐ-2024/015", k=1)] == ["a.txt"]
+    assert [doc.metadata["source"] for doc in index.search("hợp đồng", filters={"source": "b.txt"})] == ["b.txt"]
+
+    assert index.delete("a.txt") == 1
+    assert index.search("HĐ-2024/015 giao hàng", k=1)[0].metadata["source"] == "b.txt"
+    assert LexicalIndex(str(tmp_path / "lexical.sqlite")).search("giao") == []
+
+
+def test_refresh_loads_changes_from_other_connections(tmp_path):
+    path = str(tmp_path / "lexical.sqlite")
+    writer, reader = LexicalIndex(path), LexicalIndex(path)
+
+    writer.add([_doc("mã SP1234", "a.txt"), _doc("mã SP5678", "b.txt")])
+    assert reader.search("SP1234") == []
+    assert reader.refresh()
+    assert [doc.metadata["source"] for doc in reader.search("SP1234")] == ["a.txt"]
+    assert not reader.refresh()
+
+    writer.delete("a.txt")
+    assert reader.refresh()
+    assert reader.search("SP1234") == []
+    assert len(reader) == 1
+
+
+def test_manager_sees_chunks_ingested_by_another_process(manager, monkeypatch):
+    import embedding_manager
+    monkeypatch.setattr(embedding_manager, "GENERATION_CHECK_INTERVAL", 0)
+    # Một EmbeddingManager khác trên cùng collection (ví dụ bulk_ingest)
+    writer = embedding_manager.EmbeddingManager(
+        collection_name=manager.collection_name,
+        backend="numpy",
+        embeddings=manager.embeddings,
+        search_mode="lexical"
+    )
+    manager.search_mode = "lexical"
+    assert manager.similarity_search("SP1234")[1] == []
+
+    writer.add_documents({"a.txt": [_doc("mã SP1234", "a.txt")]})
+
+    assert [doc.metadata["source"] for doc in manager.similarity_search("SP1234")[1]] == ["a.txt"]
+    assert len(manager.vector_store) == 1
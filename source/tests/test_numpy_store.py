@@ -0,0 +1,143 @@
+# nhập các thư viện cơ bản
+import os
+
+# nhập thư viện tính toán
+import numpy as np
+
+# nhập các module tùy chỉnh
+from numpy_store import NumpyVectorStore
+
+
+def _vectors(count, dim=16, seed=0):
+    """Các vector ngẫu nhiên cố định theo seed."""
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+def _fill(store, count=100):
+    """Ghi count đoạn thuộc 5 file, mỗi đoạn có số thứ tự n."""
+    vectors = _vectors(count)
+    store.add_embeddings(
+        [f"t{i}" for i in range(count)],
+        vectors.tolist(),
+        [{"source": f"f{i % 5}.pdf", "chunk_hash": f"h{i}", "n": i} for i in range(count)]
+    )
+    return vectors
+
+
+def test_filters_match_metadata(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "c"))
+    _fill(store)
+
+    def rows(expr):
+        return np.flatnonzero(store._mask(expr)).tolist()
+
+    assert rows('source == "f1.pdf" and n < 20') == [1, 6, 11, 16]
+    assert rows('chunk_hash in ["h3", "h7", "missing"]') == [3, 7]
+    assert rows('source != "f0.pdf" and n >= 97') == [97, 98, 99]
+    assert rows('missing == "x"') == []
+    assert rows('n > "text"') == []
+    assert rows("pk in [2, 500]") == [2]
+
+    # Cột đã dựng được cập nhật khi ghi thêm
+    store.add_embeddings(["new"], _vectors(1, seed=1).tolist(), [{"source": "f1.pdf", "n": 1000}])
+    assert rows('source == "f1.pdf" and n > 90') == [91, 96, 100]
+
+
+def test_compact_drops_deleted_rows(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "c"), quantization="int8")
+    vectors = _fill(store)
+    store.delete('source in ["f1.pdf", "f2.pdf"]')
+
+    assert store.compact() == 40
+
+    assert len(store) == 60
+    assert len(store._offsets) == 60
+    assert os.listdir(tmp_path) == ["c"]
+    (doc, score), = store.similarity_search_with_score_by_vectors([vectors[5].tolist()], k=1)[0]
+    assert doc.page_content == "t5"
+    assert doc.metadata["pk"] == 3
+    assert store._mask('source == "f1.pdf"').sum() == 0
+
+    reopened = NumpyVectorStore(str(tmp_path / "c"), quantization="int8")
+    assert len(reopened) == 60
+    assert reopened.similarity_search_by_vector(vectors[5].tolist(), k=1)[0].page_content == "t5"
+
+
+def test_flush_compacts_above_ratio(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "c"), compact_ratio=0.3)
+    _fill(store)
+
+    store.delete('source == "f0.pdf"')
+    store.flush()
+    assert len(store._offsets) == 100
+
+    store.delete('source == "f1.pdf"')
+    store.flush()
+    assert len(store._offsets) == 60
+
+
+def test_interrupted_compaction_is_completed_on_open(tmp_path):
+    path = str(tmp_path / "c")
+    store = NumpyVectorStore(path)
+    _fill(store)
+    store.delete('source == "f0.pdf"')
+    store.compact()
+    store._close()
+    # Dừng giữa hai lần đổi tên: thư mục mới đã ghi xong, thư mục cũ đã dời đi
+    os.rename(path, f"{path}.compact")
+
+    assert len(NumpyVectorStore(path)) == 80
+    assert sorted(os.listdir(tmp_path)) == ["c"]
+
+
+def test_refresh_sees_writes_and_compaction_of_other_instances(tmp_path):
+    path = str(tmp_path / "c")
+    writer, reader = NumpyVectorStore(path), NumpyVectorStore(path)
+
+    _fill(writer)
+    assert len(reader) == 0
+    assert reader.refresh()
+    assert len(reader) == 100
+    assert not reader.refresh()
+
+    writer.delete('source == "f0.pdf"')
+    writer.compact()
+    assert reader.refresh()
+    assert len(reader._offsets) == 80
+    assert reader._mask('source == "f0.pdf"').sum() == 0
+
+
+def test_int8_scale_is_recalibrated_for_shifted_batches(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "c"), quantization="int8")
+    dense = _vectors(200)
+    store.add_embeddings([f"d{i}" for i in range(200)], dense.tolist())
+    first_scale = store._codes_state["scale"]
+
+    # Lô sau gần như one-hot: với hệ số của lô đầu hầu hết phần tử lớn bị cắt
+    sparse = np.eye(16, dtype=np.float32)[np.arange(200) % 16] + 0.01 * _vectors(200, seed=1)
+    store.add_embeddings([f"s{i}" for i in range(200)], sparse.tolist())
+
+    assert store._codes_state["scale"] < first_scale
+    assert int(np.abs(store._codes).max()) <= 127
+    reopened = NumpyVectorStore(str(tmp_path / "c"), quantization="int8")
+    assert reopened._codes_state == store._codes_state
+
+
+def test_int8_search_matches_exact_search(tmp_path):
+    exact = NumpyVectorStore(str(tmp_path / "exact"))
+    int8 = NumpyVectorStore(str(tmp_path / "int8"), quantization="int8", rerank_factor=4)
+    vectors = _vectors(500, dim=32)
+    for store in (exact, int8):
+        store.add_embeddings([f"t{i}" for i in range(500)], vectors.tolist())
+    queries = (vectors[:20] + 0.1 * _vectors(20, dim=32, seed=2)).tolist()
+
+    expected = exact.similarity_search_with_score_by_vectors(queries, k=5)
+    found = int8.similarity_search_with_score_by_vectors(queries, k=5)
+
+    for want, got in zip(expected, found):
+        assert [doc.page_content for doc, _ in got] == [doc.page_content for doc, _ in want]
+    # Điểm lượt đầu trên mã int8 xấp xỉ cosine (0.1% giá trị bị cắt nên lệch nhiều hơn)
+    query = vectors[:1] / np.linalg.norm(vectors[:1])
+    error = np.abs(int8._code_scores(int8._codes, query) - exact._scores(exact._vectors, query))
+    assert error.mean() < 0.01
+    assert error.max() < 0.1
@@ -0,0 +1,80 @@
+# nhập thư viện langchain
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+# nhập các module tùy chỉnh
+from agent_manager import AgentManager
+from benchmarks.fakes import ScriptedChatModel
+from response_cache import ResponseCache, response_key
+
+
+def _key(prompt="Hợp đồng nào?", history=(), evidence=(), version=1, namespace="ns"):
+    """Khóa cache với các tham số mặc định của một mô hình cố định."""
+    return response_key(namespace, "gpt", 0.0, prompt, list(history), list(evidence), version)
+
+
+def test_key_ignores_case_and_whitespace_of_prompt():
+    assert _key("  Hợp   ĐỒNG nào? ") == _key("hợp đồng nào?")
+
+
+def test_key_changes_with_corpus_history_and_evidence():
+    base = _key()
+
+    assert _key(version=2) != base
+    assert _key(namespace="other") != base
+    assert _key(evidence=["3"]) != base
+    assert _key(history=[HumanMessage("Xin chào"), AIMessage("Chào bạn")]) != base
+
+
+def test_invalidate_drops_other_versions_of_namespace_only(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=1 << 20)
+    cache.set("old", "ns", 1, {"output": "cũ"})
+    cache.set("new", "ns", 2, {"output": "mới"})
+    cache.set("other", "other", 1, {"output": "khác"})
+
+    assert cache.invalidate("ns", 2) == 1
+
+    assert cache.get("old") is None
+    assert cache.get("new") == {"output": "mới"}
+    assert cache.get("other") == {"output": "khác"}
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=60)
+    cache.set("a", "ns", 1, {"output": "x" * 10})
+    cache.set("b", "ns", 1, {"output": "y" * 10})
+    # Đọc "a" để "b" trở thành mục lâu không dùng nhất
+    assert cache.get("a") is not None
+
+    cache.set("c", "ns", 1, {"output": "z" * 10})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_agent_reuses_answer_until_corpus_changes(manager, monkeypatch):
+    import embedding_manager
+    monkeypatch.setattr(embedding_manager, "GENERATION_CHECK_INTERVAL", 0)
+    agent = AgentManager(manager, llm=ScriptedChatModel())
+    question = "Điều khoản thanh toán là gì?"
+
+    agent.invoke(question)
+    agent.invoke(question)
+    assert [turn["cached"] for turn in agent.turn_metrics] == [False, True]
+
+    # Một tiến trình khác nạp thêm dữ liệu vào cùng collection
+    writer = embedding_manager.EmbeddingManager(
+        collection_name=manager.collection_name,
+        backend="numpy",
+        embeddings=manager.embeddings
+    )
+    writer.add_documents({"a.txt": [Document(
+        page_content="Thanh toán trong 30 ngày.", metadata={"source": "a.txt", "file_hash": "h1"}
+    )]})
+
+    agent.invoke(question)
+    agent.invoke(question)
+    assert [turn["cached"] for turn in agent.turn_metrics] == [False, True, False, True]
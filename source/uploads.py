@@ -0,0 +1,40 @@
+# nhập các thư viện cơ bản
+import os
+
+
+class UploadedBytes:
+    """Bọc nội dung file nhận qua HTTP với cùng giao diện như file tải lên qua Streamlit."""
+
+    def __init__(self, name: str, data: bytes):
+        """
+        Khởi tạo UploadedBytes.
+
+        Args:
+            name: Tên file
+            data: Nội dung file
+        """
+        self.name = name
+        self.data = data
+
+    def getbuffer(self) -> bytes:
+        """Trả về toàn bộ nội dung file."""
+        return self.data
+
+
+class LocalFile:
+    """Bọc một file trên đĩa với cùng giao diện như file tải lên qua Streamlit."""
+
+    def __init__(self, path: str):
+        """
+        Khởi tạo LocalFile.
+
+        Args:
+            path: Đường dẫn đến file
+        """
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def getbuffer(self) -> bytes:
+        """Trả về toàn bộ nội dung file."""
+        with open(self.path, "rb") as f:
+            return f.read()